@@ -0,0 +1,77 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+# --- ÉTAT DES ALERTES ---
+# Mémorise les alertes déjà envoyées, clé (ticker, règle, niveau) : une alerte
+# n'est renvoyée qu'après être repassée de l'autre côté du seuil, au-delà d'une
+# marge d'hystérésis (réarmement).
+
+BAS = "bas"        # déclenche si cours <= niveau
+HAUT = "haut"      # déclenche si cours >= niveau
+
+class EtatAlertes:
+    def __init__(self, chemin="alertes_etat.json", hysteresis=0.02):
+        self.chemin = chemin
+        self.hysteresis = hysteresis
+        self.actives = {}
+        self.modifie = False   # alerte déclenchée ou réarmée depuis la dernière sauvegarde
+        try:
+            with open(chemin, encoding='utf-8') as f:
+                self.actives = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    @staticmethod
+    def cle(ticker, regle, niveau):
+        return f"{ticker}|{regle}|{float(niveau):.4f}"
+
+    def evaluer(self, ticker, regle, niveau, cours, sens=BAS, signe=False):
+        """ True si l'alerte vient de se déclencher (première fois depuis son réarmement).
+        Un cours nul ou négatif est un cours manquant, sauf `signe=True` (ratios : perte / VaR, drawdown) où
+        une valeur <= 0 (jour de hausse, plus haut historique) est valide et réarme l'alerte """
+        if not niveau or niveau <= 0 or cours is None or cours != cours: return False
+        if not signe and cours <= 0: return False
+        cle = self.cle(ticker, regle, niveau)
+        franchi = cours <= niveau if sens == BAS else cours >= niveau
+        if cle in self.actives:
+            # Réarmement seulement une fois sorti de la bande d'hystérésis
+            rearme = cours > niveau * (1 + self.hysteresis) if sens == BAS else cours < niveau * (1 - self.hysteresis)
+            if rearme:
+                del self.actives[cle]
+                self.modifie = True
+            return False
+        if franchi:
+            self.actives[cle] = {"depuis": datetime.now().isoformat(timespec="seconds"), "cours": float(cours)}
+            self.modifie = True
+            return True
+        return False
+
+    def nouvelles(self, df, regle, col_niveau, sens=BAS, col_cours="Cours"):
+        """ Lignes d'un DataFrame dont l'alerte vient de se déclencher. Franchissements calculés en une passe
+        vectorisée : evaluer() ne voit que les lignes au-delà du seuil ou dont l'alerte est active (réarmement) """
+        if not len(df): return df
+        niveaux = pd.to_numeric(df[col_niveau], errors='coerce')
+        cours = pd.to_numeric(df[col_cours], errors='coerce')
+        valides = (niveaux > 0) & (cours > 0)
+        franchi = valides & ((cours <= niveaux) if sens == BAS else (cours >= niveaux))
+        actifs = {k.split("|", 1)[0] for k in self.actives if k.split("|")[1] == regle}
+        candidats = np.flatnonzero((franchi | (valides & df['Ticker'].isin(actifs))).to_numpy())
+        masque = np.zeros(len(df), dtype=bool)
+        for i in candidats:
+            masque[i] = self.evaluer(df['Ticker'].iat[i], regle, niveaux.iat[i], cours.iat[i], sens)
+        return df[masque]
+
+    def sauvegarder(self, tickers_suivis=None):
+        """ Écrit l'état ; les alertes des tickers qui ne sont plus suivis sont oubliées """
+        if tickers_suivis is not None:
+            suivis = set(tickers_suivis)
+            self.actives = {k: v for k, v in self.actives.items() if k.split("|", 1)[0] in suivis}
+        tmp = self.chemin + ".tmp"
+        with open(tmp, "w", encoding='utf-8') as f:
+            json.dump(self.actives, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.chemin)
+        self.modifie = False
@@ -0,0 +1,82 @@
+from contextlib import nullcontext
+
+import pandas as pd
+
+import noyau
+import portefeuilles
+import risques
+from alertes_etat import BAS, HAUT
+from cotations import prix_manuels
+from seuils_dynamiques import libelle, seuils_lignes
+from valorisation import surveiller, totaux, valoriser
+
+# --- ANALYSE DES ALERTES D'UN PORTEFEUILLE ---
+# Valorisation, seuils statiques et dynamiques, watchlist et risques d'un
+# portefeuille à partir des cours déjà relevés : le passage du cron
+# (check_alerts.py) et le benchmark du scan appellent la même fonction.
+
+def cle_risque(nom):
+    return f"@{portefeuilles.identifiant(nom) or 'principal'}"
+
+def analyser(nom, df_p, df_w, prix, prix_h, stock, etat, moteur, seuil_drawdown=0.0, alerte_var=False, phase=None):
+    """ {achat, actuel, veille, watchlist, alertes, valorise} : totaux, récapitulatif de la watchlist, nouvelles
+    alertes (textes) et frame valorisé des lignes cotées. `phase(nom)` chronomètre les étapes (facultatif) """
+    phase = phase or (lambda nom: nullcontext())
+    res = {"achat": 0, "actuel": 0, "veille": 0, "watchlist": "", "alertes": [], "valorise": pd.DataFrame()}
+    alertes = res["alertes"]
+    marque = "" if nom == portefeuilles.PRINCIPAL else f"[{nom}] "
+
+    # Portefeuille
+    if not df_p.empty:
+        with phase("regles"):
+            # Valorisation et seuils vectorisés (prix forcés à la main compris, comme dans l'application) ;
+            # les lignes sans cours sont ignorées
+            manuels = prix_manuels(df_p.to_dict('records'))
+            val = valoriser(df_p, noyau.cours_retenus(prix, manuels), prix_veille=noyau.cours_retenus(prix_h, manuels))
+            val = val[val['Cours'] > 0]
+            tot = totaux(val)
+            res["achat"], res["actuel"], res["veille"], res["valorise"] = tot['investi'], tot['valeur'], tot['valeur_veille'], val
+
+            # Lignes à règle dynamique (stop suiveur, bandes ATR, croisement MM) : le moteur remplace les seuils saisis
+            dyn = seuils_lignes(val, moteur, stock)
+            statiques = val.drop(val.index[list(dyn)])
+
+            # Uniquement les alertes qui n'ont pas encore été envoyées
+            for _, row in etat.nouvelles(statiques, portefeuilles.regle(nom, "seuil_bas"), "Seuil_Bas", BAS).iterrows():
+                alertes.append(f"{marque}⚠️ {row['Nom']} : {row['Cours']:.2f}€ (Seuil: {row['Seuil_Bas']}€)")
+            for _, row in etat.nouvelles(statiques, portefeuilles.regle(nom, "seuil_haut"), "Seuil_Haut", HAUT).iterrows():
+                alertes.append(f"{marque}🚀 {row['Nom']} : {row['Cours']:.2f}€ (Objectif: {row['Seuil_Haut']}€)")
+
+            # Le niveau dynamique bouge à chaque bougie : on compare le rapport valeur / niveau à 1.0 (clé d'alerte stable)
+            for i, n in dyn.items():
+                row = val.iloc[i]
+                regle = row['Regle'].strip().lower()
+                if n['bas'] and etat.evaluer(row['Ticker'], portefeuilles.regle(nom, f"dyn_bas:{regle}"), 1.0, n['valeur'] / n['bas'], BAS):
+                    alertes.append(f"{marque}⚠️ {row['Nom']} : {row['Cours']:.2f}€ ({libelle(regle)} : {n['bas']:.2f}€)")
+                if n['haut'] and etat.evaluer(row['Ticker'], portefeuilles.regle(nom, f"dyn_haut:{regle}"), 1.0, n['valeur'] / n['haut'], HAUT):
+                    alertes.append(f"{marque}🚀 {row['Nom']} : {row['Cours']:.2f}€ ({libelle(regle)} : {n['haut']:.2f}€)")
+
+    # Watchlist (toujours traitée pour être incluse dans le bilan de clôture)
+    if not df_w.empty:
+        with phase("regles"):
+            surv = surveiller(df_w, prix)
+            for _, row in surv[surv['Alerte']].iterrows():
+                res["watchlist"] += f"🎯 {row['Nom']} : {row['Cours']:.2f}€ (Seuil : {row['Seuil_Alerte']:.2f}€)\n"
+            for _, row in etat.nouvelles(surv, portefeuilles.regle(nom, "watchlist"), "Seuil_Alerte", BAS).iterrows():
+                alertes.append(f"{marque}🎯 {row['Nom']} : {row['Cours']:.2f}€ (Seuil : {row['Seuil_Alerte']:.2f}€)")
+
+    # Risque : drawdown et dépassement de VaR, une règle par portefeuille (clé "@<portefeuille>")
+    if not df_p.empty and (seuil_drawdown or alerte_var):
+        with phase("risques"):
+            val = res["valorise"]
+            clot = pd.DataFrame({t: stock[t]['Close'] for t in list(val['Ticker']) + [risques.INDICE]
+                                 if t in stock and not stock[t].empty})
+            r = risques.analyser(clot, val.groupby('Ticker')['Valeur'].sum().to_dict())
+            cle = cle_risque(nom)
+            if r and seuil_drawdown and etat.evaluer(cle, "drawdown", seuil_drawdown, -r['drawdown_courant'], HAUT, signe=True):
+                alertes.append(f"{marque}📉 Drawdown {r['drawdown_courant'] * 100:.1f}% (seuil -{seuil_drawdown * 100:.0f}%)")
+            # Perte du jour rapportée à la VaR : niveau fixe (1.0) pour une clé d'alerte stable
+            if r and alerte_var and r['var_historique'] > 0 and \
+                    etat.evaluer(cle, "var", 1.0, -r['dernier_rendement'] / r['var_historique'], HAUT, signe=True):
+                alertes.append(f"{marque}🧨 Perte du jour {r['dernier_rendement'] * 100:.2f}% > VaR 95% ({r['var_historique'] * 100:.2f}%)")
+    return res
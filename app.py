@@ -1,16 +1,34 @@
 import streamlit as st
-import yfinance as yf
 import pandas as pd
-import requests
-import base64
-import plotly.graph_objects as go
+import os
+import threading
 from datetime import date, datetime, timedelta
-from io import StringIO
-from bs4 import BeautifulSoup
+from cotations import prix_manuels, Cotation, SOURCE_MANUEL, SOURCE_AUCUNE
+from cache_marche import CACHE
+from instantane_cotations import InstantaneCotations, anciennete
+from historique_local import ohlc, debut_periode, clotures_locales, DOSSIER as DOSSIER_HISTO
+from valorisation import valoriser, totaux, bilan
+from serie_valeur import serie_valeur
+from graphiques import reduire, MODES, LTTB, SEUIL_WEBGL
+import risques
+from seuils_dynamiques import (MoteurSeuils, PRESETS, MM, lire_regle, libelle, courbes as courbes_seuils,
+                               seuils_lignes, date_achat, periode_depuis)
+from persistance import obtenir_depot
+import portefeuilles
+import noyau
+from grand_livre import GrandLivre, ACHAT, VENTE, DIVIDENDE, PRIX_MANUEL, AJUSTEMENT, NOM_FICHIER as FICHIER_LIVRE, NOM_RECENTS as RECENTS_LIVRE
+from routage import TableRoutage, NOM_FICHIER as FICHIER_ROUTAGE
+import releves_courtier
+from instrumentation import mesure, marqueur, evenements, instrumenter_http, configurer_logs
 
 # --- 1. CONFIGURATION ---
 st.set_page_config(page_title="Portefeuille Expert", layout="wide", initial_sidebar_state="expanded")
 
+# Instrumentation : phases + appels HTTP, journal JSON (PORTEFEUILLE_PERF_LOG=chemin, sinon stderr)
+instrumenter_http()
+configurer_logs(os.getenv("PORTEFEUILLE_PERF_LOG"))
+debut_run = marqueur()
+
 try:
     GH_TOKEN = st.secrets["GH_TOKEN"]
     GH_REPO = st.secrets["GH_REPO"]
@@ -18,127 +36,237 @@ except:
     st.error("Secrets manquants dans Streamlit Cloud.")
     st.stop()
 
-# --- 2. FONCTIONS TECHNIQUES ---
-def get_fallback_price(isin):
-    """ Tente de récupérer le prix sur Yahoo via scraping si l'API échoue """
-    if not isin: return None
-    try:
-        url = f"https://finance.yahoo.com/quote/{isin}.PA"
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=5)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        price_tag = soup.find('fin-streamer', {'data-field': 'regularMarketPrice'})
-        return float(price_tag['value'])
-    except:
-        return None
+depot = obtenir_depot(GH_TOKEN, GH_REPO, st.secrets.get("GH_BRANCH", "main"))
 
+# --- 2. FONCTIONS TECHNIQUES ---
 def charger_csv_github(nom_fichier):
-    url = f"https://api.github.com/repos/{GH_REPO}/contents/{nom_fichier}"
-    try:
-        r = requests.get(url, headers={"Authorization": f"token {GH_TOKEN}"}, timeout=10)
-        if r.status_code == 200:
-            content = base64.b64decode(r.json()['content']).decode('utf-8')
-            return pd.read_csv(StringIO(content)).to_dict('records')
-    except: pass
-    return []
+    return depot.charger(nom_fichier)
 
 def sauvegarder_csv_github(liste, nom_fichier):
-    url = f"https://api.github.com/repos/{GH_REPO}/contents/{nom_fichier}"
-    df = pd.DataFrame(liste)
-    csv_content = df.to_csv(index=False)
-    r_get = requests.get(url, headers={"Authorization": f"token {GH_TOKEN}"}, timeout=10)
-    sha = r_get.json().get('sha') if r_get.status_code == 200 else None
-    payload = {"message": f"Sync {nom_fichier}", "content": base64.b64encode(csv_content.encode('utf-8')).decode('utf-8')}
-    if sha: payload["sha"] = sha
-    requests.put(url, headers={"Authorization": f"token {GH_TOKEN}"}, json=payload, timeout=10)
-
-def tracer_courbe(df, titre, pru=None, s_h=None, s_b=None):
+    """ Écriture différée : les fichiers modifiés sont regroupés dans un seul commit """
+    depot.enregistrer(liste, nom_fichier)
+
+def arreter_si_illisible(noms):
+    """ Un fichier illisible (dépôt injoignable, pas un simple 404) arrête l'affichage : travailler sur des listes
+    vides écraserait les données du dépôt au premier enregistrement. Nouvel essai au prochain affichage """
+    illisibles = [n for n in noms if not depot.disponible(n)]
+    if not illisibles: return
+    for key in ('liste_pf', 'mon_portefeuille', 'ma_watchlist', 'mes_dividendes'): st.session_state.pop(key, None)
+    st.error(f"Lecture GitHub impossible ({', '.join(illisibles)}) : rien n'est affiché ni enregistré.")
+    st.button("🔄 Réessayer")
+    st.stop()
+
+def tracer_courbe(df, titre, pru=None, s_h=None, s_b=None, courbes=()):
     if df is None or df.empty:
         st.warning(f"Pas de données pour {titre}")
         return
     if isinstance(df.columns, pd.MultiIndex): 
         df.columns = df.columns.get_level_values(0)
     
-    fig = go.Figure()
-    fig.add_trace(go.Scatter(x=df.index, y=df['Close'], mode='lines', line=dict(color='#00FF00', width=2), name="Prix"))
-    if pru: fig.add_hline(y=float(pru), line_dash="dash", line_color="orange", annotation_text="PRU")
-    if s_h and float(s_h) > 0: fig.add_hline(y=float(s_h), line_color="cyan", line_width=1, annotation_text="Objectif")
-    if s_b and float(s_b) > 0: fig.add_hline(y=float(s_b), line_color="red", line_width=1, annotation_text="Alerte")
-    fig.update_layout(template="plotly_dark", title=titre, hovermode="x unified", height=500, margin=dict(l=10, r=10, t=50, b=10))
-    st.plotly_chart(fig, use_container_width=True)
+    import plotly.graph_objects as go   # import différé (noyau.py)
+    with mesure("rendu_plotly", titre=titre, points=len(df)) as m:
+        # Pas plus de points que de pixels ; WebGL au-delà du seuil (mode "Aucun" sur de longues séries)
+        mode = st.session_state.get("mode_graphe", LTTB)
+        df = reduire(df, 'Close', st.session_state.get("largeur_graphe", 1200), mode)
+        Trace = go.Scattergl if len(df) > SEUIL_WEBGL else go.Scatter
+        m.update(envoyes=len(df), mode=mode, webgl=Trace is go.Scattergl)
+
+        fig = go.Figure()
+        fig.add_trace(Trace(x=df.index, y=df['Close'], mode='lines', line=dict(color='#00FF00', width=2), name="Prix"))
+        for c in courbes:
+            fig.add_trace(Trace(x=df.index, y=df[c], mode='lines', line=dict(width=1, dash='dot'), name=c))
+        if pru: fig.add_hline(y=float(pru), line_dash="dash", line_color="orange", annotation_text="PRU")
+        if s_h and float(s_h) > 0: fig.add_hline(y=float(s_h), line_color="cyan", line_width=1, annotation_text="Objectif")
+        if s_b and float(s_b) > 0: fig.add_hline(y=float(s_b), line_color="red", line_width=1, annotation_text="Alerte")
+        fig.update_layout(template="plotly_dark", title=titre, hovermode="x unified", height=500, margin=dict(l=10, r=10, t=50, b=10))
+        if st.session_state.get("debug_perf"): m["octets"] = len(fig.to_json())
+        st.plotly_chart(fig, use_container_width=True)
+
+# Portefeuille actif : ses CSV sont dans son propre dossier du dépôt, les données de marché sont communes
+if 'pf_suivant' in st.session_state:
+    st.session_state.portefeuille_actif = st.session_state.pop('pf_suivant')
+if 'liste_pf' not in st.session_state:
+    st.session_state.liste_pf = portefeuilles.noms(charger_csv_github(portefeuilles.FICHIER))
+arreter_si_illisible([portefeuilles.FICHIER])
+liste_pf = st.session_state.liste_pf
+with st.sidebar:
+    actif = st.selectbox("📁 Portefeuille", liste_pf, key="portefeuille_actif")
+
+def fichier(nom_fichier):
+    return portefeuilles.chemin(actif, nom_fichier)
+
+# Changement de portefeuille : on oublie les données (et formulaires ouverts) du précédent
+if st.session_state.get('portefeuille_charge') != actif:
+    for key in [k for k in st.session_state if k in ('mon_portefeuille', 'ma_watchlist', 'mes_dividendes', 'form_actif', 'bilan_import', 'livre_projete')
+                or k.startswith(('edit_', 'sell_mode_'))]:
+        del st.session_state[key]
+    st.session_state.portefeuille_charge = actif
 
 # Initialisation
-for key in ['mon_portefeuille', 'ma_watchlist', 'mes_dividendes']:
-    if key not in st.session_state:
-        st.session_state[key] = charger_csv_github(f"{key.replace('mon_','').replace('ma_','').replace('mes_','')}_data.csv")
+with mesure("chargement_csv", portefeuille=actif):
+    if any(key not in st.session_state for key in ('mon_portefeuille', 'ma_watchlist', 'mes_dividendes')):
+        for key, lignes in zip(('mon_portefeuille', 'ma_watchlist', 'mes_dividendes'),
+                               noyau.charger_portefeuille(charger_csv_github, actif)):
+            st.session_state.setdefault(key, lignes)
+
+arreter_si_illisible([fichier(f) for f in noyau.FICHIERS])
+
+# Grand livre des transactions : copie locale en ajout seul, reprise de la copie distante
+# (ou de l'existant) au premier démarrage du processus
+@st.cache_resource
+def grand_livre(nom):
+    ident = portefeuilles.identifiant(nom)
+    return GrandLivre(os.path.join("grand_livre_data", ident)) if ident else GrandLivre()
+
+@st.cache_resource
+def verrou_reprise(nom):
+    return threading.Lock()
+
+def publier_livre(livre, nom, compacter=False):
+    """ Programme l'envoi des nouveaux événements : la queue seule, le journal complet lors d'une compaction """
+    for nom_fichier, contenu in livre.publication(compacter).items():
+        depot.enregistrer_contenu(contenu, portefeuilles.chemin(nom, nom_fichier))
+
+def reprendre_livre(livre, nom):
+    """ Journal local vide : reprise de la copie distante (journal compacté + queue) ; amorçage avec l'existant
+    seulement si le dépôt confirme qu'elle n'existe pas (404). Rien n'est fait si une lecture a échoué """
+    with verrou_reprise(nom):
+        if livre.seq: return
+        chemins = [portefeuilles.chemin(nom, n) for n in (FICHIER_LIVRE, RECENTS_LIVRE)]
+        base, recents = [charger_csv_github(c) for c in chemins]
+        if not all(depot.disponible(c) for c in chemins): return
+        if base or recents:
+            livre.importer(base, recents)
+        else:
+            livre.amorcer(st.session_state.mon_portefeuille, st.session_state.mes_dividendes)
+            if livre.seq: publier_livre(livre, nom, compacter=True)
+
+livre = grand_livre(actif)
+reprendre_livre(livre, actif)
+arreter_si_illisible([fichier(FICHIER_LIVRE), fichier(RECENTS_LIVRE)])
+
+# Le CSV des positions n'est qu'une projection du grand livre (Qté, PRU, prix forcé) : réaligné une fois par
+# chargement, les titres ajoutés à la main dans le CSV étant repris au journal comme ajustements
+if 'livre_projete' not in st.session_state:
+    modifiees, reprises = livre.reconcilier(st.session_state.mon_portefeuille)
+    if reprises: publier_livre(livre, actif)
+    if modifiees: sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
+    st.session_state.livre_projete = True
+
+def journaliser(type_, ticker, **evt):
+    """ Ajoute l'événement au grand livre et programme l'envoi de la queue du journal ; renvoie la position """
+    pos = livre.ajouter(type_, ticker, **evt)
+    publier_livre(livre, actif)
+    return pos
+
+def acheter(nom, isin, ticker, prix, qte, date_achat, regle=""):
+    """ Achat : une ligne par ticker, PRU moyen pondéré tiré du grand livre si la ligne existe """
+    pos = journaliser(ACHAT, ticker, qte=qte, prix=prix, nom=nom, isin=isin, date_evt=date_achat)
+    ligne = next((x for x in st.session_state.mon_portefeuille if x['Ticker'] == ticker), None)
+    if ligne:
+        ligne.update({"PRU": round(pos['PRU'], 4), "Qté": pos['Qté']})
+    else:
+        st.session_state.mon_portefeuille.append({
+            "Nom": nom, "ISIN": isin, "Ticker": ticker,
+            "PRU": prix, "Qté": qte, "Date_Achat": str(date_achat),
+            "Seuil_Haut": prix*1.2, "Seuil_Bas": prix*0.8,
+            "Prix_Manuel": 0.0, "Regle": regle
+        })
 
 # --- 3. RÉCUPÉRATION DES PRIX (Priorité au Manuel) ---
+# Routage appris des sources (partagé par le processus, persisté à côté des CSV)
+@st.cache_resource
+def table_routage():
+    return TableRoutage(charger_csv_github(FICHIER_ROUTAGE))
+
+# Derniers cours connus, communs à tous les portefeuilles (prix, source, heure du relevé)
+@st.cache_resource
+def instantane_cotations():
+    return InstantaneCotations(os.path.join(DOSSIER_HISTO, "_cotations.json"))
+
+# Correspondance ISIN -> ticker Yahoo pour les imports de relevés (une recherche par ISIN inconnu)
+@st.cache_resource
+def table_isin():
+    return releves_courtier.TableIsin(charger_csv_github(releves_courtier.NOM_FICHIER))
+
+routage = table_routage()
+instantane = instantane_cotations()
 ticker_to_isin = {x['Ticker']: x.get('ISIN') for x in st.session_state.mon_portefeuille + st.session_state.ma_watchlist}
 all_tickers = list(set(ticker_to_isin.keys()))
-prices = {}
+manuels = prix_manuels(st.session_state.mon_portefeuille)
+prices, sources_prix, releves = {}, {}, {}
 
 if all_tickers:
-    for t in all_tickers:
-        p = 0.0
-        
-        # A. PRIORITÉ : On vérifie d'abord si un prix manuel est saisi pour ce ticker
-        for x in st.session_state.mon_portefeuille:
-            if x['Ticker'] == t and float(x.get('Prix_Manuel', 0)) > 0:
-                p = float(x['Prix_Manuel'])
-                break
-        
-        # B. Si pas de prix manuel (p est toujours 0), on cherche sur Yahoo
-        if p == 0:
-            try:
-                tk = yf.Ticker(t)
-                hist = tk.history(period="7d")
-                if not hist.empty:
-                    p = float(hist['Close'].iloc[-1])
-                
-                # Tentative ISIN si Ticker échoue
-                if (p <= 0) and ticker_to_isin.get(t):
-                    isin_code = ticker_to_isin[t]
-                    for suffix in ["", ".PA"]:
-                        tk_isin = yf.Ticker(f"{isin_code}{suffix}")
-                        hist_isin = tk_isin.history(period="1d")
-                        if not hist_isin.empty:
-                            p = float(hist_isin['Close'].iloc[-1])
-                            break
-                
-                # Tentative Scraping si tout échoue
-                if (p <= 0) and ticker_to_isin.get(t):
-                    p = get_fallback_price(ticker_to_isin[t])
-            except:
-                p = 0.0
-                
-        prices[t] = float(p) if p else 0.00
+    connus = instantane.lire(all_tickers)
+    releve_en_cours = st.session_state.get('releve_cotations')
+    if st.session_state.get('cours_arriere_plan', True) and connus:
+        # Affichage immédiat avec l'instantané ; relevé frais en arrière-plan si des cours sont périmés
+        cotations = {t: c for t, (c, ts) in connus.items()}
+        releves = {t: ts for t, (c, ts) in connus.items()}
+        # Les prix manuels ne sont jamais relevés : ils ne comptent pas comme périmés
+        a_relever = [t for t in all_tickers if t not in manuels]
+        if (releve_en_cours is None or releve_en_cours.done()) and instantane.perimes(a_relever, CACHE.ttl_courant()):
+            st.session_state.releve_cotations = instantane.relever_en_fond(ticker_to_isin, manuels, routage)
+    else:
+        # Un seul téléchargement groupé, puis repli ISIN / scraping en parallèle pour les manquants
+        with mesure("cotations", tickers=len(all_tickers)):
+            cotations = instantane.relever(ticker_to_isin, manuels, routage)
+    cotations.update({t: Cotation(p, SOURCE_MANUEL) for t, p in manuels.items() if t in ticker_to_isin})
+    if routage.modifiee:
+        routage.modifiee = False
+        sauvegarder_csv_github(routage.lignes(), FICHIER_ROUTAGE)
+    # Mêmes cours retenus que le cron (noyau) : le prix forcé l'emporte sur le relevé
+    prices = noyau.cours_retenus({t: float(c.prix) if c.prix else 0.00 for t, c in cotations.items()},
+                                 {t: p for t, p in manuels.items() if t in ticker_to_isin})
+    sources_prix = {t: c.source for t, c in cotations.items()}
+
+def badge(ticker):
+    """ Âge du cours affiché s'il vient de l'instantané et n'est pas frais ; cours absent ou introuvable signalé """
+    if ticker not in sources_prix: return " ⏳ en attente"
+    if sources_prix[ticker] == SOURCE_AUCUNE: return " ⚠️ sans cours"
+    age = anciennete(releves[ticker]) if ticker in releves and sources_prix[ticker] != SOURCE_MANUEL else ""
+    return f" ⏳{age}" if age else ""
 
 # --- 4. CALCULS GLOBAUX ---
-total_actuel, total_achat = 0.0, 0.0
-positions_calculees = []
-for i, act in enumerate(st.session_state.mon_portefeuille):
-    try:
-        pru = float(act.get('PRU', 0))
-        qte = float(act.get('Qté', 0))
-        c_act = prices.get(act['Ticker'], 0.0)
-        val_titre = c_act * qte
-        total_actuel += val_titre
-        total_achat += (pru * qte)
-        positions_calculees.append({
-            "idx": i, "act": act, "c_act": c_act, "val": val_titre,
-            "pv": val_titre - (pru * qte), "pru": pru, "qte": qte,
-            "sh": float(act.get('Seuil_Haut', 0)), "sb": float(act.get('Seuil_Bas', 0))
-        })
-    except: continue
+# Une seule passe vectorisée sur toutes les lignes (valeur, P/L, seuils, dividendes)
+with mesure("valorisation", lignes=len(st.session_state.mon_portefeuille)):
+    df_val = valoriser(st.session_state.mon_portefeuille, prices, st.session_state.mes_dividendes)
+tot = totaux(df_val)
+total_actuel, total_achat = tot['valeur'], tot['investi']
+positions_calculees = [
+    {"idx": i, "act": act, "c_act": r['Cours'], "val": r['Valeur'], "pv": r['PV'], "pv_pct": r['PV_pct'],
+     "pru": r['PRU'], "qte": r['Qté'], "sh": r['Seuil_Haut_Eff'], "sb": r['Seuil_Bas_Eff']}
+    for i, (act, r) in enumerate(zip(st.session_state.mon_portefeuille, df_val.to_dict('records')))
+]
+
+# Seuils dynamiques (stop suiveur, bandes ATR, croisement MM) : même moteur et même état que check_alerts.py,
+# seules les bougies postérieures à l'état enregistré sont appliquées
+@st.cache_resource
+def moteur_seuils():
+    return MoteurSeuils()
+
+moteur = moteur_seuils()
+with mesure("seuils_dynamiques"):
+    for i, n in seuils_lignes(st.session_state.mon_portefeuille, moteur).items():
+        positions_calculees[i]['dyn'] = n
+    moteur.sauvegarder()
 
 # --- 5. SIDEBAR ---
 with st.sidebar:
-    st.title("💰 Mon Portefeuille")
+    st.title("💰 Mon Portefeuille" if actif == portefeuilles.PRINCIPAL else f"💰 {actif}")
+
+    # Relevé en cours : on vérifie chaque seconde et on relance la page dès que les cours frais sont là
+    if st.session_state.get('releve_cotations') is not None and not st.session_state.releve_cotations.done():
+        @st.fragment(run_every=1)
+        def attente_cotations():
+            if st.session_state.releve_cotations.done(): st.rerun()
+            st.caption("🔄 Actualisation des cours en arrière-plan…")
+        attente_cotations()
+    elif releves:
+        st.caption(f"Plus ancien cours affiché : {datetime.fromtimestamp(min(releves.values())).strftime('%d/%m %H:%M')}")
     if total_achat > 0:
         st.metric("VALEUR TOTALE", f"{total_actuel:.2f} €")
-        diff = total_actuel - total_achat
-        pct = (diff / total_achat * 100)
-        st.metric("P/L GLOBAL", f"{diff:+.2f} €", delta=f"{pct:+.2f}%")
+        st.metric("P/L GLOBAL", f"{tot['pv']:+.2f} €", delta=f"{tot['pv_pct']:+.2f}%")
     
     st.divider()
     with st.form("add_form", clear_on_submit=True):
@@ -149,33 +277,79 @@ with st.sidebar:
         p = st.number_input("PRU (€)", min_value=0.0, step=0.01)
         q = st.number_input("Quantité", min_value=0.0, step=0.1)
         d = st.date_input("Date d'Achat", value=date.today())
+        r_seuil = st.selectbox("Règle de seuil", list(PRESETS))
         
         if st.form_submit_button("Ajouter au Portefeuille"):
             if n and t:
                 isin_final = i_code if i_code else t.upper()
-                st.session_state.mon_portefeuille.append({
-                    "Nom": n, "ISIN": isin_final, "Ticker": t.upper(), 
-                    "PRU": p, "Qté": q, "Date_Achat": str(d), 
-                    "Seuil_Haut": p*1.2, "Seuil_Bas": p*0.8,
-                    "Prix_Manuel": 0.0
-                })
-                sauvegarder_csv_github(st.session_state.mon_portefeuille, "portefeuille_data.csv")
+                acheter(n, isin_final, t.upper(), p, q, d, PRESETS[r_seuil])
+                sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
                 st.success(f"{n} ajouté !")
                 st.rerun()
 
+    # Import en bloc d'un relevé courtier : lecture en flux, un seul lot dans le grand livre et une seule écriture par fichier
+    with st.expander("📥 Import / export de relevés"):
+        releve = st.file_uploader("Relevé courtier (CSV ou OFX)", type=["csv", "txt", "ofx", "qfx"])
+        if releve is not None and st.button("Importer le relevé"):
+            table = table_isin()
+            table.apprendre(st.session_state.mon_portefeuille + st.session_state.ma_watchlist)
+            with mesure("import_releve", fichier=releve.name, octets=releve.size) as m:
+                operations = releves_courtier.lire_releve(releves_courtier.ouvrir(releve), releve.name)
+                b = releves_courtier.importer(operations, livre, st.session_state.mon_portefeuille,
+                                              st.session_state.mes_dividendes, table)
+                m.update(importees=b['importees'], doublons=b['doublons'])
+            if b['importees'] or b['isin_corriges']:
+                publier_livre(livre, actif)
+                sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
+                if b['dividendes']: sauvegarder_csv_github(st.session_state.mes_dividendes, fichier("dividendes_data.csv"))
+            if table.modifiee:
+                table.modifiee = False
+                sauvegarder_csv_github(table.lignes(), releves_courtier.NOM_FICHIER)
+            st.session_state.bilan_import = b
+            st.rerun()
+        if 'bilan_import' in st.session_state:
+            b = st.session_state.bilan_import
+            st.success(f"{b['importees']} opérations importées ({b['dividendes']} dividendes), {b['doublons']} déjà présentes")
+            if b['inconnus']: st.warning("ISIN sans ticker Yahoo : " + ", ".join(b['inconnus']))
+            if b.get('remplaces'): st.info("Reprise remplacée par l'historique du relevé : " + ", ".join(b['remplaces']))
+            if b.get('rejetees'): st.warning("Opérations antérieures au dernier mouvement du titre, non importées : "
+                                             + ", ".join(b['rejetees']))
+        # Fichiers générés seulement au clic (pas à chaque rerun)
+        st.download_button("⬇️ Grand livre (CSV)", livre.contenu, file_name=FICHIER_LIVRE, mime="text/csv", on_click="ignore")
+        positions_csv = st.session_state.mon_portefeuille
+        st.download_button("⬇️ Positions (CSV)", lambda: pd.DataFrame(positions_csv).to_csv(index=False),
+                           file_name="portefeuille_data.csv", mime="text/csv", on_click="ignore")
+
+    st.divider()
+    with st.expander("📁 Nouveau portefeuille"):
+        with st.form("pf_form", clear_on_submit=True):
+            nouveau_pf = st.text_input("Nom du portefeuille")
+            if st.form_submit_button("Créer") and nouveau_pf.strip() and nouveau_pf.strip() not in liste_pf:
+                liste_pf.append(nouveau_pf.strip())
+                sauvegarder_csv_github([{"Nom": x} for x in liste_pf[1:]], portefeuilles.FICHIER)
+                st.session_state.pf_suivant = nouveau_pf.strip()
+                st.rerun()
+
+    with st.expander("⚙️ Affichage"):
+        st.checkbox("⚡ Affichage immédiat (cours actualisés en arrière-plan)", value=True, key="cours_arriere_plan")
+        st.select_slider("Largeur des graphiques (pixels)", options=[400, 800, 1200, 1600, 2400], value=1200,
+                         key="largeur_graphe", help="≈ 400 sur téléphone : moins de points envoyés")
+        st.radio("Sous-échantillonnage", MODES, horizontal=True, key="mode_graphe")
+
+    c_stats = CACHE.stats()
+    st.caption(f"Cache marché (commun) : {c_stats['hits']} hits / {c_stats['misses']} misses / "
+               f"{c_stats['partages']} partagés ({c_stats['entrees']} entrées)")
+
 # --- 6. ONGLETS ---
-t1, t2, t3, t4, t5 = st.tabs(["📊 Portefeuille", "📈 Graphiques", "🌍 Performance", "🔍 Watchlist", "💰 Valorisation"])
+t1, t2, t3, t4, t5, t6 = st.tabs(["📊 Portefeuille", "📈 Graphiques", "🌍 Performance", "🔍 Watchlist", "💰 Valorisation", "⚠️ Risques"])
 
 with t1:
     for p in positions_calculees:
         a = p['act']
         icone = "🟢" if p['pv'] >= 0 else "🔴"
-        pru_val = float(a.get('PRU', 0))
-        s_bas_auto = float(a.get('Seuil_Bas')) if pd.notnull(a.get('Seuil_Bas')) and float(a.get('Seuil_Bas',0)) > 0 else pru_val * 0.70
-        s_haut = float(a.get('Seuil_Haut', 0)) if pd.notnull(a.get('Seuil_Haut')) and float(a.get('Seuil_Haut',0)) > 0 else pru_val * 1.20
-        p_pv_pct = (p['pv'] / (pru_val * p['qte']) * 100) if (pru_val * p['qte']) > 0 else 0
+        pru_val, s_bas_auto, s_haut, p_pv_pct = p['pru'], p['sb'], p['sh'], p['pv_pct']
         
-        with st.expander(f"{icone} {a['Nom']} | {p['c_act']:.2f}€ | {p['pv']:+.2f}€ ({p_pv_pct:+.2f}%)"):
+        with st.expander(f"{icone} {a['Nom']} | {p['c_act']:.2f}€{badge(a['Ticker'])} | {p['pv']:+.2f}€ ({p_pv_pct:+.2f}%)"):
             c1, c2, c3, c4 = st.columns([2, 2, 2, 1.5])
             with c1:
                 st.write(f"**ISIN:** {a.get('ISIN')}")
@@ -184,19 +358,46 @@ with t1:
             with c2:
                 st.write(f"**Qté:** {p['qte']}")
                 st.write(f"**Valeur Actuelle:** {p['val']:.2f}€")
+                st.write(f"**Source prix:** {sources_prix.get(a['Ticker'], '-')}"
+                         + (f" (relevé {datetime.fromtimestamp(releves[a['Ticker']]).strftime('%d/%m %H:%M')})" if a['Ticker'] in releves else ""))
             with c3:
-                st.write(f"**Objectif (Haut):** {s_haut:.2f}€")
-                st.write(f"**Alerte (Bas):** {s_bas_auto:.2f}€")
+                dyn = p.get('dyn')
+                if dyn:
+                    st.write(f"**Règle:** {libelle(a['Regle'])}")
+                    if lire_regle(a['Regle'])[0] == MM:
+                        st.write(f"**MM courte / longue:** {dyn['valeur']:.2f}€ / {dyn['bas']:.2f}€")
+                    else:
+                        if dyn['haut']: st.write(f"**Objectif (Haut):** {dyn['haut']:.2f}€")
+                        st.write(f"**Alerte (Bas):** {dyn['bas']:.2f}€")
+                else:
+                    st.write(f"**Objectif (Haut):** {s_haut:.2f}€")
+                    st.write(f"**Alerte (Bas):** {s_bas_auto:.2f}€")
             
             with c4:
                 col_ed, col_sel, col_del = st.columns(3)
                 if col_ed.button("✏️", key=f"ed_{p['idx']}"): st.session_state[f"edit_{p['idx']}"] = True
                 if col_sel.button("🛒", key=f"sell_{p['idx']}"): st.session_state[f"sell_mode_{p['idx']}"] = True
                 if col_del.button("🗑️", key=f"del_{p['idx']}"):
+                    journaliser(AJUSTEMENT, a['Ticker'])
                     st.session_state.mon_portefeuille.pop(p['idx'])
-                    sauvegarder_csv_github(st.session_state.mon_portefeuille, "portefeuille_data.csv")
+                    sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
                     st.rerun()
 
+            if st.session_state.get(f"sell_mode_{p['idx']}", False):
+                with st.form(f"f_sell_{p['idx']}"):
+                    st.subheader(f"🛒 Vendre {a['Nom']}")
+                    v_qte = st.number_input("Quantité vendue", min_value=0.0, max_value=float(p['qte']), value=float(p['qte']))
+                    v_prix = st.number_input("Prix de vente (€)", min_value=0.0, value=float(p['c_act']))
+                    if st.form_submit_button("Confirmer la vente") and v_qte > 0:
+                        pos = journaliser(VENTE, a['Ticker'], qte=v_qte, prix=v_prix)
+                        if pos['Qté'] <= 0:
+                            st.session_state.mon_portefeuille.pop(p['idx'])
+                        else:
+                            st.session_state.mon_portefeuille[p['idx']]['Qté'] = pos['Qté']
+                        sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
+                        st.session_state[f"sell_mode_{p['idx']}"] = False
+                        st.rerun()
+
             if st.session_state.get(f"edit_{p['idx']}", False):
                 with st.form(f"f_edit_{p['idx']}"):
                     st.subheader(f"Réglages de {a['Nom']}")
@@ -204,6 +405,10 @@ with t1:
                     n_qte = st.number_input("Nouvelle Qté", value=float(p['qte']))
                     n_sh = st.number_input("Seuil Haut", value=s_haut)
                     n_sb = st.number_input("Seuil Bas", value=s_bas_auto)
+                    # Règle personnalisée (ex. 'atr:20:3') conservée si elle n'est pas dans les préréglages
+                    regle_init = a.get('Regle') if lire_regle(a.get('Regle')) else ""
+                    choix_regles = {**PRESETS, **({libelle(regle_init): regle_init} if regle_init not in PRESETS.values() else {})}
+                    n_regle = st.selectbox("Règle de seuil", list(choix_regles), index=list(choix_regles.values()).index(regle_init))
                     
                     st.divider()
                     st.write("⚠️ **Correction manuelle du prix**")
@@ -211,10 +416,15 @@ with t1:
                     n_prix_man = st.number_input("Forcer le prix de la part (€)", value=val_man_init, help="Saisir la VL si Yahoo est KO")
                     
                     if st.form_submit_button("Valider"):
+                        if n_pru != pru_val or n_qte != float(p['qte']):
+                            journaliser(AJUSTEMENT, a['Ticker'], qte=n_qte, prix=n_pru)
+                        if n_prix_man != val_man_init:
+                            journaliser(PRIX_MANUEL, a['Ticker'], prix=n_prix_man)
                         st.session_state.mon_portefeuille[p['idx']].update({
-                            "PRU": n_pru, "Qté": n_qte, "Seuil_Haut": n_sh, "Seuil_Bas": n_sb, "Prix_Manuel": n_prix_man
+                            "PRU": n_pru, "Qté": n_qte, "Seuil_Haut": n_sh, "Seuil_Bas": n_sb, "Prix_Manuel": n_prix_man,
+                            "Regle": choix_regles[n_regle]
                         })
-                        sauvegarder_csv_github(st.session_state.mon_portefeuille, "portefeuille_data.csv")
+                        sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
                         st.session_state[f"edit_{p['idx']}"] = False
                         st.rerun()
 
@@ -228,50 +438,40 @@ with t2:
         map_p = {"Aujourd'hui": ("1d", "1m"), "1 mois": ("1mo", "60m"), "6 mois": ("6mo", "1d"), "1 an": ("1y", "1d"), "5 ans": ("5y", "1wk")}
         
         # Tentative intelligente pour le graphique
-        d_h = yf.download(info['Ticker'], period=map_p[per][0], interval=map_p[per][1], progress=False)
-        if (d_h is None or d_h.empty) and info.get('ISIN'):
-            for code in [info['ISIN'], f"{info['ISIN']}.PA"]:
-                d_h = yf.download(code, period=map_p[per][0], interval=map_p[per][1], progress=False)
-                if not d_h.empty: break
+        with mesure("historique_t2", ticker=info['Ticker'], periode=per):
+            d_h = ohlc(info['Ticker'], map_p[per][0], map_p[per][1])
+            if (d_h is None or d_h.empty) and info.get('ISIN'):
+                for code in [info['ISIN'], f"{info['ISIN']}.PA"]:
+                    d_h = ohlc(code, map_p[per][0], map_p[per][1])
+                    if not d_h.empty: break
         
-        tracer_courbe(d_h, f"{choix} ({per})", pru=info['PRU'], s_h=info.get('Seuil_Haut'), s_b=info.get('Seuil_Bas'))
+        s_h, s_b, tracees = info.get('Seuil_Haut'), info.get('Seuil_Bas'), []
+        if lire_regle(info.get('Regle')) and d_h is not None and not d_h.empty:
+            # Niveaux de la règle rejoués sur les bougies journalières depuis l'achat, reportés sur l'axe du graphique
+            depuis = date_achat(info.get('Date_Achat'))
+            niv = courbes_seuils(info['Regle'], ohlc(info['Ticker'], periode_depuis(depuis), "1d"), depuis)
+            if not niv.empty:
+                jours = d_h.index.tz_localize(None) if d_h.index.tz is not None else d_h.index
+                niv = niv.reindex(jours.normalize(), method='ffill').set_axis(d_h.index)
+                d_h = d_h.join(niv)
+                tracees = list(niv.columns)
+                s_h = s_b = None
+        tracer_courbe(d_h, f"{choix} ({per})", pru=info['PRU'], s_h=s_h, s_b=s_b, courbes=tracees)
 
 with t3:
-    st.subheader("📈 Évolution Portefeuille (1 mois)")
-    tickers = [x['Ticker'] for x in st.session_state.mon_portefeuille]
-    
-    if tickers:
+    st.subheader("📈 Évolution Portefeuille")
+    per_t3 = st.selectbox("Période", ["1 mois", "6 mois", "1 an", "5 ans", "Tout"], key="per_t3")
+
+    if st.session_state.mon_portefeuille:
         try:
-            # On télécharge les données pour tous les tickers d'un coup
-            data = yf.download(tickers, period="1mo", interval="1d", progress=False)
-            
-            # Nettoyage des données selon le format retourné par Yahoo
-            if isinstance(data.columns, pd.MultiIndex):
-                close_data = data['Close']
-            else:
-                close_data = data[['Close']] if len(tickers) == 1 else data['Close']
-
-            if not close_data.empty:
-                # Création d'un DataFrame de base avec les dates
-                v_tot = pd.Series(0.0, index=close_data.index)
-                
-                for a in st.session_state.mon_portefeuille:
-                    t = a['Ticker']
-                    q = float(a['Qté'])
-                    
-                    if t in close_data.columns:
-                        # On remplit les éventuels trous (NaN) par la dernière valeur connue
-                        serie_titre = close_data[t].ffill().bfill()
-                        v_tot += serie_titre * q
-                    else:
-                        # Si le ticker n'est pas dans l'historique (cas des OPCVM)
-                        # On ajoute une valeur constante basée sur le prix actuel
-                        p_actuel = prices.get(t, 0.0)
-                        v_tot += p_actuel * q
-                
-                # Conversion en DataFrame pour la fonction tracer_courbe
-                df_performance = pd.DataFrame({'Close': v_tot})
-                tracer_courbe(df_performance, "Valeur Totale (€)")
+            # Série journalière matérialisée (quantités datées par le grand livre) : seuls les nouveaux jours sont calculés
+            with mesure("historique_t3", periode=per_t3):
+                serie = serie_valeur(livre.evenements(), prices, portefeuilles.identifiant(actif) or "portefeuille")
+            map_t3 = {"1 mois": "1mo", "6 mois": "6mo", "1 an": "1y", "5 ans": "5y"}
+            if per_t3 in map_t3: serie = serie[serie.index >= debut_periode(map_t3[per_t3])]
+
+            if not serie.empty:
+                tracer_courbe(serie.rename(columns={'Valeur': 'Close'}), "Valeur Totale (€)", courbes=["Investi", "Dividendes"])
             else:
                 st.warning("Yahoo Finance n'a retourné aucune donnée historique pour ces tickers.")
         except Exception as e:
@@ -302,7 +502,7 @@ with t4:
                     st.session_state.ma_watchlist.append({
                         "Nom": wn, "ISIN": isin_w, "Ticker": wt.upper(), "Seuil_Alerte": ws
                     })
-                    sauvegarder_csv_github(st.session_state.ma_watchlist, "watchlist_data.csv")
+                    sauvegarder_csv_github(st.session_state.ma_watchlist, fichier("watchlist_data.csv"))
                     st.session_state.w_form = False
                     st.rerun()
 
@@ -315,7 +515,7 @@ with t4:
             cw = prices.get(w['Ticker'], 0.0)
             col1, col2, col3, col_btn = st.columns([3, 2, 2, 3.5])
             col1.write(f"**{w['Nom']}** ({w['Ticker']})")
-            col2.write(f"Cours: {cw:.2f}€")
+            col2.write(f"Cours: {cw:.2f}€{badge(w['Ticker'])}")
             col3.write(f"Cible: {w.get('Seuil_Alerte', 0):.2f}€")
             
             c_buy, c_edit, c_del = col_btn.columns(3)
@@ -323,7 +523,7 @@ with t4:
             if c_edit.button("✏️", key=f"btn_edit_{j}"): st.session_state.form_actif = ("editing", j)
             if c_del.button("🗑️", key=f"btn_del_{j}"):
                 st.session_state.ma_watchlist.pop(j)
-                sauvegarder_csv_github(st.session_state.ma_watchlist, "watchlist_data.csv")
+                sauvegarder_csv_github(st.session_state.ma_watchlist, fichier("watchlist_data.csv"))
                 st.rerun()
 
             # Formulaire de transfert (Achat) simplifié
@@ -333,14 +533,10 @@ with t4:
                     fb_q = st.number_input("Quantité", min_value=0.1, step=0.1)
                     fb_p = st.number_input("PRU (€)", value=cw)
                     if st.form_submit_button("Confirmer l'achat"):
-                        st.session_state.mon_portefeuille.append({
-                            "Nom": w['Nom'], "ISIN": w['ISIN'], "Ticker": w['Ticker'],
-                            "PRU": fb_p, "Qté": fb_q, "Date_Achat": str(date.today()),
-                            "Seuil_Haut": fb_p*1.2, "Seuil_Bas": fb_p*0.8, "Prix_Manuel": 0.0
-                        })
+                        acheter(w['Nom'], w['ISIN'], w['Ticker'], fb_p, fb_q, date.today())
                         st.session_state.ma_watchlist.pop(j)
-                        sauvegarder_csv_github(st.session_state.mon_portefeuille, "portefeuille_data.csv")
-                        sauvegarder_csv_github(st.session_state.ma_watchlist, "watchlist_data.csv")
+                        sauvegarder_csv_github(st.session_state.mon_portefeuille, fichier("portefeuille_data.csv"))
+                        sauvegarder_csv_github(st.session_state.ma_watchlist, fichier("watchlist_data.csv"))
                         st.session_state.form_actif = None
                         st.rerun()
 
@@ -354,45 +550,64 @@ with t5:
             dm = st.number_input("Montant Net (€)", min_value=0.01)
             if st.form_submit_button("Enregistrer"):
                 st.session_state.mes_dividendes.append({"Ticker":dt, "Date":str(date.today()), "Montant":dm})
-                sauvegarder_csv_github(st.session_state.mes_dividendes, "dividendes_data.csv")
+                journaliser(DIVIDENDE, dt, montant=dm)
+                sauvegarder_csv_github(st.session_state.mes_dividendes, fichier("dividendes_data.csv"))
                 st.rerun()
 
     # Affichage du Tableau de Valorisation
     if st.session_state.mon_portefeuille:
-        df_d = pd.DataFrame(st.session_state.mes_dividendes)
-        bilan = []
-        g_i, g_a, g_d = 0.0, 0.0, 0.0
-        
-        for a in st.session_state.mon_portefeuille:
-            p_a = prices.get(a['Ticker'], 0.0)
-            q = float(a['Qté'])
-            i = float(a['PRU']) * q
-            v = p_a * q
-            d = df_d[df_d['Ticker'] == a['Ticker']]['Montant'].sum() if not df_d.empty else 0.0
-            
-            g_i += i
-            g_a += v
-            g_d += d
-            
-            bilan.append({
-                "Action": a['Nom'],
-                "Investi": round(i, 2),
-                "P/L Bourse": round(v - i, 2),
-                "Dividendes": round(d, 2),
-                "Rendement Réel": f"{((v + d - i) / i * 100 if i > 0 else 0):+.2f}%"
-            })
-        
-        # Ligne de Total
-        bilan.append({
-            "Action": "🏆 TOTAL PORTEFEUILLE",
-            "Investi": round(g_i, 2),
-            "P/L Bourse": round(g_a - g_i, 2),
-            "Dividendes": round(g_d, 2),
-            "Rendement Réel": f"{((g_a + g_d - g_i) / g_i * 100 if g_i > 0 else 0):+.2f}%"
-        })
-        
-        st.table(pd.DataFrame(bilan))
+        st.table(bilan(df_val))
+        st.metric("P/L réalisé (ventes)", f"{livre.pv_realisee():+.2f} €")
     else:
         st.info("Portefeuille vide.")
 
+with t6:
+    st.header("⚠️ Risques (1 an de clôtures)")
+    if st.session_state.mon_portefeuille:
+        # Matrice des rendements du stock local + indice de référence ; résultat mémorisé pour la journée
+        with mesure("risques", lignes=len(df_val)):
+            clot = clotures_locales(list(dict.fromkeys(df_val['Ticker'].tolist() + [risques.INDICE])), "1y")
+            res = risques.analyser(clot, df_val.groupby('Ticker')['Valeur'].sum().to_dict())
+
+        if res is None:
+            st.warning("Pas d'historique disponible pour calculer les risques.")
+        else:
+            valeur_couverte = total_actuel * res['couverture']
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Volatilité annualisée", f"{res['volatilite'] * 100:.1f} %")
+            c2.metric("Drawdown max", f"{res['drawdown_max'] * 100:.1f} %", delta=f"actuel {res['drawdown_courant'] * 100:.1f} %", delta_color="off")
+            c3.metric(f"Bêta vs {risques.INDICE}", f"{res['beta']:.2f}" if pd.notna(res['beta']) else "-")
+            c4, c5 = st.columns(2)
+            c4.metric("VaR 95% 1 jour (historique)", f"{res['var_historique'] * valeur_couverte:.2f} €", delta=f"{res['var_historique'] * 100:.2f} %", delta_color="off")
+            c5.metric("VaR 95% 1 jour (paramétrique)", f"{res['var_parametrique'] * valeur_couverte:.2f} €", delta=f"{res['var_parametrique'] * 100:.2f} %", delta_color="off")
+            if res['couverture'] < 0.999:
+                st.caption(f"Lignes avec historique : {res['couverture'] * 100:.0f} % de la valeur (OPCVM sans cotation Yahoo exclus)")
+
+            tracer_courbe(pd.DataFrame({'Close': res['drawdown'] * 100}), "Drawdown du portefeuille (%)")
+
+            noms = df_val.drop_duplicates('Ticker').set_index('Ticker')['Nom']
+            lignes = res['lignes'].mul(100).round(1).assign(**{"Bêta": res['lignes'].get("Bêta", pd.Series(dtype='float64')).round(2)})
+            lignes.insert(0, "Action", noms.reindex(lignes.index).fillna(""))
+            st.dataframe(lignes.sort_values("Poids", ascending=False), use_container_width=True)
 
+            with mesure("rendu_plotly", titre="Corrélations", points=res['correlation'].size):
+                import plotly.graph_objects as go
+                corr = res['correlation']
+                fig = go.Figure(go.Heatmap(z=corr.to_numpy(), x=noms.reindex(corr.columns).fillna(pd.Series(corr.columns, index=corr.columns)),
+                                           y=noms.reindex(corr.index).fillna(pd.Series(corr.index, index=corr.index)), zmin=-1, zmax=1, colorscale="RdBu_r"))
+                fig.update_layout(template="plotly_dark", title="Corrélations des rendements", height=600, margin=dict(l=10, r=10, t=50, b=10))
+                st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.info("Portefeuille vide.")
+
+# --- 7. PANNEAU DE DEBUG (PERFORMANCES) ---
+with st.sidebar:
+    if st.checkbox("🐞 Debug performances", key="debug_perf"):
+        evts = pd.DataFrame(evenements(debut_run))
+        if evts.empty:
+            st.caption("Aucun événement pour ce rerun.")
+        else:
+            phases = evts[(evts['type'] == 'phase') & ~evts['nom'].str.contains('.', regex=False)]
+            st.caption(f"Phases : {phases['duree_ms'].sum():.0f} ms | HTTP : {(evts['type'] == 'http').sum()} appels")
+            colonnes = [c for c in ['type', 'nom', 'duree_ms', 'octets', 'points', 'envoyes', 'webgl', 'cache', 'ticker', 'symbole', 'source', 'statut'] if c in evts.columns]
+            st.dataframe(evts.sort_values('duree_ms', ascending=False)[colonnes], hide_index=True)
@@ -0,0 +1,81 @@
+""" Temps d'import au démarrage (cron des alertes et application), imports différés ou non.
+
+    python benchmarks/demarrage.py --repetitions 5 --sortie demarrage.json
+
+Chaque mesure est un processus Python neuf (comme un lancement de cron) ; la
+variante "immédiat" ajoute les imports de yfinance / bs4 / plotly que les
+modules faisaient avant de les différer. La sortie est un JSON (durée médiane,
+modules lourds effectivement chargés, plus gros imports d'après -X importtime).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOURDS = ["yfinance", "bs4", "plotly"]
+# Imports de tête de check_alerts.py et de app.py
+CRON = ["pandas", "requests", "noyau", "cotations", "historique_local", "valorisation", "alertes_etat",
+        "portefeuilles", "risques", "seuils_dynamiques"]
+APP = ["streamlit", "pandas", "noyau", "cotations", "cache_marche", "instantane_cotations", "historique_local",
+       "valorisation", "serie_valeur", "graphiques", "risques", "seuils_dynamiques", "persistance", "portefeuilles",
+       "grand_livre", "routage", "releves_courtier", "instrumentation"]
+IMMEDIATS = ["yfinance", "bs4", "plotly.graph_objects"]
+
+SONDE = """
+import sys, time
+debut = time.perf_counter()
+{imports}
+duree = time.perf_counter() - debut
+print(duree, ",".join(m for m in {lourds!r} if m in sys.modules))
+"""
+
+def mesurer(modules, repetitions):
+    """ (durée médiane en s, modules lourds chargés) sur des processus neufs """
+    code = SONDE.format(imports="\n".join(f"import {m}" for m in modules), lourds=LOURDS)
+    durees, charges = [], ""
+    for _ in range(repetitions):
+        sortie = subprocess.run([sys.executable, "-c", code], cwd=RACINE, capture_output=True, text=True, check=True)
+        duree, _, charges = sortie.stdout.strip().partition(" ")
+        durees.append(float(duree))
+    return statistics.median(durees), [m for m in charges.split(",") if m]
+
+def plus_gros(modules, n=5):
+    """ Imports de premier niveau les plus coûteux (cumulé, en ms) d'après -X importtime """
+    code = "\n".join(f"import {m}" for m in modules)
+    sortie = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=RACINE, capture_output=True, text=True, check=True)
+    res = []
+    for ligne in sortie.stderr.splitlines():
+        if not ligne.startswith("import time:") or ligne.count("|") != 2: continue
+        _, cumule, nom = ligne[12:].split("|")
+        if cumule.strip().isdigit() and not nom[1:].startswith(" "):   # les sous-imports sont indentés
+            res.append((nom.strip(), int(cumule) / 1000))
+    return [{"module": m, "ms": round(ms, 1)} for m, ms in sorted(res, key=lambda x: -x[1])[:n]]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--sortie", help="fichier JSON (sinon stdout)")
+    args = parser.parse_args()
+
+    resultats = []
+    for nom, modules in (("check_alerts", CRON), ("app", APP)):
+        for variante, liste in (("différé", modules), ("immédiat", modules + IMMEDIATS)):
+            duree, charges = mesurer(liste, args.repetitions)
+            resultats.append({"entree": nom, "variante": variante, "secondes": round(duree, 3),
+                              "lourds_charges": charges, "plus_gros": plus_gros(liste)})
+            print(f"{nom:13} {variante:9} {duree * 1000:8.0f} ms  lourds : {', '.join(charges) or '-'}", file=sys.stderr)
+        avant, apres = resultats[-1]["secondes"], resultats[-2]["secondes"]
+        print(f"{nom:13} gain au démarrage : {(avant - apres) * 1000:.0f} ms ({(avant - apres) / avant * 100:.0f}%)", file=sys.stderr)
+
+    sortie = json.dumps({"python": sys.version.split()[0], "resultats": resultats}, indent=1, ensure_ascii=False)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f: f.write(sortie)
+    else:
+        print(sortie)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+""" Benchmarks des chemins critiques (cotations, valorisation, t3, scan des alertes, CSV GitHub).
+
+    python benchmarks/run.py --tailles 17,200,2000 --latence 0.05 --sortie bench.json
+
+Le réseau est remplacé par les bouchons de stubs.py ; la sortie est un JSON
+(durée médiane, pic mémoire et nombre d'appels réseau par mesure).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+RACINE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RACINE)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+import requests
+import yfinance as yf
+
+import stubs
+import analyse_alertes
+import historique_local
+import noyau
+import portefeuilles
+import serie_valeur
+from alertes_etat import EtatAlertes
+from cache_marche import CACHE
+from cotations import recuperer_cotations, prix_manuels
+from persistance import ClientCSV, DepotGitHub, SourceGitHub
+from routage import TableRoutage
+from seuils_dynamiques import MoteurSeuils
+from valorisation import valoriser, totaux, bilan
+
+def installer_bouchons(latence):
+    """ Remplace yfinance et requests ; renvoie le faux GitHub (contenu des CSV à renseigner) """
+    faux = stubs.FauxYf(latence)
+    yf.download = faux.download
+    yf.Ticker = faux.Ticker
+    github = stubs.FauxGitHub(latence)
+    requests.get = stubs.faux_get(latence, github)
+    requests.post = github.post
+    requests.patch = github.patch
+    return github
+
+def mesurer(fonction, repetitions, avant=None):
+    """ (durée médiane, pic mémoire en Ko) ; tracemalloc ralentit beaucoup pandas,
+    le pic mémoire est donc mesuré sur un passage supplémentaire non chronométré """
+    durees = []
+    for _ in range(repetitions):
+        if avant: avant()
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    if avant: avant()
+    tracemalloc.start()
+    fonction()
+    pic = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(durees), pic / 1024
+
+def scenarios(n, dossier, github):
+    positions = stubs.portefeuille_synthetique(n)
+    watchlist = stubs.watchlist_synthetique(max(1, n * 11 // 17))
+    dividendes = stubs.dividendes_synthetiques(positions)
+    ticker_to_isin = {x['Ticker']: x.get('ISIN') for x in positions + watchlist}
+    tickers = [p['Ticker'] for p in positions]
+    prix = {t: 50.0 for t in ticker_to_isin}
+    evenements = serie_valeur.evenements_positions(positions, dividendes)
+
+    def vider_stock():
+        CACHE.vider()
+        historique_local._memoire.clear()
+        historique_local._debuts.clear()
+        serie_valeur._memoire.clear()
+        for f in os.listdir(dossier): os.remove(os.path.join(dossier, f))
+
+    def nouveau_processus():
+        # Comme un lancement de cron : stock sur disque mais rien en mémoire
+        CACHE.vider()
+        historique_local._memoire.clear()
+        historique_local._debuts.clear()
+
+    def cotations():
+        recuperer_cotations(ticker_to_isin, prix_manuels(positions))
+
+    routage = TableRoutage()
+
+    def cotations_routees():
+        recuperer_cotations(ticker_to_isin, prix_manuels(positions), routage=routage)
+
+    def valorisation():
+        df = valoriser(positions, prix, dividendes)
+        totaux(df)
+        bilan(df)
+
+    def performance():
+        serie_valeur.serie_valeur(evenements, prix)
+
+    # CSV du dépôt : lecture à froid (parsing) puis relecture conditionnelle (If-None-Match -> 304, frame gardé)
+    csv = {"portefeuille_data.csv": positions, "watchlist_data.csv": watchlist, "dividendes_data.csv": dividendes}
+    github.fichiers.update({f: pd.DataFrame(l).to_csv(index=False) for f, l in csv.items()})
+    client = ClientCSV(SourceGitHub("jeton", "bench/portefeuille"))
+
+    def lire_csv():
+        for f in csv: client.lire(f)
+
+    def oublier_csv():
+        for f in csv: client.oublier(f)
+
+    # Écritures : les trois fichiers d'une action partent en un commit, ou un commit par fichier sans regroupement
+    depot = DepotGitHub("jeton", "bench/portefeuille", delai=3600)
+
+    def enregistrer_lot():
+        for f, l in csv.items(): depot.enregistrer(l, f)
+        depot.vider_file()
+
+    def enregistrer_un_par_un():
+        for f, l in csv.items():
+            depot.enregistrer(l, f)
+            depot.vider_file()
+
+    # Scan du cron (check_alerts.py) : stock local sur 7 jours, puis la même analyse que le cron, sans les risques
+    def scan():
+        stock = historique_local.mettre_a_jour(list(ticker_to_isin), "7d")
+        p, p_h = noyau.cours_stock(stock)
+        analyse_alertes.analyser(portefeuilles.PRINCIPAL, pd.DataFrame(positions), pd.DataFrame(watchlist), p, p_h,
+                                 stock, EtatAlertes(os.path.join(dossier, "etat.json")),
+                                 MoteurSeuils(os.path.join(dossier, "_seuils.json")))
+
+    return [
+        ("cotations", "froid", cotations, CACHE.vider),
+        ("cotations", "chaud", cotations, None),
+        # 2e passage à froid : le routage a appris les sources et mis les échecs en quarantaine
+        ("cotations", "froid_routage", cotations_routees, CACHE.vider),
+        ("valorisation", "-", valorisation, None),
+        ("performance_t3", "froid", performance, vider_stock),
+        ("performance_t3", "chaud", performance, None),
+        ("scan_alertes", "froid", scan, vider_stock),
+        ("scan_alertes", "stock_local", scan, nouveau_processus),
+        ("csv_github", "froid", lire_csv, oublier_csv),
+        ("csv_github", "etag_304", lire_csv, None),
+        ("depot_github", "lot", enregistrer_lot, None),
+        ("depot_github", "par_fichier", enregistrer_un_par_un, None),
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tailles", default="17,100,1000,5000", help="nombres de lignes du portefeuille")
+    parser.add_argument("--latence", type=float, default=0.05, help="latence simulée par appel réseau (s)")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--sortie", help="fichier JSON (sinon stdout)")
+    args = parser.parse_args()
+
+    latence = stubs.Latence(args.latence)
+    github = installer_bouchons(latence)
+    resultats = []
+    with tempfile.TemporaryDirectory() as dossier:
+        historique_local.DOSSIER = serie_valeur.DOSSIER = dossier
+        for n in [int(x) for x in args.tailles.split(",")]:
+            for nom, variante, fonction, avant in scenarios(n, dossier, github):
+                appels = latence.appels
+                duree, pic = mesurer(fonction, args.repetitions, avant)
+                resultats.append({
+                    "benchmark": nom, "variante": variante, "lignes": n,
+                    "secondes": round(duree, 6), "pic_memoire_ko": round(pic, 1),
+                    "appels_reseau": (latence.appels - appels) // (args.repetitions + 1),
+                })
+                print(f"{nom:15} {variante:12} {n:6} lignes  {duree * 1000:9.1f} ms  {pic:9.0f} Ko", file=sys.stderr)
+
+    sortie = json.dumps({"latence": args.latence, "resultats": resultats}, indent=1)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f: f.write(sortie)
+    else:
+        print(sortie)
+
+if __name__ == "__main__":
+    main()
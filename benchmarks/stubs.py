@@ -0,0 +1,127 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+# --- BOUCHONS RÉSEAU POUR LES BENCHMARKS ---
+# Remplacent yfinance / requests par des réponses synthétiques avec une latence
+# réglable : les mesures ne dépendent ni du réseau ni de Yahoo.
+
+class Latence:
+    def __init__(self, secondes=0.0):
+        self.secondes = secondes
+        self.appels = 0
+
+    def attendre(self):
+        self.appels += 1
+        if self.secondes: time.sleep(self.secondes)
+
+def portefeuille_synthetique(n, part_opcvm=0.1, graine=0):
+    """ n positions au format de portefeuille_data.csv ; une part sans historique Yahoo (OPCVM) """
+    rng = np.random.default_rng(graine)
+    pru = rng.uniform(5, 400, n).round(2)
+    lignes = []
+    for i in range(n):
+        opcvm = i < int(n * part_opcvm)
+        lignes.append({
+            "Nom": f"VALEUR {i}", "Ticker": f"0P{i:08d}.F" if opcvm else f"T{i:04d}.PA",
+            "PRU": pru[i], "Qté": float(rng.integers(1, 100)), "Seuil_Haut": pru[i] * 1.2,
+            "Date_Achat": "2025-01-02", "ISIN": f"FR{i:010d}", "Seuil_Bas": pru[i] * 0.8, "Prix_Manuel": 0.0,
+        })
+    return lignes
+
+def watchlist_synthetique(n, graine=1):
+    rng = np.random.default_rng(graine)
+    return [{"Nom": f"CIBLE {i}", "ISIN": f"W{i:04d}.PA", "Ticker": f"W{i:04d}.PA",
+             "Seuil_Alerte": float(rng.uniform(5, 100))} for i in range(n)]
+
+def dividendes_synthetiques(positions, par_ligne=4, graine=2):
+    rng = np.random.default_rng(graine)
+    return [{"Ticker": p["Ticker"], "Date": "2025-06-01", "Montant": float(rng.uniform(1, 50))}
+            for p in positions for _ in range(par_ligne)]
+
+def _jours(period=None, start=None):
+    fin = pd.Timestamp("2026-10-16")
+    if start is not None: return pd.bdate_range(start, fin)
+    n = {"1d": 1, "2d": 2, "7d": 5, "1mo": 22, "6mo": 130, "1y": 260, "5y": 1300}.get(period, 22)
+    return pd.bdate_range(end=fin, periods=n)
+
+def _connu(ticker):
+    return not ticker.startswith("0P")
+
+class FauxYf:
+    """ Sous-ensemble de l'API yfinance utilisé par le projet """
+
+    def __init__(self, latence):
+        self.latence = latence
+
+    def download(self, tickers, period=None, interval="1d", start=None, **kwargs):
+        self.latence.attendre()
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        idx = _jours(period, start)
+        connus = [t for t in tickers if _connu(t)]
+        rng = np.random.default_rng(len(idx))
+        close = 50 + rng.standard_normal((len(idx), len(tickers))).cumsum(axis=0)
+        close[:, [i for i, t in enumerate(tickers) if not _connu(t)]] = np.nan
+        cols = pd.MultiIndex.from_product([["Close", "Open", "High", "Low", "Volume"], tickers], names=["Price", "Ticker"])
+        return pd.DataFrame(np.tile(close, 5), index=idx, columns=cols) if connus else pd.DataFrame()
+
+    def Ticker(self, symbole):
+        faux = self
+        class _Ticker:
+            news = []
+            def history(self, period="1d", **kwargs):
+                faux.latence.attendre()
+                if not _connu(symbole) or symbole.startswith("FR"):
+                    return pd.DataFrame()
+                return pd.DataFrame({"Close": [42.0]}, index=_jours(period)[-1:])
+        return _Ticker()
+
+class FausseReponse:
+    def __init__(self, texte="", statut=200, donnees=None, etag='"bench"'):
+        self.text = texte
+        self.content = texte.encode("utf-8")
+        self.status_code = statut
+        self.headers = {"ETag": etag}
+        self.donnees = donnees or {}
+
+    def json(self):
+        return self.donnees
+
+    def raise_for_status(self):
+        pass
+
+def faux_get(latence, github=None):
+    """ requests.get : page Yahoo avec un fin-streamer pour le scraping, API GitHub confiée à `github` """
+    def get(url, **kwargs):
+        if github and url.startswith("https://api.github.com/"): return github.get(url, **kwargs)
+        latence.attendre()
+        return FausseReponse('<fin-streamer data-field="regularMarketPrice" value="12.34"></fin-streamer>')
+    return get
+
+class FauxGitHub:
+    """ API GitHub : contenu des CSV avec ETag (304 si inchangé) et création de commits (arbre, commit, ref) """
+
+    def __init__(self, latence):
+        self.latence = latence
+        self.fichiers = {}   # nom -> contenu CSV
+        self.commits = 0
+
+    def get(self, url, headers=None, **kwargs):
+        self.latence.attendre()
+        if "/contents/" in url:
+            contenu = self.fichiers[url.split("/contents/", 1)[1]]
+            etag = f'"{hash(contenu)}"'
+            if (headers or {}).get("If-None-Match") == etag: return FausseReponse(statut=304, etag=etag)
+            return FausseReponse(contenu, etag=etag)
+        if "/git/ref/" in url: return FausseReponse(donnees={"object": {"sha": "head"}})
+        return FausseReponse(donnees={"tree": {"sha": "arbre"}})
+
+    def post(self, url, **kwargs):
+        self.latence.attendre()
+        if url.endswith("/commits"): self.commits += 1
+        return FausseReponse(donnees={"sha": f"sha{self.commits}"})
+
+    def patch(self, url, **kwargs):
+        self.latence.attendre()
+        return FausseReponse()
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from instrumentation import mesure
+
+# --- CACHE DE DONNÉES DE MARCHÉ ---
+# Partagé par tout le processus : les reruns Streamlit, les onglets ouverts et
+# tous les portefeuilles réutilisent les mêmes entrées tant qu'elles ne sont pas
+# expirées. Un ticker déjà en cours de téléchargement pour une autre session
+# n'est pas redemandé : on attend le résultat.
+
+PARIS = ZoneInfo("Europe/Paris")
+OUVERTURE = (9, 0)
+CLOTURE = (17, 30)
+
+def bourse_ouverte(maintenant=None):
+    """ Euronext Paris : du lundi au vendredi, 9h00 - 17h30 (heure de Paris) """
+    maintenant = (maintenant or datetime.now(PARIS)).astimezone(PARIS)
+    if maintenant.weekday() >= 5: return False
+    hm = (maintenant.hour, maintenant.minute)
+    return OUVERTURE <= hm < CLOTURE
+
+def prochaine_ouverture(maintenant=None):
+    maintenant = (maintenant or datetime.now(PARIS)).astimezone(PARIS)
+    jour = maintenant.replace(hour=OUVERTURE[0], minute=OUVERTURE[1], second=0, microsecond=0)
+    if maintenant >= jour: jour += timedelta(days=1)
+    while jour.weekday() >= 5: jour += timedelta(days=1)
+    return jour
+
+class CacheMarche:
+    """ Cache LRU à durée de vie dépendant des heures de marché.
+    Clé : (ticker, period, interval) """
+
+    def __init__(self, max_entrees=4096, ttl_ouvert=60, ttl_ferme=6 * 3600):
+        self.max_entrees = max_entrees
+        self.ttl_ouvert = ttl_ouvert
+        self.ttl_ferme = ttl_ferme
+        self.hits = 0
+        self.misses = 0
+        self.partages = 0
+        self._entrees = OrderedDict()
+        self._en_vol = {}   # clé -> Event des téléchargements en cours
+        self._lock = threading.Lock()
+
+    def ttl_courant(self, maintenant=None):
+        """ TTL court en séance, long hors séance (sans dépasser la prochaine ouverture) """
+        maintenant = (maintenant or datetime.now(PARIS)).astimezone(PARIS)
+        if bourse_ouverte(maintenant): return self.ttl_ouvert
+        jusqu_ouverture = (prochaine_ouverture(maintenant) - maintenant).total_seconds()
+        return max(self.ttl_ouvert, min(self.ttl_ferme, jusqu_ouverture))
+
+    def get(self, cle):
+        with self._lock:
+            entree = self._entrees.get(cle)
+            if entree is None or entree[0] < time.monotonic():
+                if entree is not None: del self._entrees[cle]
+                self.misses += 1
+                return None
+            self._entrees.move_to_end(cle)
+            self.hits += 1
+            return entree[1]
+
+    def set(self, cle, valeur, ttl=None):
+        expiration = time.monotonic() + (ttl if ttl is not None else self.ttl_courant())
+        with self._lock:
+            self._entrees[cle] = (expiration, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.max_entrees:
+                self._entrees.popitem(last=False)
+
+    def reserver(self, cles):
+        """ (clés à télécharger soi-même, Events des clés déjà en cours ailleurs) """
+        a_moi, attentes = [], []
+        with self._lock:
+            for cle in cles:
+                if cle in self._en_vol:
+                    attentes.append(self._en_vol[cle])
+                    self.partages += 1
+                else:
+                    self._en_vol[cle] = threading.Event()
+                    a_moi.append(cle)
+        return a_moi, attentes
+
+    def liberer(self, cles):
+        with self._lock:
+            for cle in cles:
+                evt = self._en_vol.pop(cle, None)
+                if evt: evt.set()
+
+    def vider(self):
+        with self._lock:
+            self._entrees.clear()
+            self.hits = self.misses = self.partages = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entrees": len(self._entrees), "hits": self.hits, "misses": self.misses,
+                    "partages": self.partages, "taux": (self.hits / total) if total else 0.0}
+
+CACHE = CacheMarche()
+
+# --- HISTORIQUES OHLC ---
+def decouper_par_ticker(data, tickers):
+    """ Sépare un yf.download multi-tickers en un DataFrame OHLC par ticker """
+    if data is None or data.empty: return {}
+    if not isinstance(data.columns, pd.MultiIndex):
+        return {tickers[0]: data}
+    niveau = 1 if set(tickers) & set(data.columns.get_level_values(1)) else 0
+    res = {}
+    for t in tickers:
+        if t not in data.columns.get_level_values(niveau): continue
+        df = data.xs(t, axis=1, level=niveau).dropna(how='all')
+        if not df.empty: res[t] = df
+    return res
+
+def historiques(tickers, period, interval, timeout=10):
+    """ {ticker: DataFrame OHLC}, un seul yf.download pour les tickers absents du cache """
+    res, manquants = {}, []
+    for t in dict.fromkeys(tickers):
+        df = CACHE.get((t, period, interval))
+        if df is None: manquants.append(t)
+        else: res[t] = df
+    cles, attentes = CACHE.reserver([(t, period, interval) for t in manquants])
+    a_moi = [c[0] for c in cles]
+    try:
+        if a_moi:
+            with mesure("yfinance.download", type_="http", tickers=len(a_moi), period=period,
+                        interval=interval, cache=f"{len(res)} hits / {len(manquants)} misses"):
+                try:
+                    import yfinance as yf   # import différé : ~0,3 s évitées tant que tout vient du cache
+                    data = yf.download(a_moi, period=period, interval=interval, progress=False, timeout=timeout)
+                except Exception as e:
+                    print(f"Erreur téléchargement groupé : {e}")
+                    data = None
+            for t, df in decouper_par_ticker(data, a_moi).items():
+                CACHE.set((t, period, interval), df)
+                res[t] = df
+    finally:
+        CACHE.liberer(cles)
+    # Tickers téléchargés au même moment par une autre session : résultat lu dans le cache
+    for evt in attentes: evt.wait(timeout * 2)
+    for t in (t for t in manquants if t not in a_moi):
+        df = CACHE.get((t, period, interval))
+        if df is not None: res[t] = df
+    return {t: df.copy() for t, df in res.items()}
+
+def historique(ticker, period, interval, timeout=10):
+    """ DataFrame OHLC d'un ticker (vide si Yahoo ne renvoie rien) """
+    return historiques([ticker], period, interval, timeout).get(ticker, pd.DataFrame())
+
+def clotures(tickers, period, interval, timeout=10):
+    """ DataFrame des clôtures, une colonne par ticker """
+    h = historiques(tickers, period, interval, timeout)
+    return pd.DataFrame({t: df['Close'] for t, df in h.items() if 'Close' in df.columns})
@@ -1,17 +1,44 @@
-import yfinance as yf
 import pandas as pd
 import requests
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from historique_local import mettre_a_jour
+from alertes_etat import EtatAlertes
+import analyse_alertes
+import noyau
+import portefeuilles
+import risques
+from seuils_dynamiques import MoteurSeuils
 
 # --- CONFIGURATION ---
 USER_KEY = os.getenv("PUSHOVER_USER_KEY")
 API_TOKEN = os.getenv("PUSHOVER_API_TOKEN")
 GH_REPO = os.getenv("GH_REPO")
+# Alertes de risque : drawdown du portefeuille au-delà du seuil (0 pour désactiver),
+# perte du jour supérieure à la VaR 95% historique
+SEUIL_DRAWDOWN = float(os.getenv("ALERTE_DRAWDOWN", "0.15"))
+ALERTE_VAR = os.getenv("ALERTE_VAR", "1") == "1"
 # Par défaut on se met en "check" si rien n'est précisé
+# Modes : open, check, close, monitor (surveillance continue pendant la séance)
 MODE = sys.argv[1] if len(sys.argv) > 1 else "check"
 
+# Durée de chaque phase, affichée en fin d'exécution. Les phases se chevauchent (news et réveil tournent dans le
+# pool pendant les autres) : le total est le temps écoulé depuis ce point, pas leur somme
+TEMPS = {}
+DEBUT = time.perf_counter()
+
+@contextmanager
+def phase(nom):
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        TEMPS[nom] = TEMPS.get(nom, 0.0) + time.perf_counter() - debut
+
 def send_push(title, message):
     payload = {"token": API_TOKEN, "user": USER_KEY, "title": title, "message": message}
     try:
@@ -19,116 +46,160 @@ def send_push(title, message):
     except Exception as e:
         print(f"Erreur envoi Pushover : {e}")
 
+# Lecture conditionnelle : le cache (etag + DataFrame) est conservé entre deux crons
+lecteur = noyau.lecteur_csv()
+
 def load_github_csv(filename):
-    url = f"https://raw.githubusercontent.com/{GH_REPO}/main/{filename}"
+    return lecteur.lire(filename)
+
+def derniere_news(ticker):
+    """ Titre de la dernière news de moins de 24h, sinon None """
     try:
-        df = pd.read_csv(url)
-        return df
-    except:
-        return pd.DataFrame()
+        import yfinance as yf   # import différé (noyau.py)
+        news = yf.Ticker(ticker).news
+        if news and (datetime.fromtimestamp(news[0]['providerPublishTime']) > datetime.now() - timedelta(hours=24)):
+            return news[0]['title']
+    except Exception as e:
+        print(f"Erreur sur {ticker}: {e}")
+    return None
 
 # --- 1. CHARGEMENT DES DONNÉES ---
-df_p = load_github_csv("portefeuille_data.csv")
-df_w = load_github_csv("watchlist_data.csv")
-df_d = load_github_csv("dividendes_data.csv")
+# Tous les portefeuilles déclarés ; les cours sont relevés une seule fois pour l'ensemble
+def charger_portefeuilles():
+    return noyau.charger_portefeuilles(load_github_csv)
+
+def titre(base, nom):
+    return base if nom == portefeuilles.PRINCIPAL else f"{base} — {nom}"
+
+with phase("chargement"):
+    donnees = charger_portefeuilles()
+
+# --- MODE MONITOR : surveillance continue au lieu d'un passage unique ---
+if MODE == "monitor":
+    import asyncio
+    from moniteur import Moniteur, SourceYahoo
+
+    def regrouper(donnees):
+        """ Positions et watchlists de tous les portefeuilles, colonne Portefeuille en plus """
+        def tous(i):
+            frames = [d[i].assign(Portefeuille=nom) for nom, d in donnees.items() if not d[i].empty]
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return tous(0), tous(1)
+
+    moniteur = Moniteur(
+        *regrouper(donnees), SourceYahoo(), send_push, EtatAlertes(os.getenv("ALERTES_ETAT", "alertes_etat.json")),
+        cadence=float(os.getenv("MONITEUR_CADENCE", "60")),
+        cadence_max=float(os.getenv("MONITEUR_CADENCE_MAX", "600")),
+        recharger=lambda: regrouper(charger_portefeuilles()),
+        permanent=os.getenv("MONITEUR_PERMANENT") == "1",
+        moteur=MoteurSeuils(),
+    )
+    asyncio.run(moniteur.tourner())
+    sys.exit(0)
 
 # --- 2. RÉVEIL STREAMLIT ---
-try:
-    url_app = "https://portefeuille-xppf99tytxydkyaljnmncu.streamlit.app/"
-    requests.get(url_app, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
-except: pass
+# En tâche de fond : on n'attend la réponse qu'à la fin du script
+pool = ThreadPoolExecutor(max_workers=8)
+def reveil_streamlit():
+    try:
+        url_app = "https://portefeuille-xppf99tytxydkyaljnmncu.streamlit.app/"
+        requests.get(url_app, headers={"User-Agent": "Mozilla/5.0"}, timeout=15)
+    except: pass
+reveil = pool.submit(reveil_streamlit)
 
 # --- 3. TRAITEMENT ---
-total_achat = 0
-total_actuel = 0
-total_veille = 0
-flash_news = ""
-watchlist_alerts = ""
-
-# A. Analyse Portefeuille
-if not df_p.empty:
-    for _, row in df_p.iterrows():
-        try:
-            tk = yf.Ticker(row['Ticker'])
-            hist = tk.history(period="2d")
-            if hist.empty: continue
-            
-            price = hist['Close'].iloc[-1]
-            price_h = hist['Close'].iloc[-2] if len(hist) > 1 else price
-            
-            qte = float(row['Qté'])
-            pru = float(row['PRU'])
-            total_achat += (pru * qte)
-            total_actuel += (price * qte)
-            total_veille += (price_h * qte)
-
-            # Alertes Portefeuille (Actives en mode check ET close pour ne rien rater)
-            if price <= float(row['Seuil_Bas']):
-                send_push("⚠️ ALERTE BASSE", f"{row['Nom']} : {price:.2f}€ (Seuil: {row['Seuil_Bas']}€)")
-            elif float(row.get('Seuil_Haut', 0)) > 0 and price >= float(row['Seuil_Haut']):
-                send_push("🚀 OBJECTIF ATTEINT", f"{row['Nom']} : {price:.2f}€ (Objectif: {row['Seuil_Haut']}€)")
-
-            # News (24h)
-            news = tk.news
-            if news and (datetime.fromtimestamp(news[0]['providerPublishTime']) > datetime.now() - timedelta(hours=24)):
-                flash_news += f"🗞️ {row['Nom']} : {news[0]['title']}\n"
-        except Exception as e: 
-            print(f"Erreur sur {row['Ticker']}: {e}")
-            continue
-
-# B. Analyse Watchlist (Toujours traitée pour être incluse dans le bilan de clôture)
-if not df_w.empty:
-    for _, row in df_w.iterrows():
-        try:
-            tk = yf.Ticker(row['Ticker'])
-            p_w = tk.fast_info.last_price
-            if p_w is None or p_w == 0:
-                p_w = tk.history(period="1d")['Close'].iloc[-1]
-            
-            seuil_fixe = float(row['Seuil_Alerte'])
-            if p_w <= seuil_fixe:
-                watchlist_alerts += f"🎯 {row['Nom']} : {p_w:.2f}€ (Seuil : {seuil_fixe:.2f}€)\n"
-        except: continue
-
-# C. Calcul Dividendes
-total_div = df_d['Montant'].sum() if not df_d.empty else 0
-
-# --- 4. CALCULS PERF ---
-pv_euros_bourse = total_actuel - total_achat
-perf_pct_bourse = (pv_euros_bourse / total_achat * 100) if total_achat > 0 else 0
-richesse_totale = total_actuel + total_div
-pv_euros_totale = richesse_totale - total_achat
-perf_pct_totale = (pv_euros_totale / total_achat * 100) if total_achat > 0 else 0
-perf_jour = ((total_actuel - total_veille) / total_veille * 100) if total_veille > 0 else 0
-
-# --- 5. ENVOI DES NOTIFICATIONS ---
-
-if MODE == "open":
-    send_push("🔔 OUVERTURE", f"Valeur : {total_actuel:.2f}€\nPerf Portefeuille : {perf_pct_bourse:+.2f}%")
-
-elif MODE == "close":
-    # On envoie d'abord les opportunités s'il y en a
-    if watchlist_alerts:
-        send_push("🔍 OPPORTUNITÉS DU JOUR", watchlist_alerts)
-        
-    # Puis le bilan complet
-    msg = (
-        f"🏁 CLÔTURE\n"
-        f"---------------------------\n"
-        f"📊 BILAN BOURSIER (Actions)\n"
-        f"Valeur : {total_actuel:.2f}€\n"
-        f"Var. Jour : {perf_jour:+.2f}%\n"
-        f"+/- Value : {pv_euros_bourse:+.2f}€ ({perf_pct_bourse:+.2f}%)\n"
-        f"---------------------------\n"
-        f"💰 RICHESSE TOTALE (+Div)\n"
-        f"Total : {richesse_totale:.2f}€\n"
-        f"Dividendes perçus : {total_div:.2f}€\n"
-        f"Performance Réelle : {pv_euros_totale:+.2f}€ ({perf_pct_totale:+.2f}%)\n"
-        f"---------------------------\n"
-        f"📰 RECAP NEWS :\n{flash_news if flash_news else 'Aucune.'}"
-    )
-    send_push("🏁 BILAN DU JOUR", msg)
-
-elif MODE == "check":
-    if watchlist_alerts:
-        send_push("🔍 OPPORTUNITÉ WATCHLIST", watchlist_alerts)
+# Alertes déjà envoyées (persistées entre deux crons) et nouvelles alertes du run
+etat = EtatAlertes(os.getenv("ALERTES_ETAT", "alertes_etat.json"))
+# État incrémental des seuils dynamiques, partagé avec l'application (à côté du stock d'historiques)
+moteur = MoteurSeuils()
+nouvelles_alertes = []
+
+# A. Cours : un seul téléchargement groupé (tickers distincts de tous les portefeuilles et watchlists)
+tickers = list(dict.fromkeys(t for df_p, df_w, _ in donnees.values() for df in (df_p, df_w)
+                             if not df.empty for t in df['Ticker'].tolist()))
+with phase("cotations"):
+    # Historique local : seules les bougies manquantes sont téléchargées (un an, plus l'indice, pour les risques)
+    if SEUIL_DRAWDOWN or ALERTE_VAR:
+        stock = mettre_a_jour(tickers + [risques.INDICE], "1y") if tickers else {}
+    else:
+        stock = mettre_a_jour(tickers, "7d") if tickers else {}
+    prix, prix_h = noyau.cours_stock(stock)
+
+with phase("news"):
+    # Les news partent en parallèle pendant l'évaluation des seuils (une fois par ticker détenu)
+    detenus = dict.fromkeys(t for df_p, _, _ in donnees.values() if not df_p.empty for t in df_p['Ticker'])
+    futurs_news = {t: pool.submit(derniere_news, t) for t in detenus if t in prix}
+
+def analyser(nom, df_p, df_w, df_d):
+    """ Totaux, news et alertes d'un portefeuille ; les nouvelles alertes sont ajoutées à nouvelles_alertes """
+    # B, C, E. Portefeuille, watchlist et risques (mêmes règles que le benchmark du scan)
+    res = analyse_alertes.analyser(nom, df_p, df_w, prix, prix_h, stock, etat, moteur,
+                                   seuil_drawdown=SEUIL_DRAWDOWN, alerte_var=ALERTE_VAR, phase=phase)
+    nouvelles_alertes.extend(res.pop("alertes"))
+    val = res.pop("valorise")
+
+    # News (24h)
+    res["news"] = ""
+    with phase("news"):
+        for _, row in val.iterrows():
+            t = row['Ticker']
+            if t in futurs_news and futurs_news[t].result():
+                res["news"] += f"🗞️ {row['Nom']} : {futurs_news[t].result()}\n"
+
+    # D. Calcul Dividendes
+    res["div"] = df_d['Montant'].sum() if not df_d.empty else 0
+    return res
+
+rapports = {nom: analyser(nom, *d) for nom, d in donnees.items()}
+
+# --- 4. ENVOI DES NOTIFICATIONS ---
+# Toutes les nouvelles alertes du run (tous portefeuilles) partent dans un seul message
+with phase("notifications"):
+    if nouvelles_alertes:
+        send_push("🔔 NOUVELLES ALERTES", "\n".join(nouvelles_alertes))
+    etat.sauvegarder((tickers + [analyse_alertes.cle_risque(nom) for nom in donnees]) if tickers else None)
+    moteur.sauvegarder()
+
+for nom, r in rapports.items():
+    # Portefeuilles secondaires vides : pas de bilan
+    if nom != portefeuilles.PRINCIPAL and donnees[nom][0].empty: continue
+
+    # --- 5. CALCULS PERF ---
+    total_actuel, total_div = r["actuel"], r["div"]
+    perf = noyau.performance(r["achat"], total_actuel, r["veille"], total_div)
+    pv_euros_bourse, perf_pct_bourse, perf_jour = perf["pv"], perf["pv_pct"], perf["jour_pct"]
+    richesse_totale, pv_euros_totale, perf_pct_totale = perf["richesse"], perf["pv_totale"], perf["pv_totale_pct"]
+
+    if MODE == "open":
+        send_push(titre("🔔 OUVERTURE", nom), f"Valeur : {total_actuel:.2f}€\nPerf Portefeuille : {perf_pct_bourse:+.2f}%")
+
+    elif MODE == "close":
+        # On envoie d'abord les opportunités s'il y en a
+        if r["watchlist"]:
+            send_push(titre("🔍 OPPORTUNITÉS DU JOUR", nom), r["watchlist"])
+
+        # Puis le bilan complet
+        msg = (
+            f"🏁 CLÔTURE\n"
+            f"---------------------------\n"
+            f"📊 BILAN BOURSIER (Actions)\n"
+            f"Valeur : {total_actuel:.2f}€\n"
+            f"Var. Jour : {perf_jour:+.2f}%\n"
+            f"+/- Value : {pv_euros_bourse:+.2f}€ ({perf_pct_bourse:+.2f}%)\n"
+            f"---------------------------\n"
+            f"💰 RICHESSE TOTALE (+Div)\n"
+            f"Total : {richesse_totale:.2f}€\n"
+            f"Dividendes perçus : {total_div:.2f}€\n"
+            f"Performance Réelle : {pv_euros_totale:+.2f}€ ({perf_pct_totale:+.2f}%)\n"
+            f"---------------------------\n"
+            f"📰 RECAP NEWS :\n{r['news'] if r['news'] else 'Aucune.'}"
+        )
+        send_push(titre("🏁 BILAN DU JOUR", nom), msg)
+
+# En mode "check", les opportunités watchlist font partie des nouvelles alertes ci-dessus
+
+# --- 6. FIN : réveil Streamlit et temps par phase ---
+with phase("reveil"):
+    reveil.result()
+pool.shutdown(wait=False)
+print(" | ".join(f"{nom} {duree:.2f}s" for nom, duree in TEMPS.items()) + f" | total {time.perf_counter() - DEBUT:.2f}s")
@@ -0,0 +1,160 @@
+import pandas as pd
+import requests
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from cache_marche import CACHE, clotures
+from instrumentation import mesure
+
+# --- MOTEUR DE COTATIONS ---
+# 1 téléchargement groupé pour tous les tickers, puis chaîne de secours
+# (ISIN, ISIN.PA, scraping) uniquement pour les tickers manquants.
+
+SOURCE_MANUEL = "manuel"
+SOURCE_YAHOO = "yahoo"
+SOURCE_ISIN = "isin"
+SOURCE_ISIN_PA = "isin.pa"
+SOURCE_SCRAPING = "scraping"
+SOURCE_AUCUNE = "aucune"
+
+PERIODE_COTATION = "7d"
+SOURCES = [SOURCE_YAHOO, SOURCE_ISIN, SOURCE_ISIN_PA, SOURCE_SCRAPING]
+SOURCES_REPLI = SOURCES[1:]
+
+Cotation = namedtuple("Cotation", ["prix", "source"])
+
+def nettoyer_isin(isin):
+    """ Renvoie l'ISIN sans espaces parasites, ou None s'il est vide / NaN """
+    if not isinstance(isin, str): return None
+    isin = isin.strip()
+    return isin or None
+
+def get_fallback_price(isin, timeout=5):
+    """ Tente de récupérer le prix sur Yahoo via scraping si l'API échoue """
+    isin = nettoyer_isin(isin)
+    if not isin: return None
+    try:
+        from bs4 import BeautifulSoup   # import différé : seul le dernier recours en a besoin
+        url = f"https://finance.yahoo.com/quote/{isin}.PA"
+        headers = {'User-Agent': 'Mozilla/5.0'}
+        response = requests.get(url, headers=headers, timeout=timeout)
+        soup = BeautifulSoup(response.text, 'html.parser')
+        price_tag = soup.find('fin-streamer', {'data-field': 'regularMarketPrice'})
+        return float(price_tag['value'])
+    except:
+        return None
+
+def extraire_clotures(data, tickers):
+    """ Renvoie les clôtures d'un yf.download sous forme d'un DataFrame (une colonne par ticker) """
+    if data is None or data.empty: return pd.DataFrame()
+    if isinstance(data.columns, pd.MultiIndex):
+        close = data['Close']
+    else:
+        close = data['Close'] if 'Close' in data.columns else pd.DataFrame()
+    if isinstance(close, pd.Series):
+        close = close.to_frame(tickers[0])
+    return close
+
+def derniers_cours(close):
+    """ Dernier cours valide (> 0) de chaque colonne """
+    if close is None or close.empty: return {}
+    last = close.ffill().iloc[-1]
+    return {t: float(v) for t, v in last.items() if pd.notnull(v) and v > 0}
+
+def prix_manuels(positions):
+    """ Prix forcés à la main (Prix_Manuel > 0), le premier saisi l'emporte """
+    manuels = {}
+    for x in positions:
+        try:
+            p = float(x.get('Prix_Manuel', 0))
+        except (TypeError, ValueError):
+            continue
+        if p > 0: manuels.setdefault(x['Ticker'], p)
+    return manuels
+
+def telecharger_groupe(tickers, period=PERIODE_COTATION, timeout=10):
+    """ Un seul appel yf.download pour tous les tickers (via le cache de marché) """
+    if not tickers: return {}
+    return derniers_cours(clotures(list(tickers), period, "1d", timeout))
+
+def _prix_historique(symbole, period, timeout):
+    with mesure("yfinance.history", type_="http", symbole=symbole):
+        try:
+            import yfinance as yf
+            hist = yf.Ticker(symbole).history(period=period, timeout=timeout)
+            if not hist.empty:
+                p = float(hist['Close'].iloc[-1])
+                if p > 0: return p
+        except Exception:
+            pass
+    return None
+
+def _essayer(source, ticker, isin, timeout):
+    """ Prix fourni par une source donnée, ou None """
+    if source == SOURCE_YAHOO: return _prix_historique(ticker, PERIODE_COTATION, timeout)
+    if not isin: return None
+    if source == SOURCE_ISIN: return _prix_historique(isin, "1d", timeout)
+    if source == SOURCE_ISIN_PA: return _prix_historique(f"{isin}.PA", "1d", timeout)
+    p = get_fallback_price(isin, timeout=timeout)
+    return float(p) if p and p > 0 else None
+
+def chaine_repli(isin, timeout=5, ticker=None, routage=None, sources=SOURCES_REPLI):
+    """ Essaie les sources dans l'ordre (la dernière gagnante d'abord si un routage est fourni) ;
+    s'arrête à la première qui répond. Les sources en quarantaine sont sautées. """
+    isin = nettoyer_isin(isin)
+    ordre = routage.ordre(ticker, list(sources)) if routage else list(sources)
+    for source in ordre:
+        if source != SOURCE_YAHOO and not isin: continue
+        if routage and not routage.disponible(ticker, source): continue
+        p = _essayer(source, ticker, isin, timeout)
+        if routage: (routage.succes if p else routage.echec)(ticker, source)
+        if p: return Cotation(p, source)
+    return Cotation(0.0, SOURCE_AUCUNE)
+
+def _repli_mesure(ticker, isin, timeout, routage, sources):
+    with mesure("cotation.repli", ticker=ticker) as infos:
+        c = chaine_repli(isin, timeout, ticker, routage, sources)
+        infos["source"] = c.source
+    return c
+
+def recuperer_cotations(ticker_to_isin, manuels=None, max_workers=8, timeout=5, routage=None):
+    """ Résout le prix de chaque ticker : manuel > Yahoo groupé > repli parallèle.
+    Avec un routage, les tickers dont la dernière source gagnante n'est pas Yahoo
+    sortent du téléchargement groupé. Renvoie {ticker: Cotation(prix, source)} """
+    manuels = manuels or {}
+    cotations = {t: Cotation(float(p), SOURCE_MANUEL) for t, p in manuels.items() if t in ticker_to_isin}
+    for t in ticker_to_isin:
+        if t in cotations: continue
+        c = CACHE.get((t, PERIODE_COTATION, "cotation"))
+        if c is not None: cotations[t] = c
+    a_chercher = [t for t in ticker_to_isin if t not in cotations]
+
+    groupe = a_chercher
+    if routage:
+        groupe = [t for t in a_chercher if routage.preferee(t, SOURCES) == SOURCE_YAHOO and routage.disponible(t, SOURCE_YAHOO)]
+    trouves = telecharger_groupe(groupe, timeout=timeout * 2)
+    for t in groupe:
+        if t in trouves:
+            cotations[t] = Cotation(trouves[t], SOURCE_YAHOO)
+            if routage: routage.succes(t, SOURCE_YAHOO)
+        elif routage and trouves:
+            # Yahoo a répondu mais sans ce ticker ; un téléchargement groupé vide (panne, erreur réseau)
+            # ne met personne en quarantaine
+            routage.echec(t, SOURCE_YAHOO)
+
+    manquants = [t for t in a_chercher if t not in cotations]
+    if manquants:
+        dans_groupe = set(groupe)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(manquants))) as pool:
+            # Yahoo individuel seulement pour les tickers sortis du groupe
+            futurs = {t: pool.submit(_repli_mesure, t, ticker_to_isin.get(t), timeout, routage,
+                                     SOURCES_REPLI if t in dans_groupe else SOURCES)
+                      for t in manquants}
+            for t, f in futurs.items():
+                try:
+                    cotations[t] = f.result()
+                except Exception:
+                    cotations[t] = Cotation(0.0, SOURCE_AUCUNE)
+
+    for t in a_chercher:
+        if cotations[t].prix > 0: CACHE.set((t, PERIODE_COTATION, "cotation"), cotations[t])
+    return cotations
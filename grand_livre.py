@@ -0,0 +1,284 @@
+import csv
+import json
+import os
+import threading
+from datetime import date
+from io import StringIO
+
+# --- GRAND LIVRE DES TRANSACTIONS ---
+# Journal en ajout seul (achats, ventes, dividendes, prix forcés, ajustements).
+# Les positions (Qté, PRU, P/L réalisé, dividendes) en sont dérivées au fil de
+# l'eau ; un instantané périodique mémorise l'état et la position dans le
+# fichier, si bien qu'au démarrage seule la fin du journal est rejouée.
+#
+# Le grand livre est la seule source de Qté, PRU et prix forcé : le CSV des
+# positions n'en est qu'une projection (plus les colonnes propres à l'affichage,
+# seuils, règle). Une Qté ou un PRU modifiés directement dans le CSV sont
+# écrasés au chargement suivant ; seules les lignes de titres que le journal ne
+# connaît pas (ajoutées à la main) y sont reprises, comme ajustement.
+#
+# Publication : le dépôt garde le journal jusqu'à la dernière compaction
+# (NOM_FICHIER) et, à part, la queue des événements suivants (NOM_RECENTS).
+# Chaque action ne renvoie que la queue ; le journal complet n'est réécrit
+# (queue vidée) que tous les `compacter_tous` événements.
+#
+# Import de relevé : un titre que le journal ne connaît que par des ajustements
+# (reprise de l'existant) est remis à zéro avant les opérations du relevé, qui
+# le remplacent ; un achat / vente antérieur au dernier mouvement du titre est
+# rejeté, l'état étant appliqué dans l'ordre du journal.
+
+NOM_FICHIER = "transactions_data.csv"
+NOM_RECENTS = "transactions_recentes.csv"
+COLONNES = ["Seq", "Date", "Type", "Ticker", "Nom", "ISIN", "Qté", "Prix", "Montant"]
+
+ACHAT = "ACHAT"
+VENTE = "VENTE"
+DIVIDENDE = "DIVIDENDE"
+PRIX_MANUEL = "PRIX_MANUEL"
+AJUSTEMENT = "AJUSTEMENT"   # Qté / PRU saisis à la main (édition, suppression, reprise de l'existant)
+
+def _nombre(x):
+    try:
+        return float(x) if x not in (None, "") else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+def position_vide(ticker):
+    # Reprise : None (aucun ajustement ni mouvement), True (ajustements seuls), False (achats / ventes connus)
+    return {"Ticker": ticker, "Nom": "", "ISIN": "", "Qté": 0.0, "PRU": 0.0, "PV_Realisee": 0.0,
+            "Dividendes": 0.0, "Prix_Manuel": 0.0, "Date_Achat": "", "Reprise": None, "Dernier_Mouvement": ""}
+
+def appliquer(positions, evt):
+    """ Met à jour l'état dérivé avec un événement (O(1)) """
+    t = evt["Ticker"]
+    p = positions.setdefault(t, position_vide(t))
+    if evt.get("Nom"): p["Nom"] = evt["Nom"]
+    if evt.get("ISIN"): p["ISIN"] = evt["ISIN"]
+    qte, prix = _nombre(evt.get("Qté")), _nombre(evt.get("Prix"))
+    typ = evt["Type"]
+    if typ == ACHAT:
+        total = p["Qté"] + qte
+        if total > 0: p["PRU"] = (p["PRU"] * p["Qté"] + prix * qte) / total
+        p["Qté"] = total
+        if not p["Date_Achat"]: p["Date_Achat"] = evt["Date"]
+    elif typ == VENTE:
+        qte = min(qte, p["Qté"])
+        p["PV_Realisee"] += (prix - p["PRU"]) * qte
+        p["Qté"] -= qte
+        if p["Qté"] <= 1e-9: p["Qté"], p["PRU"], p["Date_Achat"] = 0.0, 0.0, ""
+    elif typ == DIVIDENDE:
+        p["Dividendes"] += _nombre(evt.get("Montant"))
+    elif typ == PRIX_MANUEL:
+        p["Prix_Manuel"] = prix
+    elif typ == AJUSTEMENT:
+        p["Qté"], p["PRU"] = qte, prix
+        if qte > 0 and not p["Date_Achat"]: p["Date_Achat"] = evt["Date"]
+        if qte <= 0: p["Date_Achat"] = ""
+    # Un ajustement de reprise ne date pas l'historique : le relevé importé ensuite le remplace
+    if typ in (ACHAT, VENTE) or (typ == AJUSTEMENT and p["Reprise"] is False):
+        p["Dernier_Mouvement"] = max(p["Dernier_Mouvement"], str(evt["Date"]))
+    if typ in (ACHAT, VENTE): p["Reprise"] = False
+    elif typ == AJUSTEMENT and p["Reprise"] is None: p["Reprise"] = True
+    return p
+
+class GrandLivre:
+    def __init__(self, dossier="grand_livre_data", instantane_tous=50, compacter_tous=200):
+        self.dossier = dossier
+        self.chemin = os.path.join(dossier, NOM_FICHIER)
+        self.chemin_instantane = os.path.join(dossier, "instantane.json")
+        self.instantane_tous = instantane_tous
+        self.compacter_tous = compacter_tous
+        self.positions = {}
+        self.seq = 0
+        self.rejoues = 0
+        self.seq_publie = 0          # dernier Seq du journal distant compacté
+        self._offset_publie = None   # position locale correspondante (inconnue : compaction à la prochaine publication)
+        self._lock = threading.Lock()
+        self._charger()
+
+    # --- Chargement ---
+    def _charger(self):
+        offset = 0
+        try:
+            with open(self.chemin_instantane, encoding="utf-8") as f:
+                inst = json.load(f)
+            self.positions, self.seq, offset = inst["positions"], inst["seq"], inst["offset"]
+            if any(k not in p for p in self.positions.values() for k in position_vide("")):   # ancien format
+                self.positions, self.seq, offset = {}, 0, 0
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        if not os.path.exists(self.chemin): return
+        if offset > os.path.getsize(self.chemin):  # journal remplacé : on rejoue tout
+            self.positions, self.seq, offset = {}, 0, 0
+        with open(self.chemin, encoding="utf-8", newline="") as f:
+            if offset:
+                f.seek(offset)
+                lignes = csv.DictReader(f, fieldnames=COLONNES)
+            else:
+                lignes = csv.DictReader(f)
+            for evt in lignes:
+                if int(evt["Seq"]) <= self.seq: continue
+                appliquer(self.positions, evt)
+                self.seq = int(evt["Seq"])
+                self.rejoues += 1
+
+    def _instantane(self):
+        os.makedirs(self.dossier, exist_ok=True)
+        tmp = self.chemin_instantane + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": self.seq, "offset": os.path.getsize(self.chemin), "positions": self.positions}, f)
+        os.replace(tmp, self.chemin_instantane)
+
+    # --- Écriture ---
+    def _evenement(self, type_, ticker, qte=0.0, prix=0.0, montant=0.0, nom="", isin="", date_evt=None):
+        self.seq += 1
+        return {"Seq": self.seq, "Date": str(date_evt or date.today()), "Type": type_, "Ticker": ticker,
+                "Nom": nom or "", "ISIN": (isin or "").strip() if isinstance(isin, str) else "",
+                "Qté": qte, "Prix": prix, "Montant": montant}
+
+    def _ouvrir(self):
+        os.makedirs(self.dossier, exist_ok=True)
+        nouveau = not os.path.exists(self.chemin) or os.path.getsize(self.chemin) == 0
+        f = open(self.chemin, "a", encoding="utf-8", newline="")
+        w = csv.DictWriter(f, fieldnames=COLONNES)
+        if nouveau: w.writeheader()
+        return f, w
+
+    def ajouter(self, type_, ticker, qte=0.0, prix=0.0, montant=0.0, nom="", isin="", date_evt=None):
+        """ Ajoute un événement en fin de journal et renvoie la position mise à jour """
+        with self._lock:
+            evt = self._evenement(type_, ticker, qte, prix, montant, nom, isin, date_evt)
+            f, w = self._ouvrir()
+            with f:
+                w.writerow(evt)
+            p = appliquer(self.positions, evt)
+            if self.seq % self.instantane_tous == 0: self._instantane()
+            return dict(p)
+
+    def ajouter_lot(self, evenements, releve=False):
+        """ Ajout en bloc : dicts aux arguments de ajouter(), consommés au fil de l'eau ; un seul fichier ouvert,
+        un instantané à la fin. Avec `releve` (opérations d'un relevé courtier, par date croissante), un titre
+        connu par ses seuls ajustements est remis à zéro avant son premier achat / vente, et un achat / vente
+        antérieur au dernier mouvement du titre est rejeté. Renvoie (tickers touchés, remis à zéro, rejetés) """
+        touches, remplaces, rejetes = set(), set(), []
+        with self._lock:
+            f, w = self._ouvrir()
+            with f:
+                for e in evenements:
+                    p = self.positions.get(e["ticker"]) or position_vide(e["ticker"])
+                    if releve and e["type_"] in (ACHAT, VENTE):
+                        if p["Reprise"] and (p["Qté"] or p["PRU"]):
+                            raz = self._evenement(AJUSTEMENT, e["ticker"], date_evt=e.get("date_evt"))
+                            w.writerow(raz)
+                            appliquer(self.positions, raz)
+                            remplaces.add(e["ticker"])
+                        elif str(e.get("date_evt") or date.today()) < p["Dernier_Mouvement"]:
+                            rejetes.append(e)
+                            continue
+                    evt = self._evenement(**e)
+                    w.writerow(evt)
+                    appliquer(self.positions, evt)
+                    touches.add(evt["Ticker"])
+            if touches: self._instantane()
+        return touches, remplaces, rejetes
+
+    def importer(self, lignes, recents=()):
+        """ Remplace le journal local par la copie distante (journal compacté puis queue) et reconstruit l'état """
+        with self._lock:
+            os.makedirs(self.dossier, exist_ok=True)
+            dernier = 0
+            with open(self.chemin, "w", encoding="utf-8", newline="") as f:
+                w = csv.DictWriter(f, fieldnames=COLONNES, extrasaction="ignore")
+                w.writeheader()
+                for l in lignes:
+                    w.writerow({k: ("" if isinstance(v, float) and v != v else v) for k, v in l.items()})
+                    dernier = max(dernier, int(_nombre(l.get("Seq"))))
+                f.flush()
+                offset = f.tell()
+                for l in recents:
+                    if int(_nombre(l.get("Seq"))) <= dernier: continue   # déjà compacté
+                    w.writerow({k: ("" if isinstance(v, float) and v != v else v) for k, v in l.items()})
+            if os.path.exists(self.chemin_instantane): os.remove(self.chemin_instantane)
+            self.positions, self.seq, self.rejoues = {}, 0, 0
+            self._charger()
+            self.seq_publie, self._offset_publie = dernier, offset
+            if self.seq: self._instantane()
+
+    def amorcer(self, positions, dividendes=()):
+        """ Journal vide : reprend l'existant (positions et dividendes) sous forme d'événements """
+        for p in positions:
+            self.ajouter(AJUSTEMENT, p['Ticker'], _nombre(p.get('Qté')), _nombre(p.get('PRU')),
+                         nom=p.get('Nom'), isin=p.get('ISIN'), date_evt=p.get('Date_Achat') or None)
+            if _nombre(p.get('Prix_Manuel')) > 0:
+                self.ajouter(PRIX_MANUEL, p['Ticker'], prix=_nombre(p.get('Prix_Manuel')))
+        for d in dividendes:
+            self.ajouter(DIVIDENDE, d['Ticker'], montant=_nombre(d.get('Montant')), date_evt=d.get('Date') or None)
+
+    # --- Projection vers le CSV des positions ---
+    def projeter(self, lignes, tickers=None):
+        """ Recopie Qté / PRU / prix forcé du journal dans les lignes de positions (modifiées en place) : ligne
+        ajoutée pour un titre détenu absent, retirée une fois soldé. `tickers` restreint aux titres touchés.
+        Renvoie True si une ligne a changé """
+        change = False
+        for t in (self.positions if tickers is None else tickers):
+            p = self.position(t)
+            i = next((i for i, l in enumerate(lignes) if l['Ticker'] == t), None)
+            if p['Qté'] <= 0:
+                if i is not None:
+                    lignes.pop(i)
+                    change = True
+                continue
+            projete = {"Qté": p['Qté'], "PRU": round(p['PRU'], 4), "Prix_Manuel": p['Prix_Manuel']}
+            if i is None:
+                lignes.append({"Nom": p['Nom'] or t, "ISIN": p['ISIN'], "Ticker": t, **projete,
+                               "Date_Achat": p['Date_Achat'], "Seuil_Haut": p['PRU'] * 1.2, "Seuil_Bas": p['PRU'] * 0.8,
+                               "Regle": ""})
+                change = True
+            elif any(abs(_nombre(lignes[i].get(k)) - v) > 1e-6 for k, v in projete.items()):
+                lignes[i].update(projete)
+                change = True
+        return change
+
+    def reconcilier(self, lignes):
+        """ Au chargement : titres du CSV inconnus du journal repris comme ajustements, puis projection du journal.
+        Renvoie (lignes modifiées, nombre de titres repris) """
+        inconnues = [l for l in lignes if l.get('Ticker') and l['Ticker'] not in self.positions]
+        if inconnues: self.amorcer(inconnues)
+        return self.projeter(lignes), len(inconnues)
+
+    # --- Publication vers le dépôt ---
+    def publication(self, compacter=False):
+        """ Fichiers distants à réécrire après des ajouts : {nom: contenu}. La queue seule (événements postérieurs
+        à la dernière compaction), ou le journal complet avec une queue vide tous les `compacter_tous` événements """
+        with self._lock:
+            entete = StringIO()
+            csv.DictWriter(entete, fieldnames=COLONNES).writeheader()
+            if compacter or self._offset_publie is None or self.seq - self.seq_publie >= self.compacter_tous:
+                self.seq_publie = self.seq
+                self._offset_publie = os.path.getsize(self.chemin) if os.path.exists(self.chemin) else 0
+                return {NOM_FICHIER: self.contenu(), NOM_RECENTS: entete.getvalue()}
+            with open(self.chemin, encoding="utf-8", newline="") as f:
+                f.seek(self._offset_publie)
+                return {NOM_RECENTS: entete.getvalue() + f.read()}
+
+    # --- Lecture ---
+    def contenu(self):
+        try:
+            with open(self.chemin, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def evenements(self):
+        """ Tous les événements du journal (chronologie complète, ex. série de valeur) """
+        try:
+            with open(self.chemin, encoding="utf-8", newline="") as f:
+                return list(csv.DictReader(f))
+        except FileNotFoundError:
+            return []
+
+    def position(self, ticker):
+        return dict(self.positions.get(ticker) or position_vide(ticker))
+
+    def pv_realisee(self):
+        return sum(p["PV_Realisee"] for p in self.positions.values())
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+# --- SOUS-ÉCHANTILLONNAGE DES COURBES ---
+# Une courbe n'a pas besoin de plus de points que de pixels en largeur : on ne
+# transmet au navigateur qu'une sélection de bougies qui conserve la forme
+# (LTTB) ou l'amplitude (min/max par colonne de pixels) de la série.
+
+LTTB = "LTTB"
+MINMAX = "Min/Max"
+AUCUN = "Aucun"
+MODES = [LTTB, MINMAX, AUCUN]
+SEUIL_WEBGL = 1000   # au-delà, Scattergl (rendu WebGL) au lieu du SVG
+
+def lttb(y, n, x=None):
+    """ Positions des n points retenus par Largest-Triangle-Three-Buckets """
+    y = np.asarray(y, dtype='float64')
+    total = len(y)
+    if n >= total or n < 3: return np.arange(total)
+    x = np.arange(total, dtype='float64') if x is None else np.asarray(x, dtype='float64')
+    bornes = np.linspace(1, total - 1, n - 1).astype(int)  # n-2 seaux entre le premier et le dernier point
+    retenus = [0]
+    a = 0
+    for i in range(n - 2):
+        debut, fin = bornes[i], bornes[i + 1]
+        suivant = slice(bornes[i + 1], bornes[i + 2]) if i + 2 < len(bornes) else slice(total - 1, total)
+        cx, cy = x[suivant].mean(), y[suivant].mean()
+        aires = np.abs((x[a] - cx) * (y[debut:fin] - y[a]) - (x[a] - x[debut:fin]) * (cy - y[a]))
+        a = debut + int(aires.argmax())
+        retenus.append(a)
+    retenus.append(total - 1)
+    return np.asarray(retenus)
+
+def minmax(y, n):
+    """ Positions du min et du max de chaque colonne (n // 2 colonnes), extrémités incluses """
+    y = pd.Series(np.asarray(y, dtype='float64'))
+    total = len(y)
+    if n >= total or n < 4: return np.arange(total)
+    colonnes = np.arange(total) * (n // 2) // total
+    g = y.groupby(colonnes)
+    return np.unique(np.concatenate([[0, total - 1], g.idxmin().to_numpy(), g.idxmax().to_numpy()]))
+
+def reduire(df, colonne, largeur, mode=LTTB):
+    """ Lignes de df à tracer pour une largeur donnée (en pixels) """
+    df = df[df[colonne].notna()]
+    if mode == AUCUN or len(df) <= largeur: return df
+    if mode == MINMAX: return df.iloc[minmax(df[colonne], 2 * largeur)]
+    x = df.index.asi8 if isinstance(df.index, pd.DatetimeIndex) else None
+    return df.iloc[lttb(df[colonne], largeur, x)]
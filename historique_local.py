@@ -0,0 +1,206 @@
+import json
+import os
+import re
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cache_marche import CACHE, decouper_par_ticker, historique
+from instrumentation import mesure
+
+# --- STOCKAGE LOCAL DES HISTORIQUES ---
+# Un fichier CSV de bougies journalières par ticker. On ne télécharge que les
+# bougies postérieures à la dernière date stockée ; les bougies hebdomadaires
+# sont recalculées à partir des journalières. Le marqueur _debuts.json retient,
+# par ticker, la date depuis laquelle l'historique stocké est complet : un titre
+# introduit en bourse après le début de la période demandée n'est pas pris pour
+# un trou et re-téléchargé en entier à chaque mise à jour.
+# Écriture : un fichier n'est touché que si une bougie a changé ; les bougies
+# nouvelles sont ajoutées en fin de fichier, seule la dernière ligne (bougie du
+# jour re-téléchargée) étant réécrite.
+
+DOSSIER = os.getenv("PORTEFEUILLE_HISTO_DIR", "historique_data")
+COLONNES = ["Open", "High", "Low", "Close", "Volume"]
+PERIODES = {"7d": pd.DateOffset(days=7), "1mo": pd.DateOffset(months=1), "3mo": pd.DateOffset(months=3),
+            "6mo": pd.DateOffset(months=6), "1y": pd.DateOffset(years=1), "2y": pd.DateOffset(years=2),
+            "5y": pd.DateOffset(years=5), "10y": pd.DateOffset(years=10)}
+
+_lock = threading.Lock()
+_memoire = {}   # ticker -> DataFrame déjà lu ou écrit par ce processus
+_debuts = {}    # dossier -> {ticker: date depuis laquelle l'historique stocké est complet}
+
+def _chemin(ticker):
+    return os.path.join(DOSSIER, re.sub(r"[^A-Za-z0-9._-]", "_", ticker) + ".csv")
+
+def _normaliser(df):
+    """ Index de dates sans fuseau, colonnes OHLCV uniquement """
+    if df is None or df.empty: return pd.DataFrame(columns=COLONNES)
+    df = df[[c for c in COLONNES if c in df.columns]].copy()
+    df.columns.name = None
+    idx = pd.DatetimeIndex(df.index)
+    if idx.tz is not None: idx = idx.tz_localize(None)
+    df.index = idx.normalize()
+    df.index.name = "Date"
+    return df.dropna(subset=["Close"]) if "Close" in df.columns else df
+
+def charger(ticker):
+    """ Bougies journalières stockées localement (DataFrame vide si aucune) """
+    if ticker in _memoire: return _memoire[ticker]
+    try:
+        df = pd.read_csv(_chemin(ticker), index_col="Date", parse_dates=["Date"], date_format="%Y-%m-%d")
+    except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=COLONNES)
+    _memoire[ticker] = df
+    return df
+
+def _ecrire(ticker, df):
+    os.makedirs(DOSSIER, exist_ok=True)
+    tmp = _chemin(ticker) + ".tmp"
+    df.to_csv(tmp)
+    os.replace(tmp, _chemin(ticker))
+    _memoire[ticker] = df
+
+def _ajouter(ticker, df, lignes, remplacer):
+    """ Écrit `lignes` (dernières bougies de `df`) en fin de fichier ; avec `remplacer`, la dernière ligne du
+    fichier (bougie de la première de `lignes`) est d'abord retirée. False si le fichier ne se termine pas
+    comme prévu """
+    try:
+        with open(_chemin(ticker), "rb+") as f:
+            fin = f.seek(0, os.SEEK_END)
+            if remplacer:
+                f.seek(max(0, fin - 4096))
+                queue = f.read()
+                ligne = queue.rstrip(b"\n").rfind(b"\n") + 1
+                if ligne == 0 or not queue[ligne:].startswith(lignes.index[0].strftime("%Y-%m-%d").encode()):
+                    return False
+                f.seek(fin - len(queue) + ligne)
+                f.truncate()
+            f.write(lignes.to_csv(header=False).encode())
+    except FileNotFoundError:
+        return False
+    _memoire[ticker] = df
+    return True
+
+def _enregistrer(ticker, ancien, delta):
+    """ Fusionne le delta téléchargé dans le stock du ticker ; le fichier n'est réécrit que si nécessaire.
+    Renvoie le DataFrame fusionné """
+    if not ancien.empty and list(ancien.columns) == list(delta.columns):
+        pos = ancien.index.get_indexer(delta.index)
+        connues = pos >= 0
+        egaux = np.isclose(delta.to_numpy(float)[connues], ancien.to_numpy(float)[pos[connues]], equal_nan=True).all(axis=1)
+        if egaux.all() and connues.all(): return ancien   # bougie re-téléchargée inchangée
+        # Seule la dernière bougie stockée change et / ou des bougies plus récentes arrivent : ajout en fin de fichier
+        derniere = len(ancien) - 1
+        modifiees = pos[connues][~egaux]
+        if (modifiees == derniere).all() and (delta.index[~connues] > ancien.index[-1]).all():
+            lignes = delta[delta.index > ancien.index[-1]]
+            if len(modifiees): lignes = pd.concat([delta[delta.index == ancien.index[-1]], lignes])
+            df = pd.concat([ancien.iloc[:-1] if len(modifiees) else ancien, lignes])
+            if _ajouter(ticker, df, lignes, remplacer=bool(len(modifiees))): return df
+    df = pd.concat([ancien, delta]) if not ancien.empty else delta
+    df = df[~df.index.duplicated(keep="last")].sort_index()
+    _ecrire(ticker, df)
+    return df
+
+def _marqueur():
+    return os.path.join(DOSSIER, "_debuts.json")
+
+def _lire_debuts():
+    if DOSSIER not in _debuts:
+        try:
+            with open(_marqueur(), encoding="utf-8") as f:
+                _debuts[DOSSIER] = json.load(f)
+        except (FileNotFoundError, ValueError):
+            _debuts[DOSSIER] = {}
+    return _debuts[DOSSIER]
+
+def _ecrire_debuts(debuts):
+    os.makedirs(DOSSIER, exist_ok=True)
+    tmp = _marqueur() + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(debuts, f, indent=1, sort_keys=True)
+    os.replace(tmp, _marqueur())
+
+def complet_depuis(ticker, df):
+    """ Date depuis laquelle l'historique stocké est complet : marqueur posé au dernier téléchargement complet,
+    à défaut (stock antérieur au marqueur) la première bougie """
+    marque = _lire_debuts().get(ticker)
+    return pd.Timestamp(marque) if marque else df.index[0]
+
+def debut_periode(period, aujourd_hui=None):
+    aujourd_hui = pd.Timestamp(aujourd_hui or date.today())
+    return (aujourd_hui - PERIODES[period]).normalize()
+
+def mettre_a_jour(tickers, period="1y", timeout=10):
+    """ Complète le stock local : téléchargement complet pour les nouveaux tickers,
+    uniquement le delta depuis la dernière bougie pour les autres.
+    Renvoie {ticker: DataFrame journalier} """
+    debut = debut_periode(period)
+    stock = {t: charger(t) for t in dict.fromkeys(tickers)}
+
+    # Tickers déjà synchronisés récemment, ou en cours de synchronisation par une autre session
+    cles, attentes = CACHE.reserver([(t, period, "stock") for t in stock if CACHE.get((t, period, "stock")) is None])
+    try:
+        _completer(stock, [c[0] for c in cles], period, debut, timeout)
+    finally:
+        CACHE.liberer(cles)
+    for evt in attentes: evt.wait(timeout * 2)
+    if attentes: stock.update({t: charger(t) for t in stock})
+    return stock
+
+def _completer(stock, tickers, period, debut, timeout):
+    # Regroupe les tickers par date de départ pour ne faire qu'un yf.download par groupe
+    groupes = {}
+    for t in tickers:
+        df = stock[t]
+        if df.empty or complet_depuis(t, df) > debut + pd.Timedelta(days=7):
+            depart = debut
+        else:
+            depart = df.index[-1]  # la dernière bougie peut être incomplète : on la re-télécharge
+        groupes.setdefault(depart, []).append(t)
+
+    for depart, groupe in groupes.items():
+        with mesure("yfinance.download", type_="http", tickers=len(groupe), start=depart.strftime("%Y-%m-%d"),
+                    interval="1d", cache=f"{len(stock) - len(groupe)} à jour / {len(groupe)} delta"):
+            try:
+                import yfinance as yf   # import différé : inutile si le stock local est à jour
+                data = yf.download(groupe, start=depart.strftime("%Y-%m-%d"), interval="1d", progress=False, timeout=timeout)
+            except Exception as e:
+                print(f"Erreur mise à jour historique : {e}")
+                continue
+        nouveaux = decouper_par_ticker(data, groupe)
+        with _lock:
+            debuts = _lire_debuts()
+            marques = dict(debuts)
+            for t in groupe:
+                delta = _normaliser(nouveaux.get(t))
+                CACHE.set((t, period, "stock"), True)
+                if delta.empty: continue
+                stock[t] = _enregistrer(t, stock[t], delta)
+                # Téléchargement depuis le début de période : tout ce que Yahoo a depuis cette date est stocké,
+                # même si la première bougie est plus récente (introduction en bourse, création du fonds)
+                if depart == debut and (t not in debuts or pd.Timestamp(debuts[t]) > debut):
+                    debuts[t] = debut.strftime("%Y-%m-%d")
+            if debuts != marques: _ecrire_debuts(debuts)
+
+def hebdomadaire(df):
+    """ Agrège des bougies journalières en bougies hebdomadaires """
+    if df.empty: return df
+    regles = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+    return df.resample("W-FRI").agg({c: r for c, r in regles.items() if c in df.columns}).dropna(subset=["Close"])
+
+def ohlc(ticker, period, interval):
+    """ Historique pour les graphiques : stock local en 1d / 1wk, cache mémoire en intraday """
+    if interval not in ("1d", "1wk") or period not in PERIODES:
+        return historique(ticker, period, interval)
+    df = mettre_a_jour([ticker], period)[ticker]
+    df = df[df.index >= debut_periode(period)]
+    return hebdomadaire(df) if interval == "1wk" else df
+
+def clotures_locales(tickers, period):
+    """ DataFrame des clôtures journalières, une colonne par ticker """
+    debut = debut_periode(period)
+    stock = mettre_a_jour(tickers, period)
+    return pd.DataFrame({t: df.loc[df.index >= debut, "Close"] for t, df in stock.items() if not df.empty})
@@ -0,0 +1,72 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cotations import Cotation, SOURCE_MANUEL, SOURCE_AUCUNE, recuperer_cotations
+
+# --- INSTANTANÉ DES COTATIONS ---
+# Derniers cours connus (prix, source, heure du relevé) conservés sur disque :
+# la page s'affiche tout de suite avec ces valeurs pendant qu'un thread de fond
+# relève les cours frais, qui remplacent l'instantané dès leur arrivée.
+
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cotations")
+
+class InstantaneCotations:
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self._cours = {}   # ticker -> {"prix", "source", "ts"}
+        self._lock = threading.Lock()
+        try:
+            with open(chemin, encoding="utf-8") as f:
+                self._cours = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def lire(self, tickers):
+        """ {ticker: (Cotation, horodatage)} pour les tickers connus """
+        with self._lock:
+            return {t: (Cotation(c["prix"], c["source"]), c["ts"]) for t, c in self._cours.items() if t in tickers}
+
+    def perimes(self, tickers, ttl, maintenant=None):
+        """ Tickers absents de l'instantané ou relevés il y a plus de `ttl` secondes """
+        limite = (maintenant or time.time()) - ttl
+        with self._lock:
+            return [t for t in tickers if t not in self._cours or self._cours[t]["ts"] < limite]
+
+    def mettre_a_jour(self, cotations):
+        """ Enregistre les cours relevés (hors prix manuels). Un échec est noté comme entrée négative
+        (prix 0, source 'aucune') : il compte comme frais pendant le TTL au lieu de relancer un relevé """
+        maintenant = time.time()
+        with self._lock:
+            for t, c in cotations.items():
+                if c.source == SOURCE_MANUEL: continue
+                if c.prix and c.prix > 0:
+                    self._cours[t] = {"prix": float(c.prix), "source": c.source, "ts": maintenant}
+                elif self._cours.get(t, {}).get("prix", 0) <= 0:
+                    # Un dernier cours connu reste affiché ; seul un ticker sans cours devient négatif
+                    self._cours[t] = {"prix": 0.0, "source": SOURCE_AUCUNE, "ts": maintenant}
+            os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+            tmp = self.chemin + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._cours, f)
+            os.replace(tmp, self.chemin)
+
+    def relever(self, ticker_to_isin, manuels=None, routage=None):
+        """ Relevé complet (bloquant) ; l'instantané est mis à jour """
+        cotations = recuperer_cotations(ticker_to_isin, manuels, routage=routage)
+        self.mettre_a_jour(cotations)
+        return cotations
+
+    def relever_en_fond(self, ticker_to_isin, manuels=None, routage=None):
+        """ Même relevé dans un thread de fond ; renvoie le Future """
+        return _pool.submit(self.relever, dict(ticker_to_isin), dict(manuels or {}), routage)
+
+def anciennete(ts, maintenant=None):
+    """ Âge lisible d'un relevé : '', '3 min', '2 h', '4 j' """
+    age = (maintenant or time.time()) - ts
+    if age < 120: return ""
+    if age < 3600: return f"{int(age // 60)} min"
+    if age < 86400: return f"{int(age // 3600)} h"
+    return f"{int(age // 86400)} j"
@@ -0,0 +1,76 @@
+import json
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+# --- INSTRUMENTATION ---
+# Chaque phase (chargement, cotations, graphiques...) et chaque appel HTTP sortant
+# produit un événement : durée, octets transférés, résultat du cache. Les
+# événements sont gardés en mémoire (panneau de debug) et journalisés en JSON.
+
+logger = logging.getLogger("portefeuille.perf")
+_evenements = deque(maxlen=2000)
+_lock = threading.Lock()
+_compteur = [0]
+
+def configurer_logs(chemin=None):
+    """ Journal JSON (une ligne par événement) vers un fichier, ou stderr par défaut """
+    if logger.handlers: return
+    handler = logging.FileHandler(chemin, encoding="utf-8") if chemin else logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+def enregistrer(type_, nom, duree, **attributs):
+    evt = {"ts": round(time.time(), 3), "type": type_, "nom": nom, "duree_ms": round(duree * 1000, 2)}
+    evt.update({k: v for k, v in attributs.items() if v is not None})
+    with _lock:
+        _compteur[0] += 1
+        evt["n"] = _compteur[0]
+        _evenements.append(evt)
+    logger.info(json.dumps(evt, ensure_ascii=False, default=str))
+    return evt
+
+@contextmanager
+def mesure(nom, type_="phase", **attributs):
+    """ Chronomètre un bloc ; le dict renvoyé permet d'ajouter octets / cache / etc. """
+    debut = time.perf_counter()
+    try:
+        yield attributs
+    finally:
+        enregistrer(type_, nom, time.perf_counter() - debut, **attributs)
+
+def marqueur():
+    """ Numéro du dernier événement : permet d'isoler ceux d'un rerun """
+    with _lock:
+        return _compteur[0]
+
+def evenements(depuis=0):
+    with _lock:
+        return [e for e in _evenements if e["n"] > depuis]
+
+# --- APPELS HTTP ---
+# Tous les appels `requests` passent par Session.request : on l'enveloppe une seule fois.
+_request_origine = requests.sessions.Session.request
+
+def _request_instrumente(self, method, url, *args, **kwargs):
+    debut = time.perf_counter()
+    statut, octets = None, None
+    try:
+        r = _request_origine(self, method, url, *args, **kwargs)
+        statut = r.status_code
+        if not kwargs.get("stream"): octets = len(r.content)
+        return r
+    finally:
+        cache = "304" if statut == 304 else None
+        enregistrer("http", f"{method} {url.split('?')[0]}", time.perf_counter() - debut,
+                    statut=statut, octets=octets, cache=cache)
+
+def instrumenter_http():
+    requests.sessions.Session.request = _request_instrumente
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import time
+
+import pandas as pd
+
+import portefeuilles
+from alertes_etat import BAS, HAUT
+from cache_marche import bourse_ouverte
+from cotations import derniers_cours, extraire_clotures
+from seuils_dynamiques import MM, libelle, lire_regle, seuils_lignes
+
+# --- SURVEILLANCE EN CONTINU ---
+# Alternative au cron : positions et watchlist restent en mémoire, les cours sont
+# relevés à intervalle régulier et seules les règles des tickers dont le cours a
+# changé sont réévaluées à chaque tick.
+# Comme dans le cron : une ligne à règle dynamique (colonne Regle) n'a pas de
+# seuils statiques, ses niveaux viennent du moteur (recalculés à chaque
+# rechargement, sous les mêmes clés d'alerte) ; un prix forcé (Prix_Manuel)
+# remplace le cours relevé. Les croisements de moyennes, calculés sur les
+# clôtures, restent au cron.
+
+class SourceYahoo:
+    """ Derniers cours en 1 minute, un seul yf.download par tick """
+
+    def __init__(self, timeout=10):
+        self.timeout = timeout
+
+    def _lire(self, tickers):
+        import yfinance as yf
+        data = yf.download(tickers, period="1d", interval="1m", progress=False, timeout=self.timeout)
+        return derniers_cours(extraire_clotures(data, tickers))
+
+    async def cotations(self, tickers):
+        return await asyncio.to_thread(self._lire, list(tickers))
+
+class SourceFictive:
+    """ Source de test : renvoie successivement les dicts fournis (une Exception simule une panne) """
+
+    def __init__(self, ticks):
+        self.ticks = list(ticks)
+        self.appels = 0
+
+    async def cotations(self, tickers):
+        self.appels += 1
+        tick = self.ticks.pop(0) if self.ticks else {}
+        if isinstance(tick, Exception): raise tick
+        return {t: p for t, p in tick.items() if t in tickers}
+
+def _nombres(df, col):
+    return pd.to_numeric(df[col], errors='coerce').fillna(0.0) if col in df.columns else pd.Series(0.0, index=df.index)
+
+def regles(df_p, df_w, moteur=None):
+    """ {ticker: [(règle, niveau, sens, message, base, fixe)]} à partir des seuils saisis : la règle porte sur
+    cours / base (1.0 pour un seuil statique), `fixe` est le prix forcé de la ligne (0 sinon) et `message(cours)`
+    donne le texte de l'alerte. Une colonne Portefeuille (facultative) donne des règles propres à chaque
+    portefeuille ; sans `moteur` (MoteurSeuils), les lignes à règle dynamique sont ignorées """
+    res = {}
+    def pf_de(df):
+        return df['Portefeuille'] if 'Portefeuille' in df.columns else [portefeuilles.PRINCIPAL] * len(df)
+
+    # Lignes à règle dynamique : niveaux du moteur au lieu des seuils saisis
+    dynamiques = set()
+    if df_p is not None and not df_p.empty and 'Regle' in df_p.columns:
+        df_p = df_p.reset_index(drop=True)
+        dynamiques = {i for i, r in enumerate(df_p['Regle']) if lire_regle(r) is not None}
+        niveaux = seuils_lignes(df_p, moteur) if moteur is not None and dynamiques else {}
+        fixes = _nombres(df_p, 'Prix_Manuel')
+        for i, n in niveaux.items():
+            t, nom, pf, regle = df_p['Ticker'][i], df_p['Nom'][i], pf_de(df_p)[i], df_p['Regle'][i].strip().lower()
+            if lire_regle(regle)[0] == MM: continue
+            marque = "" if pf == portefeuilles.PRINCIPAL else f"[{pf}] "
+            if n['bas']:
+                res.setdefault(t, []).append((portefeuilles.regle(pf, f"dyn_bas:{regle}"), 1.0, BAS, functools.partial(
+                    lambda marque, nom, txt, bas, cours: f"{marque}⚠️ {nom} : {cours:.2f}€ ({libelle(txt)} : {bas:.2f}€)",
+                    marque, nom, regle, n['bas']), n['bas'], float(fixes[i])))
+            if n['haut']:
+                res.setdefault(t, []).append((portefeuilles.regle(pf, f"dyn_haut:{regle}"), 1.0, HAUT, functools.partial(
+                    lambda marque, nom, txt, haut, cours: f"{marque}🚀 {nom} : {cours:.2f}€ ({libelle(txt)} : {haut:.2f}€)",
+                    marque, nom, regle, n['haut']), n['haut'], float(fixes[i])))
+
+    def ajouter(df, regle, col, sens, message, exclues=()):
+        if df is None or df.empty or col not in df.columns: return
+        niveaux, fixes = _nombres(df, col), _nombres(df, 'Prix_Manuel')
+        for i, (t, nom, n, pf, fixe) in enumerate(zip(df['Ticker'], df['Nom'], niveaux, pf_de(df), fixes)):
+            marque = "" if pf == portefeuilles.PRINCIPAL else f"[{pf}] "
+            if n > 0 and i not in exclues:
+                res.setdefault(t, []).append((portefeuilles.regle(pf, regle), float(n), sens,
+                                              functools.partial(message, marque, nom, float(n)), 1.0, float(fixe)))
+    # Textes construits par f-string : un nom contenant des accolades n'est jamais interprété comme un gabarit
+    ajouter(df_p, "seuil_bas", "Seuil_Bas", BAS, lambda marque, nom, n, cours: f"{marque}⚠️ {nom} : {cours:.2f}€ (Seuil: {n}€)", dynamiques)
+    ajouter(df_p, "seuil_haut", "Seuil_Haut", HAUT, lambda marque, nom, n, cours: f"{marque}🚀 {nom} : {cours:.2f}€ (Objectif: {n}€)", dynamiques)
+    # Watchlist : toujours au cours relevé, comme dans le cron
+    ajouter(df_w.drop(columns='Prix_Manuel', errors='ignore') if df_w is not None else None, "watchlist", "Seuil_Alerte", BAS,
+            lambda marque, nom, n, cours: f"{marque}🎯 {nom} : {cours:.2f}€ (Seuil : {n:.2f}€)")
+    return res
+
+class Moniteur:
+    def __init__(self, df_p, df_w, source, notifier, etat, cadence=60, cadence_max=600,
+                 recharger=None, recharger_tous=10, permanent=False, moteur=None):
+        self.source = source
+        self.notifier = notifier
+        self.etat = etat
+        self.moteur = moteur
+        self.cadence = cadence
+        self.cadence_max = cadence_max
+        self.recharger = recharger
+        self.recharger_tous = recharger_tous
+        self.permanent = permanent
+        self.derniers = {}
+        self.ticks = 0
+        self.charger(df_p, df_w)
+
+    def charger(self, df_p, df_w):
+        self.regles = regles(df_p, df_w, self.moteur)
+        # Niveaux dynamiques recalculés : les tickers concernés sont réévalués au prochain tick
+        self.derniers = {t: p for t, p in self.derniers.items()
+                         if t in self.regles and all(base == 1.0 for _, _, _, _, base, _ in self.regles[t])}
+        # Un titre sans cotation (OPCVM) dont toutes les lignes ont un prix forcé est évalué à ce prix
+        self.fixes = {t: rs[0][5] for t, rs in self.regles.items() if all(fixe > 0 for *_, fixe in rs)}
+        if self.moteur is not None: self.moteur.sauvegarder()
+
+    def traiter(self, prix):
+        """ Évalue les règles des seuls tickers dont le cours a changé ; renvoie les nouvelles alertes """
+        alertes = []
+        for t, cours in prix.items():
+            if cours is None or cours <= 0 or self.derniers.get(t) == cours: continue
+            self.derniers[t] = cours
+            for regle, niveau, sens, message, base, fixe in self.regles.get(t, []):
+                retenu = fixe or cours
+                if self.etat.evaluer(t, regle, niveau, retenu / base, sens):
+                    alertes.append(message(retenu))
+        return alertes
+
+    async def tick(self):
+        if self.recharger and self.ticks and self.ticks % self.recharger_tous == 0:
+            self.charger(*self.recharger())
+        self.ticks += 1
+        alertes = self.traiter({**self.fixes, **await self.source.cotations(list(self.regles))})
+        if alertes:
+            self.notifier("🔔 NOUVELLES ALERTES", "\n".join(alertes))
+        # État écrit dès qu'il change, réarmements compris : sinon, après un redémarrage, une alerte réarmée serait
+        # tenue pour active et son prochain franchissement passerait sous silence
+        if self.etat.modifie:
+            self.etat.sauvegarder(list(self.regles))
+        return alertes
+
+    async def tourner(self, max_ticks=None):
+        """ Boucle principale : cadence fixe, recul exponentiel en cas d'erreur """
+        delai = self.cadence
+        while max_ticks is None or self.ticks < max_ticks:
+            if not self.permanent and not bourse_ouverte():
+                print("Bourse fermée : fin de la surveillance.")
+                break
+            debut = time.perf_counter()
+            try:
+                alertes = await self.tick()
+                delai = self.cadence
+                print(f"Tick {self.ticks} : {len(alertes)} alerte(s) en {time.perf_counter() - debut:.2f}s")
+            except Exception as e:
+                delai = min(delai * 2, self.cadence_max)
+                print(f"Erreur de cotation ({e}), nouvel essai dans {delai}s")
+            if max_ticks is not None and self.ticks >= max_ticks: break
+            await asyncio.sleep(delai)
@@ -0,0 +1,47 @@
+import os
+
+import portefeuilles
+from persistance import ClientCSV, SourceGitHub, SourceLocale
+
+# --- NOYAU SANS INTERFACE ---
+# Chargement des données, cours retenus et indicateurs de bilan communs à app.py
+# et check_alerts.py. Rien ici ne dépend de Streamlit ; yfinance et bs4 ne sont
+# importés (par cache_marche, historique_local, cotations) qu'au premier
+# téléchargement, plotly seulement par l'application au premier graphique : un
+# cron qui trouve son stock à jour ne les charge jamais.
+
+FICHIERS = ("portefeuille_data.csv", "watchlist_data.csv", "dividendes_data.csv")
+
+def lecteur_csv(dossier_cache=".cache_csv"):
+    """ CSV du dossier PORTEFEUILLE_DATA_DIR s'il est défini, sinon du dépôt GitHub (GH_TOKEN, GH_REPO) """
+    if os.getenv("PORTEFEUILLE_DATA_DIR"):
+        return ClientCSV(SourceLocale(os.getenv("PORTEFEUILLE_DATA_DIR")))
+    return ClientCSV(SourceGitHub(os.getenv("GH_TOKEN"), os.getenv("GH_REPO")), dossier_cache=dossier_cache)
+
+def charger_portefeuille(lire, nom):
+    """ (positions, watchlist, dividendes) d'un portefeuille ; `lire(nom_fichier)` fixe le format (DataFrame, dicts) """
+    return tuple(lire(portefeuilles.chemin(nom, f)) for f in FICHIERS)
+
+def charger_portefeuilles(lire):
+    """ {nom: (positions, watchlist, dividendes)} pour le principal et tous les portefeuilles déclarés """
+    lignes = lire(portefeuilles.FICHIER)
+    noms = portefeuilles.noms(lignes.to_dict('records') if hasattr(lignes, 'to_dict') else lignes)
+    return {nom: charger_portefeuille(lire, nom) for nom in noms}
+
+def cours_stock(stock):
+    """ (dernier cours, cours précédent) de chaque ticker du stock d'historiques """
+    derniers = {t: h['Close'].dropna().tail(2) for t, h in stock.items() if not h.empty}
+    derniers = {t: c for t, c in derniers.items() if len(c)}
+    return {t: float(c.iloc[-1]) for t, c in derniers.items()}, {t: float(c.iloc[0]) for t, c in derniers.items()}
+
+def cours_retenus(prix, manuels):
+    """ Cours utilisés pour la valorisation : un prix forcé à la main (Prix_Manuel) l'emporte sur le relevé """
+    return {**prix, **manuels}
+
+def performance(investi, valeur, veille=0.0, dividendes=0.0):
+    """ Indicateurs des bilans : P/L boursier, richesse dividendes compris, variation du jour (en %) """
+    richesse = valeur + dividendes
+    pct = lambda x, base: x / base * 100 if base > 0 else 0.0
+    return {"pv": valeur - investi, "pv_pct": pct(valeur - investi, investi),
+            "richesse": richesse, "pv_totale": richesse - investi, "pv_totale_pct": pct(richesse - investi, investi),
+            "jour_pct": pct(valeur - veille, veille)}
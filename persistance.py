@@ -0,0 +1,253 @@
+import atexit
+import os
+import threading
+from io import StringIO
+
+import pandas as pd
+import requests
+
+from instrumentation import mesure
+
+# --- PERSISTANCE GITHUB ---
+# Lecture conditionnelle (ETag) : un fichier inchangé n'est ni re-téléchargé ni re-parsé.
+# Écriture différée : les modifications sont appliquées tout de suite à la copie locale puis mises en
+# file d'attente ; un seul commit (API Git Trees) regroupe tous les CSV modifiés
+# pendant la fenêtre de regroupement.
+
+API = "https://api.github.com"
+
+# --- LECTURE CONDITIONNELLE (ETag) ---
+class SourceGitHub:
+    """ Contenu brut d'un fichier via l'API contents, avec If-None-Match """
+
+    def __init__(self, token, repo, branche="main"):
+        self.repo = repo
+        self.branche = branche
+        self.headers = {"Accept": "application/vnd.github.raw"}
+        if token: self.headers["Authorization"] = f"token {token}"
+
+    def lire(self, nom_fichier, etag=None):
+        """ (contenu, etag) ; contenu vaut None si le fichier n'a pas changé (304).
+        FileNotFoundError si le fichier n'existe pas (404), toute autre erreur signifie que la lecture a échoué """
+        headers = dict(self.headers)
+        if etag: headers["If-None-Match"] = etag
+        r = requests.get(f"{API}/repos/{self.repo}/contents/{nom_fichier}", headers=headers,
+                         params={"ref": self.branche}, timeout=10)
+        if r.status_code == 304: return None, etag
+        if r.status_code == 404: raise FileNotFoundError(nom_fichier)
+        r.raise_for_status()
+        return r.content.decode('utf-8'), r.headers.get("ETag")
+
+class SourceLocale:
+    """ Équivalent local de SourceGitHub (tests, développement hors ligne) """
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+
+    def lire(self, nom_fichier, etag=None):
+        chemin = os.path.join(self.dossier, nom_fichier)
+        infos = os.stat(chemin)
+        courant = f'"{infos.st_mtime_ns}-{infos.st_size}"'
+        if etag == courant: return None, etag
+        with open(chemin, encoding='utf-8') as f:
+            return f.read(), courant
+
+class ClientCSV:
+    """ Garde (etag, DataFrame) par fichier : un 304 renvoie le frame déjà parsé.
+    Avec `dossier_cache`, le cache survit d'un lancement à l'autre (cron). Un fichier absent du dépôt donne un
+    frame vide ; une lecture qui échoue sans copie connue aussi, mais le fichier est alors noté illisible
+    (disponible() renvoie False) : son contenu est inconnu et ne doit pas être écrasé. """
+
+    def __init__(self, source, dossier_cache=None):
+        self.source = source
+        self.dossier_cache = dossier_cache
+        self._frames = {}
+        self._illisibles = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _chemin_cache(self, nom_fichier):
+        return os.path.join(self.dossier_cache, nom_fichier + ".pkl")
+
+    def _en_cache(self, nom_fichier):
+        if nom_fichier in self._frames: return self._frames[nom_fichier]
+        if self.dossier_cache:
+            try:
+                return pd.read_pickle(self._chemin_cache(nom_fichier))
+            except Exception:
+                pass
+        return None, None
+
+    def lire(self, nom_fichier):
+        """ DataFrame du fichier (vide en cas d'erreur sans cache) """
+        with self._lock:
+            etag, df = self._en_cache(nom_fichier)
+        with mesure("csv.lire", fichier=nom_fichier) as infos:
+            try:
+                contenu, nouvel_etag = self.source.lire(nom_fichier, etag if df is not None else None)
+            except FileNotFoundError:
+                infos["cache"] = "absent"
+                with self._lock:
+                    self._frames.pop(nom_fichier, None)
+                    self._illisibles.discard(nom_fichier)
+                return pd.DataFrame()
+            except Exception as e:
+                print(f"Erreur lecture {nom_fichier} : {e}")
+                infos["cache"] = "erreur"
+                if df is not None: return df.copy()
+                with self._lock:
+                    self._illisibles.add(nom_fichier)
+                return pd.DataFrame()
+            with self._lock:
+                self._illisibles.discard(nom_fichier)
+            infos["cache"] = "hit" if contenu is None else "miss"
+            if contenu is None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                infos["octets"] = len(contenu)
+                try:
+                    df = pd.read_csv(StringIO(contenu))
+                except pd.errors.EmptyDataError:
+                    df = pd.DataFrame()
+                with self._lock:
+                    self._frames[nom_fichier] = (nouvel_etag, df)
+                    if self.dossier_cache:
+                        os.makedirs(self.dossier_cache, exist_ok=True)
+                        pd.to_pickle((nouvel_etag, df), self._chemin_cache(nom_fichier))
+        return df.copy()
+
+    def oublier(self, nom_fichier):
+        with self._lock:
+            self._frames.pop(nom_fichier, None)
+
+    def disponible(self, nom_fichier):
+        """ False si la dernière lecture du fichier a échoué sans copie connue (dépôt injoignable) """
+        with self._lock:
+            return nom_fichier not in self._illisibles
+
+class DepotGitHub:
+    """ Lecture des CSV du dépôt et écriture groupée en un commit """
+
+    def __init__(self, token, repo, branche="main", delai=2.0, delai_max=300.0):
+        self.repo = repo
+        self.branche = branche
+        self.delai = delai
+        self.delai_max = delai_max   # attente maximale entre deux tentatives après des échecs
+        self.headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}
+        self._en_attente = {}   # nom_fichier -> contenu CSV à pousser
+        self._head = None       # (sha du commit, sha de l'arbre) du dernier état connu
+        self._timer = None
+        self._lock = threading.Lock()
+        self._lock_commit = threading.Lock()   # un seul envoi à la fois (minuterie, atexit, appel direct)
+        self._echecs = 0
+        self.commits = 0
+        self.lecteur = ClientCSV(SourceGitHub(token, repo, branche))
+
+    # --- Lecture ---
+    def charger(self, nom_fichier):
+        """ Liste de dicts ; la version locale non encore poussée est prioritaire """
+        with self._lock:
+            contenu = self._en_attente.get(nom_fichier)
+        if contenu is not None:
+            try:
+                return pd.read_csv(StringIO(contenu)).to_dict('records')
+            except pd.errors.EmptyDataError:
+                return []
+        return self.lecteur.lire(nom_fichier).to_dict('records')
+
+    def disponible(self, nom_fichier):
+        """ Contenu connu : version locale en attente, ou dernière lecture réussie (fichier absent compris) """
+        with self._lock:
+            if nom_fichier in self._en_attente: return True
+        return self.lecteur.disponible(nom_fichier)
+
+    # --- Écriture ---
+    def enregistrer(self, liste, nom_fichier):
+        """ Met le fichier en file d'attente ; l'envoi a lieu après `delai` secondes """
+        self.enregistrer_contenu(pd.DataFrame(liste).to_csv(index=False), nom_fichier)
+
+    def enregistrer_contenu(self, contenu, nom_fichier):
+        with self._lock:
+            self._en_attente[nom_fichier] = contenu
+            self._programmer(self.delai)
+
+    def _programmer(self, delai):
+        """ Arme la minuterie d'envoi si aucune n'est en cours (appelé sous self._lock) """
+        if self._timer is None:
+            self._timer = threading.Timer(delai, self.vider_file)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def vider_file(self):
+        """ Pousse tous les fichiers en attente dans un seul commit ; après un échec, nouvel essai programmé
+        avec une attente doublée à chaque échec consécutif (plafonnée à delai_max) """
+        with self._lock_commit:
+            with self._lock:
+                if self._timer is not None: self._timer.cancel()
+                self._timer = None
+                lot, self._en_attente = self._en_attente, {}
+            if not lot: return True
+            try:
+                for essai in range(2):
+                    if self._commit(lot, forcer_head=essai > 0):
+                        self._echecs = 0
+                        return True
+            except Exception as e:
+                print(f"Erreur synchronisation GitHub : {e}")
+            # Échec : on remet en attente ce qui n'a pas été remplacé entre-temps, puis on réessaiera
+            self._echecs += 1
+            with self._lock:
+                for nom, contenu in lot.items():
+                    self._en_attente.setdefault(nom, contenu)
+                self._programmer(min(self.delai * 2 ** self._echecs, self.delai_max))
+            return False
+
+    def _lire_head(self):
+        r = requests.get(f"{API}/repos/{self.repo}/git/ref/heads/{self.branche}", headers=self.headers, timeout=10)
+        r.raise_for_status()
+        commit = r.json()['object']['sha']
+        r = requests.get(f"{API}/repos/{self.repo}/git/commits/{commit}", headers=self.headers, timeout=10)
+        r.raise_for_status()
+        return commit, r.json()['tree']['sha']
+
+    def _commit(self, lot, forcer_head=False):
+        if self._head is None or forcer_head:
+            self._head = self._lire_head()
+        parent, arbre = self._head
+        url = f"{API}/repos/{self.repo}/git"
+
+        r = requests.post(f"{url}/trees", headers=self.headers, timeout=10, json={
+            "base_tree": arbre,
+            "tree": [{"path": nom, "mode": "100644", "type": "blob", "content": c} for nom, c in lot.items()],
+        })
+        r.raise_for_status()
+        nouvel_arbre = r.json()['sha']
+
+        r = requests.post(f"{url}/commits", headers=self.headers, timeout=10, json={
+            "message": f"Sync {', '.join(sorted(lot))}", "tree": nouvel_arbre, "parents": [parent],
+        })
+        r.raise_for_status()
+        commit = r.json()['sha']
+
+        # Échoue (422) si la branche a bougé depuis notre dernier commit : on relit le head
+        r = requests.patch(f"{url}/refs/heads/{self.branche}", headers=self.headers, timeout=10, json={"sha": commit})
+        if r.status_code == 422: return False
+        r.raise_for_status()
+        self._head = (commit, nouvel_arbre)
+        self.commits += 1
+        for nom in lot: self.lecteur.oublier(nom)
+        return True
+
+_depots = {}
+_depots_lock = threading.Lock()
+
+def obtenir_depot(token, repo, branche="main"):
+    """ Un seul dépôt par processus : les sessions Streamlit partagent la file d'attente """
+    with _depots_lock:
+        cle = (repo, branche)
+        if cle not in _depots:
+            _depots[cle] = DepotGitHub(token, repo, branche)
+            atexit.register(_depots[cle].vider_file)
+        return _depots[cle]
@@ -0,0 +1,32 @@
+import re
+
+# --- PORTEFEUILLES MULTIPLES ---
+# Chaque portefeuille nommé a ses propres CSV (positions, watchlist, dividendes,
+# grand livre) dans un sous-dossier du dépôt ; le portefeuille principal reste à
+# la racine. Les données de marché (cache, stock d'historiques, routage des
+# sources) sont communes : un ticker suivi par plusieurs portefeuilles n'est
+# téléchargé qu'une fois.
+
+FICHIER = "portefeuilles_data.csv"   # une colonne : Nom
+PRINCIPAL = "Principal"
+DOSSIER = "portefeuilles"
+
+def identifiant(nom):
+    """ Nom de dossier sûr ('' pour le portefeuille principal) """
+    if not nom or nom == PRINCIPAL: return ""
+    return re.sub(r"[^a-z0-9_-]+", "_", nom.strip().lower()).strip("_") or "sans_nom"
+
+def chemin(nom, nom_fichier):
+    """ Chemin d'un CSV du portefeuille dans le dépôt """
+    ident = identifiant(nom)
+    return f"{DOSSIER}/{ident}/{nom_fichier}" if ident else nom_fichier
+
+def noms(lignes):
+    """ Le principal d'abord, puis les portefeuilles déclarés (sans doublon) """
+    autres = [l['Nom'].strip() for l in lignes if isinstance(l.get('Nom'), str) and l['Nom'].strip()]
+    return list(dict.fromkeys([PRINCIPAL] + autres))
+
+def regle(nom, regle_alerte):
+    """ Nom de règle d'alerte propre au portefeuille (inchangé pour le principal) """
+    ident = identifiant(nom)
+    return f"{ident}:{regle_alerte}" if ident else regle_alerte
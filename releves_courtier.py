@@ -0,0 +1,277 @@
+import csv
+import io
+import itertools
+import re
+import threading
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+
+import requests
+
+from cotations import nettoyer_isin
+from grand_livre import ACHAT, VENTE, DIVIDENDE
+
+# --- IMPORT DES RELEVÉS COURTIER ---
+# Les relevés (CSV ou OFX) sont lus ligne à ligne : chaque opération est
+# normalisée (date, type, ISIN, quantité, prix, montant) et passée au grand livre
+# au fil de la lecture, sans charger tout l'historique en mémoire. Les ISIN sont
+# traduits en tickers Yahoo par une table en cache (lignes déjà connues, puis une
+# seule recherche Yahoo par ISIN inconnu, échecs compris).
+
+NOM_FICHIER = "isin_data.csv"   # Isin, Ticker, Nom
+RE_ISIN = re.compile(r"^[A-Z]{2}[A-Z0-9]{9}[0-9]$")
+TAILLE_LOT = 500   # opérations écrites par prise du verrou du grand livre
+
+# En-têtes reconnus (minuscules, sans accents), par ordre de préférence
+ALIAS = {
+    "Date": ["date operation", "date d'operation", "date de l'operation", "date execution", "date d'execution", "date"],
+    "Type": ["operation", "type d'operation", "type", "sens", "nature"],
+    "ISIN": ["isin", "code isin"],
+    "Nom": ["libelle valeur", "valeur", "nom", "produit", "titre", "libelle"],
+    "Qté": ["quantite", "qte", "nombre", "nb titres"],
+    "Prix": ["cours", "cours d'execution", "prix unitaire", "prix"],
+    "Montant": ["montant net", "montant", "net", "total"],
+}
+# Mots-clés du libellé d'opération ; les autres opérations (frais, virements...) sont ignorées
+TYPES = [(DIVIDENDE, ("dividende", "coupon", "dividend", "distribution")),
+         (VENTE, ("vente", "sell", "rachat", "cession")),
+         (ACHAT, ("achat", "buy", "souscription"))]
+BLOCS_OFX = {"BUYSTOCK": ACHAT, "BUYMF": ACHAT, "BUYOTHER": ACHAT,
+             "SELLSTOCK": VENTE, "SELLMF": VENTE, "SELLOTHER": VENTE, "INCOME": DIVIDENDE}
+
+def _sans_accents(texte):
+    texte = unicodedata.normalize("NFKD", str(texte)).encode("ascii", "ignore").decode()
+    return " ".join(texte.lower().replace("’", "'").split())
+
+def _nombre(texte):
+    """ '1 234,56 €' / '1,234.56' / '-12.5' -> float (0.0 si illisible) """
+    s = re.sub(r"[^0-9,.\-]", "", str(texte or ""))
+    if "," in s and "." in s:
+        s = s.replace(".", "").replace(",", ".") if s.rfind(",") > s.rfind(".") else s.replace(",", "")
+    else:
+        s = s.replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return 0.0
+
+@lru_cache(maxsize=4096)   # libellés et dates se répètent d'une ligne à l'autre
+def _date(texte):
+    """ Date ISO ; accepte JJ/MM/AAAA, AAAA-MM-JJ, JJ-MM-AAAA, JJ/MM/AA et AAAAMMJJ[hhmmss] (OFX) """
+    texte = texte.strip()
+    if re.match(r"^\d{8}", texte): texte = texte[:8]
+    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d/%m/%y", "%Y%m%d", "%d.%m.%Y"):
+        try:
+            return datetime.strptime(texte[:10], fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+@lru_cache(maxsize=4096)
+def _type(texte):
+    texte = _sans_accents(texte)
+    return next((t for t, mots in TYPES if any(m in texte for m in mots)), None)
+
+def _operation(date_, type_, isin, nom, qte, prix, montant):
+    """ Opération normalisée, ou None si elle ne concerne pas un titre identifiable """
+    isin = nettoyer_isin(isin)
+    isin = isin.upper() if isin else None
+    if not date_ or not type_ or not isin or not RE_ISIN.match(isin): return None
+    qte, prix, montant = abs(qte), abs(prix), abs(montant)
+    if type_ != DIVIDENDE:
+        if qte <= 0: return None
+        if prix <= 0 and montant > 0: prix = montant / qte
+    elif montant <= 0:
+        return None
+    return {"Date": date_, "Type": type_, "ISIN": isin, "Nom": (nom or "").strip(), "Qté": qte, "Prix": prix, "Montant": montant}
+
+# --- Lecture en flux ---
+def ouvrir(binaire):
+    """ Flux texte d'un fichier déposé : UTF-8 si possible, sinon Windows-1252 (exports des courtiers français) """
+    debut = binaire.read(65536)
+    binaire.seek(0)
+    try:
+        debut.decode("utf-8")
+        encodage = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        encodage = "utf-8-sig" if e.start > len(debut) - 4 else "cp1252"   # caractère coupé en fin de bloc
+    return io.TextIOWrapper(binaire, encoding=encodage, errors="replace", newline="")
+
+def _colonnes(entetes):
+    """ {champ: position} d'après les en-têtes reconnus """
+    normalises = [_sans_accents(e) for e in entetes]
+    res = {}
+    for champ, alias in ALIAS.items():
+        pos = next((normalises.index(a) for a in alias if a in normalises and normalises.index(a) not in res.values()), None)
+        if pos is not None: res[champ] = pos
+    return res
+
+def lire_csv(flux, max_preambule=20):
+    """ Opérations d'un export CSV, une ligne à la fois ; les lignes d'en-tête du relevé (compte, période) sont sautées """
+    for _ in range(max_preambule):
+        entete = flux.readline()
+        if not entete: return
+        try:
+            dialecte = csv.Sniffer().sniff(entete, delimiters=";,\t|")
+        except csv.Error:
+            continue
+        cols = _colonnes(next(csv.reader([entete], dialecte)))
+        if "Date" in cols and "ISIN" in cols and "Type" in cols: break
+    else:
+        return
+    for ligne in csv.reader(flux, dialecte):
+        if len(ligne) <= max(cols.values()): continue
+        champ = lambda c: ligne[cols[c]] if c in cols else ""
+        op = _operation(_date(champ("Date")), _type(champ("Type")), champ("ISIN"), champ("Nom"),
+                        _nombre(champ("Qté")), _nombre(champ("Prix")), _nombre(champ("Montant")))
+        if op: yield op
+
+def lire_ofx(flux):
+    """ Opérations d'un relevé OFX (SGML 1.x ou XML 2.x), bloc par bloc """
+    bloc = None
+    for ligne in flux:
+        for fermeture, balise, valeur in re.findall(r"<(/?)([A-Z0-9.]+)>([^<\r\n]*)", ligne):
+            if balise in BLOCS_OFX:
+                if not fermeture:
+                    bloc = {"_type": BLOCS_OFX[balise]}
+                elif bloc is not None:
+                    op = _operation(_date(bloc.get("DTTRADE", "")), bloc["_type"], bloc.get("UNIQUEID"), bloc.get("MEMO"),
+                                    _nombre(bloc.get("UNITS")), _nombre(bloc.get("UNITPRICE")), _nombre(bloc.get("TOTAL")))
+                    bloc = None
+                    if op: yield op
+            elif bloc is not None and not fermeture and valeur.strip():
+                bloc[balise] = valeur.strip()
+
+def lire_releve(flux, nom_fichier):
+    return lire_ofx(flux) if nom_fichier.lower().endswith((".ofx", ".qfx")) else lire_csv(flux)
+
+def chronologique(operations):
+    """ Opérations dans l'ordre des dates : un relevé chronologique passe en flux (une journée en tampon) ;
+    un relevé du plus récent au plus ancien est remis dans l'ordre en fin de lecture """
+    jour, tampon, desordre = None, [], False
+    for op in operations:
+        if jour is not None and op["Date"] < jour:
+            desordre = True
+        elif not desordre and jour is not None and op["Date"] > jour:
+            yield from tampon
+            tampon = []
+        jour = op["Date"]
+        tampon.append(op)
+    yield from (sorted(reversed(tampon), key=lambda o: o["Date"]) if desordre else tampon)
+
+# --- Table ISIN -> ticker ---
+def chercher_ticker(isin, timeout=5):
+    """ (ticker, nom) via la recherche Yahoo, Paris en priorité ; ('', '') si inconnu, None si Yahoo ne répond pas """
+    try:
+        r = requests.get("https://query2.finance.yahoo.com/v1/finance/search", params={"q": isin, "quotesCount": 5, "newsCount": 0},
+                         headers={'User-Agent': 'Mozilla/5.0'}, timeout=timeout)
+        cotes = [q for q in r.json().get("quotes", []) if q.get("symbol")]
+    except Exception:
+        return None
+    if not cotes: return "", ""
+    q = min(cotes, key=lambda q: not q["symbol"].endswith(".PA"))
+    return q["symbol"], q.get("longname") or q.get("shortname") or ""
+
+class TableIsin:
+    def __init__(self, lignes=None, chercher=chercher_ticker):
+        self.chercher = chercher
+        self.modifiee = False
+        self._table = {}   # isin -> (ticker, nom) ; ticker vide : inconnu de Yahoo (pas de nouvelle recherche)
+        self._lock = threading.Lock()
+        if lignes: self.charger(lignes)
+
+    def charger(self, lignes):
+        """ Lignes au format de isin_data.csv (Isin, Ticker, Nom) """
+        with self._lock:
+            for l in lignes:
+                isin = nettoyer_isin(l.get('Isin'))
+                if isin:
+                    self._table[isin.upper()] = (l['Ticker'] if isinstance(l.get('Ticker'), str) else "",
+                                                 l['Nom'] if isinstance(l.get('Nom'), str) else "")
+
+    def apprendre(self, lignes):
+        """ Couples ISIN / ticker déjà saisis (positions, watchlist) ; les ISIN sont nettoyés au passage """
+        with self._lock:
+            for l in lignes:
+                isin, ticker = nettoyer_isin(l.get('ISIN')), l.get('Ticker')
+                if isin and isinstance(ticker, str) and RE_ISIN.match(isin.upper()) and not self._table.get(isin.upper(), ("",))[0]:
+                    self._table[isin.upper()] = (ticker, l.get('Nom') or "")
+                    self.modifiee = True
+
+    def ticker(self, isin, echecs=None):
+        """ (ticker, nom) ; une seule recherche réseau par ISIN inconnu. `echecs` (ensemble propre à un import)
+        retient les ISIN dont la recherche a échoué (Yahoo injoignable) pour ne pas la relancer à chaque opération """
+        isin = (nettoyer_isin(isin) or "").upper()
+        with self._lock:
+            if isin in self._table: return self._table[isin]
+        if echecs is not None and isin in echecs: return "", ""
+        trouve = self.chercher(isin)
+        if trouve is None:
+            if echecs is not None: echecs.add(isin)
+            return "", ""
+        with self._lock:
+            self._table[isin] = trouve
+            self.modifiee = True
+        return trouve
+
+    def lignes(self):
+        with self._lock:
+            return [{"Isin": i, "Ticker": t, "Nom": n} for i, (t, n) in sorted(self._table.items())]
+
+# --- Fusion ---
+def _empreinte(date_, type_, isin, qte, prix, montant):
+    return (str(date_), type_, (isin or "").strip().upper(), round(float(qte or 0), 4), round(float(prix or 0), 4),
+            round(float(montant or 0), 2))
+
+def importer(operations, livre, positions, dividendes, table):
+    """ Passe les opérations au grand livre (en un lot) et fusionne positions et dividendes, modifiés en place.
+    Une opération déjà présente dans le journal (relevé réimporté) est ignorée, autant de fois qu'elle y figure :
+    deux exécutions partielles identiques du même jour restent deux opérations. Les titres repris de l'existant
+    (ajustements seuls) sont remplacés par les opérations du relevé ; un achat / vente antérieur au dernier
+    mouvement du titre dans le journal est rejeté. Renvoie le bilan de l'import """
+    connues = Counter(_empreinte(e['Date'], e['Type'], e['ISIN'], e['Qté'], e['Prix'], e['Montant']) for e in livre.evenements())
+    bilan = {"importees": 0, "doublons": 0, "inconnus": set(), "dividendes": 0, "isin_corriges": 0,
+             "remplaces": set(), "rejetees": []}
+    nouveaux_div, echecs, mouvements = [], set(), set()
+
+    def evenements():
+        for op in chronologique(operations):
+            e = _empreinte(op['Date'], op['Type'], op['ISIN'], op['Qté'], op['Prix'], op['Montant'])
+            if connues[e] > 0:
+                connues[e] -= 1
+                bilan["doublons"] += 1
+                continue
+            ticker, nom = table.ticker(op['ISIN'], echecs)
+            if not ticker:
+                bilan["inconnus"].add(op['ISIN'])
+                continue
+            bilan["importees"] += 1
+            if op['Type'] in (ACHAT, VENTE): mouvements.add(ticker)
+            if op['Type'] == DIVIDENDE: nouveaux_div.append({"Ticker": ticker, "Date": op['Date'], "Montant": op['Montant']})
+            yield {"type_": op['Type'], "ticker": ticker, "qte": op['Qté'], "prix": op['Prix'], "montant": op['Montant'],
+                   "nom": op['Nom'] or nom, "isin": op['ISIN'], "date_evt": op['Date']}
+
+    # Lecture et recherches de tickers (réseau) hors du verrou du grand livre : il n'est pris que pour écrire
+    # chaque lot, les autres sessions ne restent pas bloquées derrière un Yahoo lent
+    flux = evenements()
+    while lot := list(itertools.islice(flux, TAILLE_LOT)):
+        _, remplaces, rejetes = livre.ajouter_lot(lot, releve=True)
+        bilan["remplaces"] |= remplaces
+        bilan["importees"] -= len(rejetes)
+        bilan["rejetees"] += [f"{e['date_evt']} {e['type_']} {e['ticker']} {e['qte']:g}" for e in rejetes]
+
+    # ISIN pollués par des espaces (ex. 'FR0000120073 ') corrigés dans toutes les lignes
+    for l in positions:
+        propre = nettoyer_isin(l.get('ISIN'))
+        if propre and propre != l.get('ISIN'):
+            l['ISIN'] = propre
+            bilan["isin_corriges"] += 1
+    # Seuls les achats / ventes changent Qté et PRU : un dividende ne crée ni ne supprime de ligne
+    livre.projeter(positions, mouvements)
+    dividendes.extend(nouveaux_div)
+    bilan["dividendes"] = len(nouveaux_div)
+    bilan["inconnus"] = sorted(bilan["inconnus"])
+    bilan["remplaces"] = sorted(bilan["remplaces"])
+    return bilan
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+# --- ANALYSE DE RISQUE ---
+# Tous les indicateurs sont calculés en bloc sur la matrice des rendements
+# journaliers (dates x tickers) issue du stock local de clôtures : volatilité
+# glissante, drawdown, bêta contre l'indice de référence, corrélations et VaR.
+# Les résultats sont mémorisés pour la journée de bourse (dernière clôture).
+
+INDICE = "CW8.PA"
+JOURS_AN = 252
+FENETRE_VOL = 20
+
+_cache = OrderedDict()   # (dernière clôture, tickers, poids) -> résultats
+_MAX_CACHE = 32
+
+def rendements(clotures):
+    """ Rendements journaliers simples ; les trous (jours fériés propres à une place) sont comblés """
+    r = clotures.sort_index().ffill().pct_change(fill_method=None).iloc[1:]
+    return r.replace([np.inf, -np.inf], np.nan)
+
+def drawdown(valeurs):
+    """ Drawdown courant (<= 0) de chaque colonne (ou d'une série) """
+    return valeurs / np.fmax.accumulate(valeurs.to_numpy(), axis=0) - 1.0
+
+def correlation(r):
+    """ Matrice de corrélation en un produit matriciel (les jours manquants d'une ligne sont ignorés) """
+    x = r.to_numpy()
+    present = ~np.isnan(x)
+    centre = np.where(present, x - np.nanmean(x, axis=0), 0.0)
+    nb = present.T.astype('float64') @ present.astype('float64')
+    cov = centre.T @ centre / np.fmax(nb - 1, 1)
+    ecart = np.sqrt(np.diag(cov))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame(cov / np.outer(ecart, ecart), index=r.columns, columns=r.columns)
+
+def var(r_pf, niveau=0.95):
+    """ VaR journalière en fraction de la valeur : (historique, paramétrique) """
+    r = r_pf.dropna().to_numpy()
+    if len(r) < 2: return 0.0, 0.0
+    historique = -float(np.quantile(r, 1 - niveau))
+    parametrique = -float(r.mean() + NormalDist().inv_cdf(1 - niveau) * r.std(ddof=1))
+    return max(historique, 0.0), max(parametrique, 0.0)
+
+def analyser(clotures, valeurs, indice=INDICE, niveau=0.95):
+    """ Indicateurs de risque du portefeuille et de chaque ligne.
+    `clotures` : DataFrame dates x tickers (l'indice inclus s'il est disponible) ;
+    `valeurs` : {ticker: valeur actuelle de la ligne} servant de pondération """
+    poids = pd.Series(valeurs, dtype='float64')
+    poids = poids[poids.index.isin(clotures.columns) & (poids > 0)]
+    if clotures.empty or poids.empty: return None
+    # Clé du jour : les variations de cours intraday ne changent pas les poids arrondis au pour cent
+    cle = (clotures.index[-1], tuple(poids.index), tuple((poids / poids.sum()).round(2)))
+    if cle in _cache:
+        _cache.move_to_end(cle)
+        return _cache[cle]
+
+    r_tout = rendements(clotures)
+    r = r_tout[poids.index]
+    w = (poids / poids.sum()).to_numpy()
+    # Rendement du portefeuille à poids constants ; une ligne sans cotation ce jour-là compte pour 0
+    r_pf = pd.Series(r.fillna(0.0).to_numpy() @ w, index=r.index)
+    v_pf = (1 + r_pf).cumprod()
+
+    lignes = pd.DataFrame({
+        "Poids": w,
+        "Volatilité": r.std().to_numpy() * np.sqrt(JOURS_AN),
+        "Vol. 20j": r.iloc[-FENETRE_VOL:].std().to_numpy() * np.sqrt(JOURS_AN),
+        "Drawdown max": drawdown((1 + r.fillna(0.0)).cumprod()).min().to_numpy(),
+    }, index=poids.index)
+
+    beta_pf = np.nan
+    if indice in r_tout.columns and r_tout[indice].notna().sum() > 1:
+        # Bêtas de toutes les lignes en une passe : cov(r_i, r_indice) / var(r_indice)
+        b = r_tout[indice]
+        centres = r.sub(r.mean()).mul(b - b.mean(), axis=0)
+        lignes["Bêta"] = (centres.sum() / (r.notna().sum() - 1) / b.var()).to_numpy()
+        beta_pf = float(r_pf.cov(b) / b.var())
+
+    dd_pf = drawdown(v_pf)
+    var_h, var_p = var(r_pf, niveau)
+    res = {
+        "lignes": lignes,
+        "correlation": correlation(r),
+        "volatilite": float(r_pf.std() * np.sqrt(JOURS_AN)),
+        "volatilite_glissante": r_pf.rolling(FENETRE_VOL, min_periods=FENETRE_VOL // 2).std() * np.sqrt(JOURS_AN),
+        "drawdown": dd_pf,
+        "drawdown_max": float(dd_pf.min()),
+        "drawdown_courant": float(dd_pf.iloc[-1]),
+        "beta": beta_pf,
+        "var_historique": var_h,
+        "var_parametrique": var_p,
+        "niveau": niveau,
+        "dernier_rendement": float(r_pf.iloc[-1]) if len(r_pf) else 0.0,
+        "couverture": float(poids.sum() / sum(v for v in valeurs.values() if v > 0)),
+    }
+    _cache[cle] = res
+    while len(_cache) > _MAX_CACHE: _cache.popitem(last=False)
+    return res
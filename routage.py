@@ -0,0 +1,73 @@
+import threading
+import time
+
+# --- ROUTAGE DES SOURCES DE PRIX ---
+# Retient, par instrument, la source qui a répondu en dernier (essayée en premier
+# au prochain passage) et met en quarantaine les sources qui ne renvoient rien,
+# avec un délai qui double à chaque échec (cache négatif).
+
+NOM_FICHIER = "routage_data.csv"
+DELAI_BASE = 15 * 60
+DELAI_MAX = 7 * 24 * 3600
+
+class TableRoutage:
+    def __init__(self, lignes=None, delai_base=DELAI_BASE, delai_max=DELAI_MAX):
+        self.delai_base = delai_base
+        self.delai_max = delai_max
+        self.modifiee = False
+        self._etat = {}   # (ticker, source) -> {"succes": ts, "echecs": n, "reessai": ts}
+        self._lock = threading.Lock()
+        if lignes: self.charger(lignes)
+
+    def charger(self, lignes):
+        """ Lignes au format de routage_data.csv (Ticker, Source, Succes, Echecs, Reessai) """
+        with self._lock:
+            for l in lignes:
+                try:
+                    self._etat[(l['Ticker'], l['Source'])] = {
+                        "succes": float(l.get('Succes') or 0), "echecs": int(float(l.get('Echecs') or 0)),
+                        "reessai": float(l.get('Reessai') or 0)}
+                except (KeyError, TypeError, ValueError):
+                    continue
+
+    def lignes(self):
+        with self._lock:
+            return [{"Ticker": t, "Source": s, "Succes": round(e["succes"]), "Echecs": e["echecs"],
+                     "Reessai": round(e["reessai"])} for (t, s), e in sorted(self._etat.items())]
+
+    def ordre(self, ticker, sources):
+        """ Sources triées : la dernière gagnante d'abord, puis l'ordre par défaut """
+        with self._lock:
+            succes = {s: self._etat.get((ticker, s), {}).get("succes", 0) for s in sources}
+        gagnante = max(sources, key=lambda s: succes[s]) if any(succes.values()) else None
+        return ([gagnante] if gagnante else []) + [s for s in sources if s != gagnante]
+
+    def preferee(self, ticker, sources):
+        return self.ordre(ticker, sources)[0]
+
+    def disponible(self, ticker, source, maintenant=None):
+        with self._lock:
+            e = self._etat.get((ticker, source))
+        return e is None or e["reessai"] <= (maintenant or time.time())
+
+    def succes(self, ticker, source):
+        with self._lock:
+            e = self._etat.get((ticker, source))
+            if e and e["echecs"] == 0 and e["succes"] > 0 and self._preferee_inchangee(ticker, source):
+                e["succes"] = time.time()
+                return
+            self._etat[(ticker, source)] = {"succes": time.time(), "echecs": 0, "reessai": 0.0}
+            self.modifiee = True
+
+    def _preferee_inchangee(self, ticker, source):
+        """ Vrai si `source` est déjà la plus récente gagnante (pas besoin de réécrire la table) """
+        autres = [e["succes"] for (t, s), e in self._etat.items() if t == ticker and s != source]
+        return all(a <= self._etat[(ticker, source)]["succes"] for a in autres)
+
+    def echec(self, ticker, source):
+        with self._lock:
+            e = self._etat.get((ticker, source), {"succes": 0.0, "echecs": 0, "reessai": 0.0})
+            e["echecs"] += 1
+            e["reessai"] = time.time() + min(self.delai_max, self.delai_base * 2 ** (e["echecs"] - 1))
+            self._etat[(ticker, source)] = e
+            self.modifiee = True
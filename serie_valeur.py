@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from collections import Counter
+from datetime import date
+
+import pandas as pd
+
+from grand_livre import ACHAT, DIVIDENDE, appliquer
+from historique_local import DOSSIER, PERIODES, clotures_locales, debut_periode
+from instrumentation import mesure
+
+# --- SÉRIE DE VALEUR DU PORTEFEUILLE ---
+# Valeur, capital investi et dividendes cumulés jour par jour, matérialisés à côté
+# du stock de bougies. Les quantités de chaque jour sont tirées des événements
+# datés (grand livre, ou Date_Achat des positions). À chaque mise à jour, seuls
+# les jours postérieurs à la dernière ligne stockée, ou au plus ancien événement
+# ajouté / modifié, sont recalculés.
+
+COLONNES = ["Valeur", "Investi", "Dividendes"]
+
+_memoire = {}   # nom -> (DataFrame, {empreinte: date})
+
+def _jours(evenements):
+    """ Date de chaque événement (analyse vectorisée) ; aujourd'hui si absente ou illisible """
+    j = pd.to_datetime(pd.Series([e.get('Date') for e in evenements], dtype='object'), errors='coerce', format="ISO8601")
+    return list(j.fillna(pd.Timestamp(date.today())).dt.normalize())
+
+def _empreinte(evt):
+    cle = "|".join(str(evt.get(c, "")) for c in ("Date", "Type", "Ticker", "Qté", "Prix", "Montant"))
+    return hashlib.sha1(cle.encode()).hexdigest()[:16]
+
+def _empreintes(evenements, dates):
+    """ {empreinte: date} ; des événements identiques (deux exécutions pareilles le même jour) sont numérotés,
+    si bien qu'un doublon ajouté ou retiré compte comme un changement """
+    vus, n = {}, Counter()
+    for e, j in zip(evenements, dates):
+        k = _empreinte(e)
+        n[k] += 1
+        vus[f"{k}#{n[k]}"] = str(j.date())
+    return vus
+
+def _chemins(nom):
+    base = os.path.join(DOSSIER, f"_serie_{nom}")
+    return base + ".csv", base + ".json"
+
+def evenements_positions(positions, dividendes=()):
+    """ Événements équivalents aux CSV : chaque ligne détenue depuis sa Date_Achat """
+    evts = [{"Date": p.get('Date_Achat'), "Type": ACHAT, "Ticker": p['Ticker'], "Qté": p.get('Qté'),
+             "Prix": p.get('PRU')} for p in positions]
+    return evts + [{"Date": d.get('Date'), "Type": DIVIDENDE, "Ticker": d['Ticker'],
+                    "Montant": d.get('Montant')} for d in dividendes]
+
+def chronologie(evenements, jours=None):
+    """ Après chaque jour d'événements : quantités par ticker, capital investi, dividendes cumulés """
+    positions, qtes, totaux = {}, {}, {}
+    def figer(jour):
+        qtes[jour] = {t: p['Qté'] for t, p in positions.items()}
+        totaux[jour] = (sum(p['Qté'] * p['PRU'] for p in positions.values()),
+                        sum(p['Dividendes'] for p in positions.values()))
+    courant = None
+    for jour, _, evt in sorted(zip(jours or _jours(evenements), range(len(evenements)), evenements)):
+        if courant is not None and jour != courant: figer(courant)
+        appliquer(positions, {**evt, "Date": str(jour.date())})
+        courant = jour
+    if courant is not None: figer(courant)
+    q = pd.DataFrame.from_dict(qtes, orient='index').fillna(0.0).sort_index()
+    t = pd.DataFrame.from_dict(totaux, orient='index', columns=["Investi", "Dividendes"]).sort_index()
+    return q, t
+
+def _lire(nom):
+    if nom in _memoire: return _memoire[nom]
+    chemin, chemin_meta = _chemins(nom)
+    try:
+        serie = pd.read_csv(chemin, index_col="Date", parse_dates=["Date"], date_format="%Y-%m-%d")
+        with open(chemin_meta, encoding="utf-8") as f:
+            vus = json.load(f)
+    except (FileNotFoundError, ValueError, pd.errors.EmptyDataError):
+        return pd.DataFrame(columns=COLONNES), {}
+    _memoire[nom] = (serie, vus)
+    return serie, vus
+
+def _ecrire(nom, serie, vus):
+    os.makedirs(DOSSIER, exist_ok=True)
+    chemin, chemin_meta = _chemins(nom)
+    serie.to_csv(chemin + ".tmp")
+    with open(chemin_meta + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(vus, f)
+    os.replace(chemin + ".tmp", chemin)
+    os.replace(chemin_meta + ".tmp", chemin_meta)
+    _memoire[nom] = (serie, vus)
+
+def serie_valeur(evenements, prices, nom="portefeuille"):
+    """ DataFrame journalier (Valeur, Investi, Dividendes) depuis le premier événement.
+    Les tickers sans historique (OPCVM) sont valorisés au prix actuel, figé dans les
+    lignes déjà stockées. """
+    evenements = list(evenements)
+    if not evenements: return pd.DataFrame(columns=COLONNES)
+    dates = _jours(evenements)
+    vus = _empreintes(evenements, dates)
+    serie, anciens = _lire(nom)
+
+    # Premier jour à recalculer : dernière ligne (bougie du jour incomplète) ou plus ancien événement changé
+    changes = [pd.Timestamp(j) for k, j in {**vus, **anciens}.items() if (k in vus) != (k in anciens)]
+    reprise = min([serie.index[-1]] + changes) if not serie.empty else None
+
+    q, t = chronologie(evenements, dates)
+    premier = q.index[0]
+    period = next((p for p in PERIODES if debut_periode(p) <= premier), "10y")
+    tickers = [c for c in q.columns if q[c].any()]
+    with mesure("serie_valeur", tickers=len(tickers), depuis=str((reprise or premier).date())) as m:
+        clotures = clotures_locales(tickers, period) if tickers else pd.DataFrame()
+        jours = clotures.index[clotures.index >= premier] if not clotures.empty \
+            else pd.bdate_range(premier, date.today())
+        if reprise is not None: jours = jours[jours >= reprise]
+        m["jours"] = len(jours)
+
+        qj = q.reindex(q.index.union(jours)).ffill().reindex(jours).fillna(0.0)
+        avec = [c for c in qj.columns if c in clotures.columns]
+        sans = [c for c in qj.columns if c not in clotures.columns]
+        prix = clotures[avec].ffill().bfill().reindex(jours) if avec else pd.DataFrame(index=jours)
+        valeur = (qj[avec] * prix).sum(axis=1) + qj[sans].mul(pd.Series(prices, dtype='float64')
+                                                                .reindex(sans).fillna(0.0)).sum(axis=1)
+        nouvelles = t.reindex(t.index.union(jours)).ffill().reindex(jours).fillna(0.0)
+        nouvelles.insert(0, "Valeur", valeur)
+        nouvelles.index.name = "Date"
+
+    if reprise is None:
+        serie = nouvelles
+    elif changes or not serie[serie.index >= reprise].equals(nouvelles):
+        serie = pd.concat([serie[serie.index < reprise], nouvelles])
+    else:
+        return serie  # rien de neuf : pas de réécriture
+    _ecrire(nom, serie, vus)
+    return serie
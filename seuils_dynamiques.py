@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+from historique_local import DOSSIER, PERIODES, debut_periode, mettre_a_jour
+
+# --- SEUILS DYNAMIQUES ---
+# Règle de seuil par ligne (colonne Regle de portefeuille_data.csv) :
+#   trailing:10   stop suiveur à 10% sous le plus haut depuis Date_Achat
+#   atr:14:2      bandes de Keltner : EMA(14) ± 2 x ATR(14)
+#   mm:20:50      croisement des moyennes mobiles exponentielles 20 / 50
+# Chaque règle tient un état courant (plus haut, EMA, ATR, dernière clôture) mis à
+# jour bougie par bougie : une nouvelle bougie coûte O(1). L'état est conservé à
+# côté du stock d'historiques ; la dernière bougie (peut-être incomplète) est
+# appliquée à une copie sans être enregistrée.
+
+TRAILING = "trailing"
+ATR = "atr"
+MM = "mm"
+PRESETS = {"Statique (% du PRU)": "", "Stop suiveur 10%": "trailing:10", "Stop suiveur 20%": "trailing:20",
+           "Bandes ATR 14 x 2": "atr:14:2", "Croisement MM 20 / 50": "mm:20:50"}
+
+def lire_regle(texte):
+    """ 'atr:14:2' -> ('atr', [14.0, 2.0]) ; None si vide ou invalide """
+    if not isinstance(texte, str) or not texte.strip(): return None
+    type_, *params = texte.strip().lower().split(":")
+    try:
+        params = [float(p) for p in params]
+    except ValueError:
+        return None
+    attendus = {TRAILING: 1, ATR: 2, MM: 2}
+    if type_ not in attendus or len(params) != attendus[type_] or min(params) <= 0: return None
+    return type_, params
+
+def libelle(texte):
+    regle = lire_regle(texte)
+    if regle is None: return "Statique"
+    type_, p = regle
+    if type_ == TRAILING: return f"Stop suiveur {p[0]:g}%"
+    if type_ == ATR: return f"Bandes ATR {p[0]:g} x {p[1]:g}"
+    return f"Croisement MM {p[0]:g} / {p[1]:g}"
+
+def _ema(prec, x, n):
+    return x if prec is None else prec + (x - prec) * 2 / (n + 1)
+
+def _extreme(bougie, col, close):
+    """ Plus haut / plus bas de la bougie ; absent, nul ou NaN (bougie partielle), la clôture en tient lieu """
+    v = bougie.get(col)
+    return close if v is None or pd.isna(v) or not v else float(v)
+
+def pas(regle, etat, bougie):
+    """ Applique une bougie (dict Open/High/Low/Close) à l'état de la règle, en O(1) """
+    type_, p = regle
+    close = float(bougie['Close'])
+    haut, bas = _extreme(bougie, 'High', close), _extreme(bougie, 'Low', close)
+    prec = etat.get('prec')
+    if type_ == TRAILING:
+        etat['max'] = max(etat.get('max', haut), haut)
+    elif type_ == ATR:
+        tr = haut - bas if prec is None else max(haut - bas, abs(haut - prec), abs(bas - prec))
+        n = int(p[0])
+        etat['atr'] = tr if etat.get('atr') is None else etat['atr'] + (tr - etat['atr']) / n  # lissage de Wilder
+        etat['ema'] = _ema(etat.get('ema'), close, n)
+    elif type_ == MM:
+        etat['ema_c'] = _ema(etat.get('ema_c'), close, p[0])
+        etat['ema_l'] = _ema(etat.get('ema_l'), close, p[1])
+    etat['prec'] = close
+    etat['n'] = etat.get('n', 0) + 1
+    return etat
+
+def niveaux(regle, etat):
+    """ {bas, haut, valeur} : la règle se déclenche si valeur <= bas ou valeur >= haut """
+    type_, p = regle
+    close = etat.get('prec')
+    if close is None: return {"bas": None, "haut": None, "valeur": None}
+    if type_ == TRAILING:
+        return {"bas": etat['max'] * (1 - p[0] / 100), "haut": None, "valeur": close}
+    if type_ == ATR:
+        return {"bas": etat['ema'] - p[1] * etat['atr'], "haut": etat['ema'] + p[1] * etat['atr'], "valeur": close}
+    # Croisement : la moyenne courte passe sous (ou au-dessus de) la longue
+    return {"bas": etat['ema_l'], "haut": etat['ema_l'], "valeur": etat['ema_c']}
+
+def _bougies(df):
+    colonnes = [c for c in ("High", "Low", "Close") if c in df.columns]
+    return df[colonnes].dropna(subset=["Close"]).to_dict('records')
+
+def courbes(texte, df, depuis=None):
+    """ Niveaux bougie par bougie (mêmes pas que le moteur) pour les graphiques """
+    regle = lire_regle(texte)
+    if regle is None or df is None or df.empty: return pd.DataFrame()
+    if depuis is not None: df = df[df.index >= depuis]
+    etat, lignes = {}, []
+    for b in _bougies(df):
+        n = niveaux(regle, pas(regle, etat, b))
+        lignes.append({"MM courte": etat['ema_c'], "MM longue": etat['ema_l']} if regle[0] == MM
+                      else {"Seuil bas": n['bas'], "Seuil haut": n['haut']})
+    return pd.DataFrame(lignes, index=df.index[:len(lignes)]).dropna(axis=1, how='all')
+
+class MoteurSeuils:
+    def __init__(self, chemin=None):
+        self.chemin = chemin or os.path.join(DOSSIER, "_seuils.json")
+        self.etats = {}   # "ticker|règle|depuis" -> état après la dernière bougie complète
+        self.modifie = False
+        self._lock = threading.Lock()
+        try:
+            with open(self.chemin, encoding="utf-8") as f:
+                self.etats = json.load(f)
+        except (FileNotFoundError, ValueError):
+            pass
+
+    @staticmethod
+    def cle(ticker, texte, depuis):
+        return f"{ticker}|{texte.strip().lower()}|{depuis.date() if depuis is not None else ''}"
+
+    def a_partir(self, ticker, texte, depuis):
+        """ Première bougie utile : lendemain de l'état enregistré, sinon la date d'achat """
+        etat = self.etats.get(self.cle(ticker, texte, depuis), {})
+        return pd.Timestamp(etat['date']) + pd.Timedelta(days=1) if 'date' in etat else depuis
+
+    def evaluer(self, ticker, texte, bougies, depuis=None):
+        """ Niveaux courants de la règle ; seules les bougies postérieures à l'état sont appliquées """
+        regle = lire_regle(texte)
+        if regle is None or bougies is None or bougies.empty: return None
+        cle = self.cle(ticker, texte, depuis)
+        depuis = depuis if depuis is not None else bougies.index[0]
+        with self._lock:
+            etat = self.etats.get(cle, {})
+            dernier = pd.Timestamp(etat['date']) if 'date' in etat else depuis - pd.Timedelta(days=1)
+            nouvelles = bougies[(bougies.index > dernier) & (bougies.index >= depuis)]
+            if len(nouvelles) > 1:
+                for b in _bougies(nouvelles.iloc[:-1]): pas(regle, etat, b)
+                etat['date'] = str(nouvelles.index[-2].date())
+                self.etats[cle] = etat
+                self.modifie = True
+            courant = dict(etat)
+            for b in _bougies(nouvelles.iloc[-1:]): pas(regle, courant, b)
+        return niveaux(regle, courant)
+
+    def sauvegarder(self):
+        with self._lock:
+            if not self.modifie: return
+            os.makedirs(os.path.dirname(self.chemin) or ".", exist_ok=True)
+            tmp = self.chemin + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.etats, f)
+            os.replace(tmp, self.chemin)
+            self.modifie = False
+
+def date_achat(x):
+    """ Date_Achat normalisée, None si absente ou illisible """
+    d = pd.to_datetime(x, errors='coerce')
+    return None if pd.isna(d) else d.normalize()
+
+def periode_depuis(depuis):
+    """ Plus courte période du stock couvrant la date d'achat """
+    if depuis is None: return "1y"
+    return next((p for p in PERIODES if debut_periode(p) <= depuis), "10y")
+
+def seuils_lignes(positions, moteur, stock=None):
+    """ {rang de ligne: niveaux} pour les lignes ayant une règle dynamique ;
+    `stock` ({ticker: bougies}) évite de relire l'historique s'il est déjà chargé """
+    lignes = [(i, p['Ticker'], p['Regle'], date_achat(p.get('Date_Achat')))
+              for i, p in enumerate(positions.to_dict('records') if isinstance(positions, pd.DataFrame) else positions)
+              if lire_regle(p.get('Regle')) is not None]
+    stock = dict(stock or {})
+    # Historique depuis l'achat seulement pour initialiser un état, ensuite les bougies postérieures
+    # à l'état suffisent ; un téléchargement groupé par période
+    manquants = {}
+    for i, t, regle, depuis in lignes:
+        b, debut = stock.get(t), moteur.a_partir(t, regle, depuis)
+        if b is None or b.empty or (debut is not None and b.index[0] > debut):
+            manquants.setdefault(periode_depuis(debut), set()).add(t)
+    for periode in sorted(manquants, key=debut_periode):
+        stock.update(mettre_a_jour(sorted(manquants[periode]), periode))
+    res = {}
+    for i, t, regle, depuis in lignes:
+        n = moteur.evaluer(t, regle, stock.get(t), depuis)
+        if n and n['valeur'] is not None: res[i] = n
+    return res
@@ -0,0 +1,50 @@
+from alertes_etat import BAS, HAUT, EtatAlertes
+
+def etat(tmp_path):
+    return EtatAlertes(str(tmp_path / "etat.json"))
+
+def test_ratio_var_rearme_par_jour_de_hausse(tmp_path):
+    e = etat(tmp_path)
+    # perte / VaR : dépassement, puis jour de hausse (ratio négatif), puis nouveau dépassement
+    assert e.evaluer("@Principal", "var", 1.0, 1.3, HAUT, signe=True)
+    assert not e.evaluer("@Principal", "var", 1.0, 1.5, HAUT, signe=True)
+    assert not e.evaluer("@Principal", "var", 1.0, -0.4, HAUT, signe=True)
+    assert e.evaluer("@Principal", "var", 1.0, 1.2, HAUT, signe=True)
+
+def test_drawdown_rearme_au_plus_haut(tmp_path):
+    e = etat(tmp_path)
+    assert e.evaluer("@Principal", "drawdown", 0.1, 0.12, HAUT, signe=True)
+    assert not e.evaluer("@Principal", "drawdown", 0.1, -0.0, HAUT, signe=True)
+    assert e.evaluer("@Principal", "drawdown", 0.1, 0.11, HAUT, signe=True)
+
+def test_cours_manquant_ne_rearme_pas(tmp_path):
+    e = etat(tmp_path)
+    assert e.evaluer("AI.PA", "seuil_haut", 180.0, 185.0, HAUT)
+    # cours à 0 = cotation manquante : l'alerte reste active
+    assert not e.evaluer("AI.PA", "seuil_haut", 180.0, 0.0, HAUT)
+    assert not e.evaluer("AI.PA", "seuil_haut", 180.0, 186.0, HAUT)
+    assert not e.evaluer("AI.PA", "seuil_haut", 180.0, float("nan"), HAUT, signe=True)
+
+def test_hysteresis_et_persistance(tmp_path):
+    e = etat(tmp_path)
+    assert e.evaluer("AI.PA", "seuil_bas", 100.0, 99.0, BAS)
+    assert not e.evaluer("AI.PA", "seuil_bas", 100.0, 101.0, BAS)   # dans la bande d'hystérésis (2 %)
+    e.sauvegarder(["AI.PA"])
+    e = etat(tmp_path)
+    assert not e.evaluer("AI.PA", "seuil_bas", 100.0, 98.0, BAS)
+    assert not e.evaluer("AI.PA", "seuil_bas", 100.0, 103.0, BAS)
+    assert e.evaluer("AI.PA", "seuil_bas", 100.0, 99.5, BAS)
+
+def test_nouvelles_n_evalue_que_les_candidats(tmp_path, monkeypatch):
+    import pandas as pd
+    e = etat(tmp_path)
+    df = pd.DataFrame({"Ticker": [f"T{i}" for i in range(1000)], "Seuil_Bas": 100.0, "Cours": 120.0})
+    df.loc[7, "Cours"] = 99.0
+    assert list(e.nouvelles(df, "seuil_bas", "Seuil_Bas", BAS)['Ticker']) == ["T7"]
+    vus = []
+    evaluer = e.evaluer
+    monkeypatch.setattr(e, "evaluer", lambda t, *a: (vus.append(t), evaluer(t, *a))[1])
+    # Seule la ligne dont l'alerte est active est réévaluée : elle se réarme
+    df.loc[7, "Cours"] = 104.0
+    assert e.nouvelles(df, "seuil_bas", "Seuil_Bas", BAS).empty
+    assert vus == ["T7"] and e.actives == {}
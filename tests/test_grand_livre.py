@@ -0,0 +1,71 @@
+import csv
+from io import StringIO
+
+import releves_courtier
+from grand_livre import ACHAT, DIVIDENDE, NOM_FICHIER, NOM_RECENTS, VENTE, GrandLivre
+
+def test_reconcilier_le_journal_prime_sur_le_csv(tmp_path):
+    livre = GrandLivre(str(tmp_path))
+    livre.ajouter(ACHAT, "AI.PA", 10, 150, nom="AIR LIQUIDE")
+    livre.ajouter(ACHAT, "ORA.PA", 5, 10)
+    livre.ajouter(VENTE, "ORA.PA", 5, 12)
+    lignes = [{"Ticker": "AI.PA", "Qté": 99.0, "PRU": 1.0, "Seuil_Haut": 200.0},   # Qté / PRU édités dans le CSV
+              {"Ticker": "ORA.PA", "Qté": 5.0, "PRU": 10.0},                       # soldé dans le journal
+              {"Ticker": "ENGI.PA", "Qté": 60.0, "PRU": 18.25, "Prix_Manuel": 0.0}]  # inconnu du journal
+    modifiees, reprises = livre.reconcilier(lignes)
+    assert modifiees and reprises == 1
+    assert {l['Ticker']: l['Qté'] for l in lignes} == {"AI.PA": 10.0, "ENGI.PA": 60.0}
+    assert lignes[0]['PRU'] == 150.0 and lignes[0]['Seuil_Haut'] == 200.0
+    assert livre.position("ENGI.PA")['Qté'] == 60.0
+    # Deuxième chargement : rien à réaligner
+    assert livre.reconcilier(lignes) == (False, 0)
+
+def test_projeter_dividende_sans_ligne(tmp_path):
+    livre = GrandLivre(str(tmp_path))
+    livre.ajouter(DIVIDENDE, "TTE.PA", montant=30)
+    lignes = []
+    assert not livre.projeter(lignes)
+    assert lignes == []
+
+def test_publication_queue_puis_compaction(tmp_path):
+    livre = GrandLivre(str(tmp_path / "a"), compacter_tous=3)
+    livre.ajouter(ACHAT, "AI.PA", 10, 150)
+    pub = livre.publication()   # état distant inconnu : journal complet
+    assert set(pub) == {NOM_FICHIER, NOM_RECENTS}
+    base = list(csv.DictReader(StringIO(pub[NOM_FICHIER])))
+    livre.ajouter(VENTE, "AI.PA", 4, 160)
+    livre.ajouter(DIVIDENDE, "AI.PA", montant=12)
+    pub = livre.publication()
+    assert list(pub) == [NOM_RECENTS]
+    recents = list(csv.DictReader(StringIO(pub[NOM_RECENTS])))
+    assert [e['Seq'] for e in recents] == ["2", "3"]
+    # Reprise de la copie distante sur un autre poste, puis la queue continue après le journal compacté
+    autre = GrandLivre(str(tmp_path / "b"))
+    autre.importer(base, recents)
+    assert autre.position("AI.PA")['Qté'] == 6.0 and autre.position("AI.PA")['Dividendes'] == 12.0
+    autre.ajouter(ACHAT, "AI.PA", 1, 150)
+    assert [e['Seq'] for e in csv.DictReader(StringIO(autre.publication()[NOM_RECENTS]))] == ["2", "3", "4"]
+    livre.ajouter(ACHAT, "AI.PA", 1, 150)
+    pub = livre.publication()   # 3 événements depuis la compaction
+    assert len(list(csv.DictReader(StringIO(pub[NOM_FICHIER])))) == 4
+    assert list(csv.DictReader(StringIO(pub[NOM_RECENTS]))) == []
+
+class _Table:
+    def ticker(self, isin, echecs=None):
+        return "AI.PA", "AIR LIQUIDE"
+
+def _op(date_, type_, qte, prix):
+    return {"Date": date_, "Type": type_, "ISIN": "FR0000120073", "Nom": "", "Qté": qte, "Prix": prix, "Montant": 0.0}
+
+def test_releve_remplace_la_reprise_et_rejette_l_anterieur(tmp_path):
+    livre = GrandLivre(str(tmp_path))
+    positions = [{"Ticker": "AI.PA", "Nom": "AIR LIQUIDE", "Qté": 10.0, "PRU": 150.0, "Date_Achat": "2025-11-26"}]
+    livre.amorcer(positions)
+    b = releves_courtier.importer([_op("2024-01-05", ACHAT, 10, 150), _op("2024-03-01", VENTE, 4, 170)],
+                                  livre, positions, [], _Table())
+    assert b['remplaces'] == ["AI.PA"] and b['importees'] == 2
+    assert positions[0]['Qté'] == 6.0 and livre.position("AI.PA")['PV_Realisee'] == 80.0
+    # Achat plus ancien que la dernière vente : l'appliquer après fausserait PRU et P/L réalisé
+    b = releves_courtier.importer([_op("2024-02-01", ACHAT, 5, 100)], livre, positions, [], _Table())
+    assert b['importees'] == 0 and len(b['rejetees']) == 1 and b['remplaces'] == []
+    assert livre.position("AI.PA")['Qté'] == 6.0
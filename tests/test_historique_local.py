@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+import yfinance as yf
+
+import historique_local
+from cache_marche import CACHE
+
+@pytest.fixture
+def stock(tmp_path, monkeypatch):
+    """ Stock vide dans un dossier temporaire ; yf.download renvoie un titre coté depuis 3 mois """
+    monkeypatch.setattr(historique_local, "DOSSIER", str(tmp_path))
+    historique_local._memoire.clear()
+    historique_local._debuts.clear()
+    CACHE.vider()
+    introduction = pd.Timestamp.today().normalize() - pd.DateOffset(months=3)
+    departs = []
+
+    def download(tickers, start=None, **kwargs):
+        departs.append(start)
+        jours = pd.bdate_range(max(pd.Timestamp(start), introduction), pd.Timestamp.today().normalize())
+        return pd.DataFrame({c: np.full(len(jours), 10.0) for c in historique_local.COLONNES}, index=jours)
+
+    monkeypatch.setattr(yf, "download", download)
+    yield departs
+    historique_local._memoire.clear()
+    historique_local._debuts.clear()
+    CACHE.vider()
+
+def test_titre_recent_pas_retelecharge(stock):
+    debut = historique_local.debut_periode("1y")
+    premier = historique_local.mettre_a_jour(["NEUF.PA"], "1y")["NEUF.PA"]
+    assert premier.index[0] > debut + pd.Timedelta(days=7)
+    # Nouveau processus, cache expiré : seul le delta depuis la dernière bougie est demandé
+    historique_local._memoire.clear()
+    historique_local._debuts.clear()
+    CACHE.vider()
+    historique_local.mettre_a_jour(["NEUF.PA"], "1y")
+    assert stock[0] == debut.strftime("%Y-%m-%d")
+    assert pd.Timestamp(stock[1]) == premier.index[-1]
+
+def test_periode_plus_longue_recharge(stock):
+    historique_local.mettre_a_jour(["NEUF.PA"], "1mo")
+    CACHE.vider()
+    historique_local.mettre_a_jour(["NEUF.PA"], "1y")
+    assert stock[1] == historique_local.debut_periode("1y").strftime("%Y-%m-%d")
+
+def test_synchro_sans_changement_ne_reecrit_pas(stock, monkeypatch):
+    historique_local.mettre_a_jour(["NEUF.PA"], "1y")
+    ecritures = []
+    ecrire = historique_local._ecrire
+    monkeypatch.setattr(historique_local, "_ecrire", lambda t, df: (ecritures.append(t), ecrire(t, df)))
+    CACHE.vider()
+    historique_local.mettre_a_jour(["NEUF.PA"], "1y")   # dernière bougie re-téléchargée, identique
+    assert ecritures == []
+    # Bougie du jour modifiée et bougie suivante : dernière ligne réécrite et ajout, sans réécriture complète
+    stocke = historique_local.charger("NEUF.PA")
+    derniere = stocke.index[-1]
+    monkeypatch.setattr(yf, "download", lambda tickers, start=None, **kwargs: pd.DataFrame(
+        {c: [11.0, 12.0] for c in historique_local.COLONNES}, index=[derniere, derniere + pd.Timedelta(days=1)]))
+    CACHE.vider()
+    attendu = historique_local.mettre_a_jour(["NEUF.PA"], "1y")["NEUF.PA"]
+    assert ecritures == [] and len(attendu) == len(stocke) + 1
+    historique_local._memoire.clear()
+    relu = historique_local.charger("NEUF.PA")
+    assert relu.index.equals(attendu.index) and relu["Close"].tolist()[-3:] == [10.0, 11.0, 12.0]
@@ -0,0 +1,54 @@
+import asyncio
+
+import pandas as pd
+
+from alertes_etat import EtatAlertes
+from moniteur import Moniteur, SourceFictive
+from seuils_dynamiques import MoteurSeuils
+
+def moniteur(tmp_path, ticks, nom="AIR LIQUIDE"):
+    df_p = pd.DataFrame([{"Ticker": "AI.PA", "Nom": nom, "Seuil_Bas": 100.0, "Seuil_Haut": 0.0}])
+    envois = []
+    m = Moniteur(df_p, pd.DataFrame(), SourceFictive(ticks), lambda titre, msg: envois.append(msg),
+                 EtatAlertes(str(tmp_path / "etat.json")), cadence=0, permanent=True)
+    return m, envois
+
+def tourner(m, n):
+    asyncio.run(m.tourner(max_ticks=n))
+
+def test_rearmement_sauvegarde(tmp_path):
+    m, envois = moniteur(tmp_path, [{"AI.PA": 99.0}, {"AI.PA": 110.0}])
+    tourner(m, 2)
+    assert len(envois) == 1
+    # Le réarmement (sans alerte) est persisté : un moniteur relancé alerte au prochain franchissement
+    m2, envois2 = moniteur(tmp_path, [{"AI.PA": 98.0}])
+    assert m2.etat.actives == {}
+    tourner(m2, 1)
+    assert len(envois2) == 1
+
+def test_nom_avec_accolades(tmp_path):
+    m, envois = moniteur(tmp_path, [{"AI.PA": 99.5}], nom="ETF {MSCI} World")
+    tourner(m, 1)
+    assert envois == ["⚠️ ETF {MSCI} World : 99.50€ (Seuil: 100.0€)"]
+
+def test_panne_de_source(tmp_path):
+    m, envois = moniteur(tmp_path, [ConnectionError("hors ligne"), {"AI.PA": 99.0}])
+    tourner(m, 2)
+    assert m.source.appels == 2 and len(envois) == 1
+
+def test_regle_dynamique_et_prix_force(tmp_path, monkeypatch):
+    import moniteur as mod
+    df_p = pd.DataFrame([{"Ticker": "AI.PA", "Nom": "AIR LIQUIDE", "Seuil_Bas": 100.0, "Seuil_Haut": 150.0,
+                          "Regle": "trailing:10", "Prix_Manuel": 0.0},
+                         {"Ticker": "FR0010", "Nom": "OPCVM", "Seuil_Bas": 50.0, "Seuil_Haut": 0.0,
+                          "Regle": "", "Prix_Manuel": 45.0}])
+    # Plus haut à 200 : stop suiveur à 180
+    monkeypatch.setattr(mod, "seuils_lignes", lambda df, moteur: {0: {"bas": 180.0, "haut": None, "valeur": 190.0}})
+    envois = []
+    m = Moniteur(df_p, pd.DataFrame(), SourceFictive([{"AI.PA": 190.0}, {"AI.PA": 179.0}]),
+                 lambda titre, msg: envois.append(msg), EtatAlertes(str(tmp_path / "etat.json")),
+                 cadence=0, permanent=True, moteur=MoteurSeuils(str(tmp_path / "seuils.json")))
+    tourner(m, 2)
+    # Objectif statique (150) de la ligne à règle ignoré ; OPCVM sans cotation évalué à son prix forcé
+    assert envois == ["⚠️ OPCVM : 45.00€ (Seuil: 50.0€)", "⚠️ AIR LIQUIDE : 179.00€ (Stop suiveur 10% : 180.00€)"]
+    assert "AI.PA|dyn_bas:trailing:10|1.0000" in m.etat.actives
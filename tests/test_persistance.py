@@ -0,0 +1,82 @@
+import threading
+import time
+
+from persistance import ClientCSV, DepotGitHub
+
+class DepotFictif(DepotGitHub):
+    """ _commit remplacé : échoue `echecs` fois, puis réussit ; mesure les envois simultanés """
+    def __init__(self, echecs=0, duree=0.0, **kw):
+        super().__init__("jeton", "o/r", **kw)
+        self.restants, self.duree = echecs, duree
+        self.envois, self.en_cours, self.simultanes = [], 0, 0
+
+    def _commit(self, lot, forcer_head=False):
+        self.en_cours += 1
+        self.simultanes = max(self.simultanes, self.en_cours)
+        time.sleep(self.duree)
+        self.en_cours -= 1
+        if self.restants:
+            self.restants -= 1
+            raise ConnectionError("réseau coupé")
+        self.envois.append(dict(lot))
+        return True
+
+def attendre(condition, delai=5.0):
+    fin = time.monotonic() + delai
+    while not condition():
+        assert time.monotonic() < fin
+        time.sleep(0.01)
+
+def test_echec_reprogramme_avec_attente_croissante():
+    depot = DepotFictif(echecs=2, delai=0.05)
+    depot.enregistrer_contenu("a", "x.csv")
+    attendre(lambda: depot._echecs == 1 and depot._timer is not None)
+    assert depot._timer.interval == 0.1
+    depot.enregistrer_contenu("b", "y.csv")   # pendant l'attente : rejoint le prochain essai
+    attendre(lambda: depot._echecs == 2 and depot._timer is not None)
+    assert depot._timer.interval == 0.2
+    attendre(lambda: depot.envois)
+    assert depot.envois == [{"x.csv": "a", "y.csv": "b"}]
+    assert depot._echecs == 0 and depot._timer is None
+
+def test_attente_plafonnee():
+    depot = DepotFictif(echecs=10, delai=1.0, delai_max=3.0)
+    depot._en_attente["x.csv"] = "a"
+    for _ in range(4): assert not depot.vider_file()
+    assert depot._timer.interval == 3.0
+    depot._timer.cancel()
+
+def test_envois_serialises():
+    depot = DepotFictif(duree=0.05, delai=60)
+    fils = []
+    for i in range(4):
+        depot.enregistrer_contenu(str(i), f"f{i}.csv")
+        fils.append(threading.Thread(target=depot.vider_file))
+        fils[-1].start()
+    for f in fils: f.join()
+    assert depot.simultanes == 1
+    assert sorted(n for lot in depot.envois for n in lot) == [f"f{i}.csv" for i in range(4)]
+
+class SourcePanne:
+    """ Source dont la lecture échoue (réseau) tant que `panne` est vrai """
+    def __init__(self, fichiers):
+        self.fichiers, self.panne = fichiers, False
+
+    def lire(self, nom, etag=None):
+        if self.panne: raise ConnectionError("dépôt injoignable")
+        if nom not in self.fichiers: raise FileNotFoundError(nom)
+        return self.fichiers[nom], '"v1"'
+
+def test_fichier_absent_ou_illisible():
+    source = SourcePanne({"a.csv": "x\n1\n"})
+    client = ClientCSV(source)
+    assert client.lire("absent.csv").empty and client.disponible("absent.csv")
+    source.panne = True
+    assert client.lire("b.csv").empty and not client.disponible("b.csv")
+    # Copie déjà lue : la panne n'empêche pas de s'en servir
+    source.panne = False
+    assert len(client.lire("a.csv")) == 1
+    source.panne = True
+    assert len(client.lire("a.csv")) == 1 and client.disponible("a.csv")
+    source.panne = False
+    assert client.lire("b.csv").empty and client.disponible("b.csv")
@@ -0,0 +1,15 @@
+import pandas as pd
+
+import serie_valeur
+from grand_livre import ACHAT
+
+def test_evenement_identique_ajoute(tmp_path, monkeypatch):
+    monkeypatch.setattr(serie_valeur, "DOSSIER", str(tmp_path))
+    monkeypatch.setattr(serie_valeur, "clotures_locales", lambda tickers, period: pd.DataFrame())
+    serie_valeur._memoire.clear()
+    e1 = {"Seq": 1, "Date": "2026-01-05", "Type": ACHAT, "Ticker": "FR0010", "Qté": 5, "Prix": 100, "Montant": 0}
+    assert serie_valeur.serie_valeur([e1], {"FR0010": 110.0}, "t")["Investi"].iloc[-1] == 500
+    # Deuxième exécution partielle identique (Seq différent) : la série doit être recalculée depuis ce jour
+    serie = serie_valeur.serie_valeur([e1, {**e1, "Seq": 2}], {"FR0010": 110.0}, "t")
+    assert serie["Investi"].iloc[-1] == 1000 and serie.loc["2026-01-05", "Investi"] == 1000
+    serie_valeur._memoire.clear()
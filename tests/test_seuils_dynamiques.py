@@ -0,0 +1,12 @@
+import math
+
+from seuils_dynamiques import lire_regle, niveaux, pas
+
+def test_bougie_sans_plus_haut_ni_plus_bas():
+    regle, etat = lire_regle("atr:14:2"), {}
+    pas(regle, etat, {"High": 11.0, "Low": 9.0, "Close": 10.0})
+    pas(regle, etat, {"High": float("nan"), "Low": float("nan"), "Close": 10.5})
+    pas(regle, etat, {"Close": 10.2})
+    assert not math.isnan(etat['atr'])
+    n = niveaux(regle, etat)
+    assert n['bas'] < 10.2 < n['haut']
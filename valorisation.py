@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+import noyau
+
+# --- MOTEUR DE VALORISATION ---
+# Les positions sont manipulées sous forme de DataFrame typé : toutes les lignes
+# sont valorisées en une seule passe vectorisée (app.py et check_alerts.py).
+
+COLONNES_NUM = ["PRU", "Qté", "Seuil_Haut", "Seuil_Bas", "Prix_Manuel"]
+COLONNES_TXT = ["Nom", "Ticker", "ISIN", "Date_Achat"]
+
+def positions_frame(positions):
+    """ Liste de dicts (ou DataFrame) -> DataFrame aux colonnes numériques en float64 """
+    df = positions.copy() if isinstance(positions, pd.DataFrame) else pd.DataFrame(list(positions))
+    for c in COLONNES_TXT:
+        if c not in df.columns: df[c] = ""
+    for c in COLONNES_NUM:
+        df[c] = pd.to_numeric(df[c], errors='coerce').fillna(0.0).astype('float64') if c in df.columns else 0.0
+    return df.reset_index(drop=True)
+
+def dividendes_par_ticker(dividendes):
+    """ Somme des dividendes perçus par ticker (groupby unique) """
+    df_d = dividendes if isinstance(dividendes, pd.DataFrame) else pd.DataFrame(list(dividendes or []))
+    if df_d.empty or 'Ticker' not in df_d.columns: return pd.Series(dtype='float64')
+    return pd.to_numeric(df_d['Montant'], errors='coerce').fillna(0.0).groupby(df_d['Ticker']).sum()
+
+def valoriser(positions, prices, dividendes=None, prix_veille=None):
+    """ Valeur, P/L, seuils effectifs et dividendes de toutes les lignes """
+    df = positions_frame(positions)
+    pru, qte = df['PRU'].to_numpy(), df['Qté'].to_numpy()
+
+    df['Cours'] = df['Ticker'].map(prices).astype('float64').fillna(0.0)
+    df['Valeur'] = df['Cours'].to_numpy() * qte
+    df['Investi'] = pru * qte
+    df['PV'] = df['Valeur'] - df['Investi']
+    df['PV_pct'] = np.where(df['Investi'] > 0, df['PV'] / df['Investi'].where(df['Investi'] > 0, 1.0) * 100, 0.0)
+
+    # Seuils affichés : valeur saisie, sinon -30% / +20% du PRU
+    df['Seuil_Bas_Eff'] = np.where(df['Seuil_Bas'] > 0, df['Seuil_Bas'], pru * 0.70)
+    df['Seuil_Haut_Eff'] = np.where(df['Seuil_Haut'] > 0, df['Seuil_Haut'], pru * 1.20)
+
+    df['Dividendes'] = df['Ticker'].map(dividendes_par_ticker(dividendes)).fillna(0.0) if dividendes is not None else 0.0
+    gain = df['PV'] + df['Dividendes']
+    df['Rendement'] = np.where(df['Investi'] > 0, gain / df['Investi'].where(df['Investi'] > 0, 1.0) * 100, 0.0)
+
+    if prix_veille is not None:
+        df['Valeur_Veille'] = df['Ticker'].map(prix_veille).astype('float64').fillna(df['Cours']) * qte
+    return df
+
+def totaux(df):
+    """ Agrégats du portefeuille à partir du frame valorisé (indicateurs de noyau.performance) """
+    investi, valeur = float(df['Investi'].sum()), float(df['Valeur'].sum())
+    div = float(df['Dividendes'].sum()) if 'Dividendes' in df.columns else 0.0
+    veille = float(df['Valeur_Veille'].sum()) if 'Valeur_Veille' in df.columns else 0.0
+    perf = noyau.performance(investi, valeur, veille, div)
+    res = {"investi": investi, "valeur": valeur, "pv": perf['pv'], "dividendes": div,
+           "pv_pct": perf['pv_pct'], "rendement": perf['pv_totale_pct']}
+    if 'Valeur_Veille' in df.columns: res["valeur_veille"] = veille
+    return res
+
+def bilan(df):
+    """ Tableau de l'onglet Valorisation, ligne de total incluse """
+    t = totaux(df)
+    lignes = pd.DataFrame({
+        "Action": df['Nom'],
+        "Investi": df['Investi'].round(2),
+        "P/L Bourse": df['PV'].round(2),
+        "Dividendes": df['Dividendes'].round(2),
+        "Rendement Réel": df['Rendement'].map(lambda x: f"{x:+.2f}%"),
+    })
+    total = pd.DataFrame([{
+        "Action": "🏆 TOTAL PORTEFEUILLE",
+        "Investi": round(t['investi'], 2),
+        "P/L Bourse": round(t['pv'], 2),
+        "Dividendes": round(t['dividendes'], 2),
+        "Rendement Réel": f"{t['rendement']:+.2f}%",
+    }])
+    return pd.concat([lignes, total], ignore_index=True)
+
+def surveiller(watchlist, prices):
+    """ Cours et déclenchement (Cours <= Seuil_Alerte) de toute la watchlist """
+    df = watchlist.copy() if isinstance(watchlist, pd.DataFrame) else pd.DataFrame(list(watchlist))
+    if df.empty: return df.assign(Cours=pd.Series(dtype='float64'), Alerte=pd.Series(dtype='bool'))
+    df['Seuil_Alerte'] = pd.to_numeric(df.get('Seuil_Alerte'), errors='coerce').fillna(0.0)
+    df['Cours'] = df['Ticker'].map(prices).astype('float64').fillna(0.0)
+    df['Alerte'] = (df['Cours'] > 0) & (df['Cours'] <= df['Seuil_Alerte'])
+    return df.reset_index(drop=True)